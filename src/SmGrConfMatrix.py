@@ -8,40 +8,67 @@
 ################################################################
 
 from operator import itemgetter
+import os
+import zlib
+import marshal
+import compareTools
+import lgcompact
+import smallGraph
 
 # Set graph size.
 GRAPH_SIZE=100
 
 class SmDict(object):
 	"""This is not a real dictionnary but it is like a dictionnary using only 
-	the == operator (without hash) 
+	the == operator (isomorphism) to compare keys.
 	A value can be associate to a smallGraph. 
 	For efficiency, use an object as a value to avoid call to set()
-	It uses the isomorphism to know if 2 smallGraphs are the same."""
+	It uses the isomorphism to know if 2 smallGraphs are the same.
+	Items are kept in insertion order (myitems); they are indexed by the hash
+	of their key (an isomorphism invariant, see SmallGraph.__hash__()), so
+	that keys are only compared with the items in one bucket."""
 	
 	def __init__(self,*args):
 		self.myitems = []
+		self.buckets = {}
+		self.configKey = compareTools.currentConfig().key
 	
-	def set(self, sg, value):
-		for i in range(len(self.myitems)):
+	def find(self, sg):
+		"""position of the first item with a key isomorphic to sg, or None"""
+		# Hashes depend on the module settings used to compare labels,
+		# including synonyms (see compareTools.currentConfig()).
+		configKey = compareTools.currentConfig().key
+		if self.configKey != configKey:
+			self.configKey = configKey
+			self.buckets = {}
+			for i in range(len(self.myitems)):
+				self.buckets.setdefault(hash(self.myitems[i][0]), []).append(i)
+		for i in self.buckets.get(hash(sg), []):
 			if(sg == self.myitems[i][0]):
-				self.myitems[i][1] = value
-				return
+				return i
+		return None
+
+	def add(self, sg, value):
+		self.buckets.setdefault(hash(sg), []).append(len(self.myitems))
 		self.myitems.append((sg,value))
+
+	def set(self, sg, value):
+		i = self.find(sg)
+		if i != None:
+			self.myitems[i] = (self.myitems[i][0], value)
+		else:
+			self.add(sg, value)
 		
 	def get(self, sg, defaultType = object):
 		"""find the corresponding key and if not found add it with the default value"""
-		for i in range(len(self.myitems)):
-			if(sg == self.myitems[i][0]):
-				return self.myitems[i][1]
-		self.myitems.append((sg, defaultType()))
-		return self.myitems[-1][1]
+		i = self.find(sg)
+		if i == None:
+			i = len(self.myitems)
+			self.add(sg, defaultType())
+		return self.myitems[i][1]
 		
 	def __contains__(self,sg):
-		for i in range(len(self.myitems)):
-			if(sg == self.myitems[i][0]):
-				return True
-		return False
+		return self.find(sg) != None
 
 	def getIter(self):
 		for p in self.myitems:
@@ -95,6 +122,11 @@ class Counter(object):
         def __add__(self,c2):
                 return Counter(self.value + c2.value, self.list + c2.list)
 
+	def update(self,c2):
+		"""add the count and list of c2 to this counter"""
+		self.value = self.value + c2.value
+		self.list.extend(c2.list)
+
 	def __str__(self):
 		return str(self.value)
 	def __int__(self):
@@ -114,6 +146,34 @@ class ConfMatrix(object):
                 """ add 1 (one) to the counter indexed by row and column
                 an object can be added in the attached list"""
 		self.mat.get(row, SmDict).get(column,Counter).incr(elem)
+
+	def merge(self, other):
+		"""add the counters of other to this matrix. Rows and columns new to
+		this matrix are added in the order of other, so that merging the
+		matrices for consecutive parts of a file list gives the matrix for
+		the whole list."""
+		for (rowG,col) in other.mat.getIter():
+			row = self.mat.get(rowG, SmDict)
+			for (g,v) in col.getIter():
+				row.get(g,Counter).update(v)
+
+	def encode(self, table):
+		"""nested tuples holding the matrix, with strings coded in table (see
+		saveMatrices())"""
+		return tuple([ (encodeGraph(rowG, table), \
+				tuple([ (encodeGraph(g, table), encodeCounter(v, table)) \
+					for (g,v) in col.getIter() ])) \
+				for (rowG,col) in self.mat.getIter() ])
+
+	def decode(self, data, strings):
+		"""add the entries of an encoded matrix (see encode())"""
+		for (rowData, colData) in data:
+			row = self.mat.get(decodeGraph(rowData, strings), SmDict)
+			for (gData, vData) in colData:
+				row.get(decodeGraph(gData, strings), Counter).update( \
+						decodeCounter(vData, strings))
+		return self
+
 	def __str__(self):
 		return str(self.mat)
 
@@ -258,6 +318,23 @@ class ConfMatrixObject(object):
 	def incr(self, obj, row, column,elem=None):
 		self.mat.get(obj, ConfMatrix).incr(row, column,elem)
 
+	def merge(self, other):
+		"""add the counters of other to this matrix (see ConfMatrix.merge())"""
+		for (obj,errmat) in other.mat.getIter():
+			self.mat.get(obj, ConfMatrix).merge(errmat)
+
+	def encode(self, table):
+		"""nested tuples holding the matrix (see ConfMatrix.encode())"""
+		return tuple([ (encodeGraph(obj, table), errmat.encode(table)) \
+				for (obj,errmat) in self.mat.getIter() ])
+
+	def decode(self, data, strings):
+		"""add the entries of an encoded matrix (see encode())"""
+		for (objData, matData) in data:
+			self.mat.get(decodeGraph(objData, strings), ConfMatrix).decode( \
+					matData, strings)
+		return self
+
 	def __str__(self):
 		return str(self.mat)
 
@@ -317,3 +394,101 @@ class ConfMatrixObject(object):
 		outputStream.write(str(hiddenErr) + viewStr + '</p>')
 		
 	
+
+
+################################################################
+# Saved confusion matrices. Matrices computed for parts of a file list
+# (e.g. by separate processes or machines) are saved, then loaded and
+# merged (ConfMatrix.merge()) to produce the histograms for the whole
+# list. Graphs and counters are stored as nested tuples, with strings
+# (identifiers, labels and file names) coded by their position in a
+# string table; the result is stored using marshal, compressed by zlib.
+################################################################
+# Increase VERSION when the stored form changes.
+MAGIC = 'LGCM'
+VERSION = 1
+MATRIX_TYPES = { 'ConfMatrix' : ConfMatrix, \
+		'ConfMatrixObject' : ConfMatrixObject }
+
+def encodeLabels(labels, table):
+	# Small graph labels are strings, or lists of strings.
+	if isinstance(labels, basestring):
+		return table.stringCode(labels)
+	return tuple([ table.stringCode(l) for l in labels ])
+
+def decodeLabels(data, strings):
+	if isinstance(data, tuple):
+		return [ strings[c] for c in data ]
+	return strings[data]
+
+def encodeGraph(sg, table):
+	code = table.stringCode
+	return (tuple([ (code(n), encodeLabels(l, table)) \
+				for (n,l) in sg.nodes.iteritems() ]), \
+			tuple([ (code(a), code(b), encodeLabels(l, table)) \
+				for ((a,b),l) in sg.edges.iteritems() ]), \
+			tuple(sorted([ code(n) for n in sg.rednodes ])), \
+			tuple(sorted([ (code(a), code(b)) for (a,b) in sg.rededges ])))
+
+def decodeGraph(data, strings):
+	(nodes, edges, rednodes, rededges) = data
+	sg = smallGraph.SmallGraph()
+	for (n,l) in nodes:
+		sg.nodes[ strings[n] ] = decodeLabels(l, strings)
+	for (a,b,l) in edges:
+		sg.edges[ (strings[a], strings[b]) ] = decodeLabels(l, strings)
+	sg.rednodes = set([ strings[n] for n in rednodes ])
+	sg.rededges = set([ (strings[a], strings[b]) for (a,b) in rededges ])
+	return sg
+
+def encodeCounter(counter, table):
+	# Counter lists may hold None (see Counter.incr()), coded as -1.
+	return (counter.value, tuple([ -1 if elem == None \
+			else table.stringCode(elem) for elem in counter.list ]))
+
+def decodeCounter(data, strings):
+	return Counter(data[0], [ None if c < 0 else strings[c] for c in data[1] ])
+
+def saveMatrices(fileName, matrices, info={}):
+	"""Write a list of matrices (ConfMatrix, ConfMatrixObject or None) to
+	fileName, along with an info dictionary (values must be supported by
+	marshal, e.g. numbers, strings and None)."""
+	table = lgcompact.LabelTable()
+	entries = []
+	for matrix in matrices:
+		if matrix == None:
+			entries.append(None)
+		else:
+			entries.append((matrix.__class__.__name__, matrix.encode(table)))
+	data = (VERSION, info, table.strings, entries)
+	# Write to a temporary file first, so that readers never see a part.
+	tempName = fileName + '.' + str(os.getpid())
+	outFile = open(tempName, 'wb')
+	outFile.write(MAGIC + zlib.compress(marshal.dumps(data, 2)))
+	outFile.close()
+	os.rename(tempName, fileName)
+
+def loadMatrices(fileName):
+	"""Return the (matrices, info) pair saved in fileName (see
+	saveMatrices()). Raises ValueError for files in another format."""
+	inFile = open(fileName, 'rb')
+	content = inFile.read()
+	inFile.close()
+	if not content.startswith(MAGIC):
+		raise ValueError('not a saved confusion matrix file: ' + fileName)
+	try:
+		(version, info, strings, entries) = \
+				marshal.loads(zlib.decompress(content[len(MAGIC):]))
+	except (zlib.error, EOFError, TypeError, ValueError):
+		raise ValueError('invalid confusion matrix file: ' + fileName)
+	if version != VERSION:
+		raise ValueError('confusion matrix file version ' + str(version) \
+				+ ' (expected ' + str(VERSION) + '): ' + fileName)
+	matrices = []
+	for entry in entries:
+		if entry == None:
+			matrices.append(None)
+		else:
+			(typeName, matData) = entry
+			matrices.append(MATRIX_TYPES[ typeName ]().decode(matData, strings))
+	return (matrices, info)
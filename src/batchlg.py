@@ -0,0 +1,394 @@
+################################################################
+# batchlg.py
+#
+# Batch evaluation for label graphs. Compares every (output, ground
+# truth) .lg file pair, in a pool of worker processes (see lgpool.py),
+# writing the per-file metric (.csv) and difference (.diff) files
+# along with the FileResults.csv and FileMetrics.csv spreadsheets
+# and the labelsGT.txt/labelsOutput.txt label lists used by the
+# evaluate script, the FileMetrics.lgm metric store (see
+# lgmetrics.py) and the Errors.db error database (see lgerrors.py).
+# Each file is read once.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import sys
+import os
+import StringIO
+
+from lg import *
+from lgio import *
+import compareTools
+import compileLabels
+import lgerrors
+import lgmetrics
+import lgpack
+import lgpool
+
+def dirPairs(outputDir, targetDir):
+	"""Return (output file, target file, name) triples for all .lg files in
+	the ground truth directory (or pack). Output files are expected to have
+	the same name as their ground truth file."""
+	pairs = []
+	for targetFile in lgpack.listFiles(targetDir):
+		name = os.path.splitext(os.path.basename(targetFile))[0]
+		outputFile = (outputDir + '/' + name + '.lg').replace('//', '/')
+		pairs.append((outputFile, targetFile, name))
+	return pairs
+
+def listPairs(fileName):
+	"""Return (output file, target file, name) triples for a file list
+	with an 'output target' pair on each line."""
+	pairs = []
+	listFile = open(fileName)
+	for line in listFile:
+		entries = line.split()
+		# Skip blank lines and incomplete entries.
+		if len(entries) < 2:
+			continue
+		name = os.path.splitext(os.path.basename(entries[1]))[0]
+		pairs.append((entries[0], entries[1], name))
+	listFile.close()
+	return pairs
+
+def fileLabels(lg):
+	"""Return the (node labels, edge labels) sets used in a graph."""
+	labels = (set(), set())
+	compileLabels.addLabels(lg, labels[0], labels[1])
+	return labels
+
+def addFileLabels(labels, newLabels):
+	"""Add (node labels, edge labels) sets to the labels set pair."""
+	labels[0].update(newLabels[0])
+	labels[1].update(newLabels[1])
+
+# Label filters for matrix (table) structure evaluation, as (name,
+# selected labels, ignored labels): matrices, columns, rows and cells,
+# and symbols without the matrix structure labels.
+MATRIX_FILTERS = [ ('Mat', ['*M'], []), ('Col', ['*C'], []), \
+		('Row', ['*R'], []), ('Cell', ['*Cell'], []), \
+		('Symb', [], ['*M', '*C', '*R', '*Cell']) ]
+
+def matrixConfigs():
+	"""(name, compareTools.EvaluationConfig) pairs for MATRIX_FILTERS."""
+	return [ (name, compareTools.EvaluationConfig(compareTools.filteredMetric, \
+			selectedLabels=selected, ignoredLabels=ignored)) \
+			for (name, selected, ignored) in MATRIX_FILTERS ]
+
+def compareFiltered(lg1, lg2, configs):
+	"""(name, metric row) pairs comparing lg1 with lg2 for each (name,
+	configuration) pair in configs. The graphs are read once and are not
+	modified (see Lg.compare())."""
+	results = []
+	for (name, config) in configs:
+		metricStream = StringIO.StringIO()
+		writeMetrics(lg1.compare(lg2, config=config), metricStream)
+		results.append((name, metricStream.getvalue()))
+	return results
+
+def comparePair(outputFile, targetFile, inter=False, confMat=False, \
+		confMatObj=False, sharedSegments=None, matrix=False, emptyOutput=False):
+	"""Compare an output file with its ground truth. Returns the metric
+	row and the differences as strings (differences are empty for a
+	correct file), lists of structure confusion matrix entries at the
+	primitive (confMat) and object (confMatObj) levels, the label sets
+	of the output and ground truth files (see fileLabels()), if
+	matrix is True, (filter name, metric row) pairs for MATRIX_FILTERS
+	(see compareFiltered()), and None (the error of a failed comparison,
+	see failedResult()). Ground truth segmentations are taken from
+	sharedSegments if given. If emptyOutput is True, the output file is
+	not read, and an empty graph is compared instead."""
+	if emptyOutput:
+		lg1 = Lg()
+		lg1.file = outputFile
+	else:
+		lg1 = Lg(outputFile)
+	lg2 = Lg(targetFile)
+	lg2.sharedSegments = sharedSegments
+	# Labels are taken as read, before comparison modifies the graphs.
+	outputLabels = fileLabels(lg1)
+	targetLabels = fileLabels(lg2)
+	matrixMetrics = []
+	if matrix:
+		matrixMetrics = compareFiltered(lg1, lg2, matrixConfigs())
+	if inter:
+		# Structure confusion matrices need '_' edges to be added.
+		implicit = not (confMat or confMatObj)
+		lg1.labelMissingEdges(implicit)
+		lg2.labelMissingEdges(implicit)
+	out = lg1.compare(lg2)
+
+	metricStream = StringIO.StringIO()
+	writeMetrics(out, metricStream)
+	diffStream = StringIO.StringIO()
+	writeDiff(out[1], out[3], out[2], diffStream)
+
+	matEntries = []
+	matObjEntries = []
+	if confMat or confMatObj:
+		nodeClassErr = set()
+		edgeErr = set()
+		for (n,_,_) in out[1]:
+			nodeClassErr.add(n)
+		for (e,_,_) in out[2]:
+			edgeErr.add(e)
+
+		if confMat:
+			for (gt,er) in lg1.compareSubStruct(lg2,[2,3]):
+				er.rednodes = set(er.nodes.keys()) & nodeClassErr
+				er.rededges = set(er.edges.keys()) & edgeErr
+				matEntries.append((gt,er))
+		if confMatObj:
+			for (obj,gt,er) in lg1.compareSegmentsStruct(lg2,[2]):
+				er.rednodes = set(er.nodes.keys()) & nodeClassErr
+				er.rededges = set(er.edges.keys()) & edgeErr
+				matObjEntries.append((obj,gt,er))
+
+	return (metricStream.getvalue(), diffStream.getvalue(), matEntries, \
+			matObjEntries, outputLabels, targetLabels, matrixMetrics, None)
+
+def failedResult(message, outputFile, targetFile, inter=False, \
+		confMat=False, confMatObj=False, sharedSegments=None, matrix=False):
+	"""comparePair() result for a pair whose comparison raised an error
+	(message): the output is scored as an empty graph, as a missing output
+	file, without confusion matrix entries, and the error message is the
+	last entry. Errors comparing the ground truth with an empty graph are
+	raised."""
+	result = comparePair(outputFile, targetFile, inter, \
+			sharedSegments=sharedSegments, matrix=matrix, emptyOutput=True)
+	return result[:-1] + (message,)
+
+def compareTask(task):
+	"""Process pool worker: compare the (output, target, inter, confMat,
+	confMatObj, sharedSegments, matrix) pair in task (trailing arguments
+	may be left out) using comparePair(), or return failedResult().
+	Metric (compareTools) settings are inherited from the parent process."""
+	try:
+		return comparePair(*task)
+	except Exception, e:
+		return failedResult(str(e), *task)
+
+def readResult(resultsDir, name):
+	"""Return the metric row, differences and error (None unless the
+	comparison failed) recorded for a file that was evaluated in an
+	earlier run."""
+	metricFile = open(os.path.join(resultsDir, 'Metrics', name + '.csv'))
+	metricString = metricFile.read()
+	metricFile.close()
+
+	(diffString, error) = ('', None)
+	diffName = os.path.join(resultsDir, 'Metrics', name + '.diff')
+	if os.path.exists(diffName):
+		diffFile = open(diffName)
+		diffString = diffFile.read()
+		diffFile.close()
+	errorName = os.path.join(resultsDir, 'Metrics', name + '.err')
+	if os.path.exists(errorName):
+		errorFile = open(errorName)
+		error = errorFile.read().strip()
+		errorFile.close()
+	return (metricString, diffString, error)
+
+def writeResult(resultsDir, name, metricString, diffString, error=None):
+	"""Write the per-file metric (.csv) and difference (.diff) files, and
+	the error message of a failed comparison (.err)."""
+	metricFile = open(os.path.join(resultsDir, 'Metrics', name + '.csv'), 'w')
+	metricFile.write(metricString)
+	metricFile.close()
+
+	for (extension, text) in [ ('.diff', diffString), ('.err', error) ]:
+		fileName = os.path.join(resultsDir, 'Metrics', name + extension)
+		if text != None and len(text) > 0:
+			outFile = open(fileName, 'w')
+			outFile.write(text)
+			outFile.close()
+		elif os.path.exists(fileName):
+			os.remove(fileName)
+
+def writeMatrixMetrics(resultsDir, name, matrixMetrics):
+	"""Write the metric row of each matrix filter to
+	MatMetrics/<name><filter>.m (as evallg.py MATRIX)."""
+	matrixDir = os.path.join(resultsDir, 'MatMetrics')
+	if not os.path.isdir(matrixDir):
+		os.makedirs(matrixDir)
+	for (filterName, metricString) in matrixMetrics:
+		metricFile = open(os.path.join(matrixDir, name + filterName + '.m'), 'w')
+		metricFile.write(metricString)
+		metricFile.close()
+
+def writeFileMetrics(resultsDir, fileResults):
+	"""Write FileResults.csv (file and Correct/Incorrect/Error), FileMetrics.csv
+	(file, result and all metric values, with a header row) and the same
+	values by column in FileMetrics.lgm (see lgmetrics.py)."""
+	resultStream = open(os.path.join(resultsDir, 'FileResults.csv'), 'w')
+	metricStream = open(os.path.join(resultsDir, 'FileMetrics.csv'), 'w')
+	header = False
+	for (outputFile, result, metricString) in fileResults:
+		resultStream.write(outputFile + ', ' + result + '\n')
+
+		# Metric rows alternate names and values.
+		entries = metricString.strip().split(',')
+		if not header:
+			metricStream.write('File,Result,' + ','.join(entries[0::2]) + '\n')
+			header = True
+		metricStream.write(outputFile + ', ' + result + ',' \
+				+ ','.join(entries[1::2]) + '\n')
+	resultStream.close()
+	metricStream.close()
+	lgmetrics.writeStore(os.path.join(resultsDir, 'FileMetrics' \
+			+ lgmetrics.STORE_EXT), lgmetrics.fromResults(fileResults))
+
+def writeLabels(resultsDir, outputLabels, targetLabels):
+	"""Write the labels used in ground truth (labelsGT.txt) and output
+	(labelsOutput.txt) files."""
+	for (name, labels) in [('labelsGT.txt', targetLabels), \
+			('labelsOutput.txt', outputLabels)]:
+		labelStream = open(os.path.join(resultsDir, name), 'w')
+		labelStream.write(compileLabels.labelString(labels[0], labels[1]) \
+				+ '\n')
+		labelStream.close()
+
+def pendingPairs(resultsDir, pairs):
+	"""Create resultsDir/Metrics if needed, and return a list holding True
+	for each pair without a metric file there (i.e. not yet evaluated)."""
+	metricsDir = os.path.join(resultsDir, 'Metrics')
+	if not os.path.isdir(metricsDir):
+		os.makedirs(metricsDir)
+	return [ not os.path.exists(os.path.join(metricsDir, name + '.csv')) \
+			for (_, _, name) in pairs ]
+
+def recordResults(resultsDir, pairs, pending, results, otherOutputs=[]):
+	"""Write the results of evaluating file pairs to resultsDir. results
+	iterates over comparePair() results for the pending pairs, in order;
+	other pairs are read from an earlier run (see runEvaluation()).
+	Pairs whose comparison failed are recorded with an 'Error' result and
+	the metrics of an empty output (see failedResult()), so that every
+	pair has a row. The differences of all files are indexed in
+	resultsDir/Errors.db. Returns the list of (output, target) pairs
+	containing errors."""
+	errorWriter = lgerrors.ErrorWriter(os.path.join(resultsDir, \
+			lgerrors.DB_NAME))
+	fileResults = []
+	errorPairs = []
+	outputLabels = (set(), set())
+	targetLabels = (set(), set())
+	for ((outputFile, targetFile, name), todo) in zip(pairs, pending):
+		if not todo:
+			print('    Already processed: ' + targetFile)
+			(metricString, diffString, error) = readResult(resultsDir, name)
+			# Output files that could not be compared add no labels.
+			if error == None:
+				addFileLabels(outputLabels, fileLabels(Lg(outputFile)))
+			addFileLabels(targetLabels, fileLabels(Lg(targetFile)))
+		else:
+			print('  >> Comparing ' + name + '.lg')
+			(metricString, diffString, _, _, newOutputLabels, newTargetLabels, \
+					matrixMetrics, error) = results.next()
+			addFileLabels(outputLabels, newOutputLabels)
+			addFileLabels(targetLabels, newTargetLabels)
+			if error != None:
+				sys.stderr.write('  !! Error comparing ' + outputFile + ' vs. ' \
+						+ targetFile + ' (scored as an empty output): ' + error \
+						+ '\n')
+			writeResult(resultsDir, name, metricString, diffString, error)
+			if len(matrixMetrics) > 0:
+				writeMatrixMetrics(resultsDir, name, matrixMetrics)
+
+		result = 'Correct'
+		if len(diffString) > 0:
+			result = 'Incorrect'
+			errorPairs.append((outputFile, targetFile))
+			errorWriter.addFile(name + '.diff', diffString)
+		if error != None:
+			result = 'Error'
+		fileResults.append((outputFile, result, metricString))
+
+	writeFileMetrics(resultsDir, fileResults)
+	errorWriter.close()
+
+	for outputFile in otherOutputs:
+		addFileLabels(outputLabels, fileLabels(Lg(outputFile)))
+	writeLabels(resultsDir, outputLabels, targetLabels)
+	return errorPairs
+
+def runEvaluation(resultsDir, pairs, inter=False, workers=1, otherOutputs=[], \
+		matrix=False):
+	"""Evaluate all file pairs, storing results in resultsDir. Files with
+	an existing metric file in resultsDir/Metrics are not re-evaluated
+	(but are read for their labels). Pairs are compared by 'workers'
+	processes; results are written in input order. Labels from all
+	files, including output files in otherOutputs that have no ground
+	truth, are written to labelsGT.txt and labelsOutput.txt. If matrix
+	is True, metrics for each matrix label filter are written to
+	resultsDir/MatMetrics (see writeMatrixMetrics()). Returns the
+	list of (output, target) pairs containing errors."""
+	pending = pendingPairs(resultsDir, pairs)
+	tasks = [ (outputFile, targetFile, inter, False, False, None, matrix) \
+			for ((outputFile, targetFile, _), todo) in zip(pairs, pending) \
+			if todo ]
+	results = lgpool.orderedMap(compareTask, tasks, workers)
+	return recordResults(resultsDir, pairs, pending, results, otherOutputs)
+
+def otherOutputFiles(outputDir, pairs):
+	"""Output files in outputDir (a directory or pack) without a ground
+	truth file in pairs."""
+	names = set([ name for (_, _, name) in pairs ])
+	return [ outputFile for outputFile in lgpack.listFiles(outputDir) \
+			if not os.path.splitext(os.path.basename(outputFile))[0] in names ]
+
+def main():
+	if len(sys.argv) < 3:
+		print("Usage: [[python]] batchlg.py <resultsDir> <outputDir> <groundTruthDir> [INTER] [MATRIX] [WORKERS=n]")
+		print("   OR  [[python]] batchlg.py <resultsDir> <fileList> [INTER] [MATRIX] [WORKERS=n]")
+		print("")
+		print("    Evaluates each .lg file in groundTruthDir against the file with")
+		print("    the same name in outputDir (ground truth files determine the")
+		print("    pairs; a missing output file is compared as an empty graph, and")
+		print("    output files without ground truth only contribute labels), or the")
+		print("    'output target' file pairs listed in fileList. Pairs are compared")
+		print("    by a pool of worker processes (see WORKERS), each file pair being")
+		print("    read once; results are written in input order. Writes Metrics/*.csv,")
+		print("    Metrics/*.diff, FileResults.csv, FileMetrics.csv, FileMetrics.lgm")
+		print("    (see lgmetrics.py), Errors.db (see lgerrors.py), labelsGT.txt and")
+		print("    labelsOutput.txt in resultsDir.")
+		print("    Pairs with errors are listed in resultsDir/ErrorFiles.txt. A pair")
+		print("    whose comparison fails is scored as an empty output, with an")
+		print("    'Error' result and the message in Metrics/*.err.")
+		print("    outputDir and groundTruthDir may be .lgpack files (see lgpack.py).")
+		print("")
+		print("    INTER compares label sets by intersection (as used by evaluate).")
+		print("    MATRIX also writes MatMetrics/<name><filter>.m for each matrix")
+		print("    label filter (Mat, Col, Row, Cell and Symb), as evallg.py MATRIX;")
+		print("    each file pair is read once (as used by evaluateMat).")
+		print("    WORKERS=n sets the number of worker processes (default: the")
+		print("    LGEVAL_WORKERS environment variable, or one per core).")
+		sys.exit(0)
+
+	inter = "INTER" in sys.argv
+	matrix = "MATRIX" in sys.argv
+	workers = lgpool.workerCount(sys.argv)
+	args = [ arg for arg in lgpool.removeWorkerArgs(sys.argv[1:]) \
+			if not arg in ["INTER", "MATRIX"] ]
+	if inter:
+		compareTools.cmpNodes = compareTools.intersectMetric
+		compareTools.cmpEdges = compareTools.intersectMetric
+
+	resultsDir = args[0]
+	otherOutputs = []
+	if os.path.isdir(args[1]) or lgpack.isPack(args[1]):
+		pairs = dirPairs(args[1], args[2])
+		# Output files without ground truth only contribute labels.
+		otherOutputs = otherOutputFiles(args[1], pairs)
+	else:
+		pairs = listPairs(args[1])
+
+	errorPairs = runEvaluation(resultsDir, pairs, inter, workers, otherOutputs, \
+			matrix)
+
+	errorStream = open(os.path.join(resultsDir, 'ErrorFiles.txt'), 'w')
+	for (outputFile, targetFile) in errorPairs:
+		errorStream.write(outputFile + ' ' + targetFile + '\n')
+	errorStream.close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,599 @@
+################################################################
+# benchlg.py
+#
+# Timing benchmarks for label graph operations, run over a scaled
+# up copy of the src/Tests label graph corpus.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import sys
+import os
+import csv
+import glob
+import time
+import shutil
+import tempfile
+
+from lg import *
+import lg
+import lgcache
+import smallGraph
+import SmGrConfMatrix
+import lgcompact
+import lgpack
+import compareTools
+
+TESTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Tests')
+
+# Number of primitives in the graphs used by the 'scaling' benchmark.
+SCALING_SIZES = [ 100, 500, 1000, 2000, 5000 ]
+
+# Number of primitives in the graphs used by the 'inter' benchmark.
+INTER_SIZES = [ 100, 300, 600 ]
+
+# Number of primitives in the graphs used by the 'substructures' benchmark.
+SUBSTRUCTURE_SIZES = [ 100, 300, 1000 ]
+
+# Number of substructures compared pairwise by the 'iso' benchmark.
+ISO_SUBSTRUCTURES = 400
+
+def scaleLg(text, copies):
+	"""Return .lg text with 'copies' disjoint copies of the graph in text.
+	Node and object identifiers are given a copy suffix (_1, _2, ...)."""
+	# Fields holding node/object identifiers for each entry type; for
+	# objects, all fields from the fifth on are node identifiers.
+	idFields = { 'N' : [1], 'E' : [1, 2], 'R' : [1, 2], 'EO' : [1, 2] }
+	outLines = []
+	for copy in range(1, copies + 1):
+		suffix = '_' + str(copy)
+		for row in lgRows(text):
+			if len(row) == 0:
+				continue
+			entryType = row[0].strip()
+			if entryType == 'O':
+				fields = [1] + range(4, len(row))
+			else:
+				fields = idFields.get(entryType, [])
+			for i in fields:
+				if i < len(row):
+					row[i] = row[i].strip() + suffix
+			outLines.append(','.join(row))
+	return '\n'.join(outLines) + '\n'
+
+def pageLg(primitives, lineLength=20):
+	"""Return .lg text for a page of symbols written in lines, with the
+	given number of primitives. Symbols have 1 to 3 primitives; symbols
+	are 'Right' of the previous symbol in their line, and the first
+	symbol in each line is 'Below' the first symbol of the line above."""
+	symbols = []
+	primitive = 0
+	while primitive < primitives:
+		size = min(len(symbols) % 3 + 1, primitives - primitive)
+		symbols.append([ 's' + str(p) for p in range(primitive, primitive + size) ])
+		primitive += size
+
+	rows = []
+	def addEdges(parent, child, label):
+		for p1 in parent:
+			for p2 in child:
+				rows.append('E, ' + p1 + ', ' + p2 + ', ' + label + ', 1.0')
+
+	for (i, symbol) in enumerate(symbols):
+		label = 'x' + str(i % 7)
+		for p in symbol:
+			rows.append('N, ' + p + ', ' + label + ', 1.0')
+		addEdges(symbol, symbol, label)
+		if i % lineLength > 0:
+			addEdges(symbols[i - 1], symbol, 'Right')
+		elif i > 0:
+			addEdges(symbols[i - lineLength], symbol, 'Below')
+	# Self-edges added by addEdges() within a symbol are removed.
+	rows = [ row for row in rows if not row.startswith('E') \
+			or row.split(', ')[1] != row.split(', ')[2] ]
+	return '\n'.join(rows) + '\n'
+
+def makeCorpus(corpusDir, copies, files):
+	"""Write scaled copies of the src/Tests .lg files to corpusDir, with
+	each graph repeated 'copies' times, and each file written 'files'
+	times. Returns the list of file names."""
+	fileList = []
+	for testFile in sorted(glob.glob(os.path.join(TESTDIR, '*.lg'))):
+		lgFile = open(testFile)
+		text = scaleLg(lgFile.read(), copies)
+		lgFile.close()
+		name = os.path.splitext(os.path.basename(testFile))[0]
+		for i in range(files):
+			fileName = os.path.join(corpusDir, name + '_' + str(i) + '.lg')
+			outFile = open(fileName, 'w')
+			outFile.write(text)
+			outFile.close()
+			fileList.append(fileName)
+	return fileList
+
+def csvRows(fileName):
+	"""Rows of a .lg file using csv.reader, with all fields stripped (the
+	tokenization used before lgRows())."""
+	return [ [ field.strip() for field in row ] \
+			for row in csv.reader(open(fileName)) ]
+
+def fastRows(fileName):
+	"""Rows of a .lg file using lgRows()."""
+	lgFile = open(fileName)
+	rows = lgRows(lgFile.read())
+	lgFile.close()
+	return rows
+
+def timeFiles(function, fileList, repeat):
+	"""Best time over 'repeat' runs to apply function to all files."""
+	best = None
+	for i in range(repeat):
+		start = time.time()
+		for fileName in fileList:
+			function(fileName)
+		elapsed = time.time() - start
+		if best == None or elapsed < best:
+			best = elapsed
+	return best
+
+def quietly(function, *args):
+	"""Call function with standard error discarded (test files include
+	invalid entries)."""
+	stderr = sys.stderr
+	sys.stderr = open(os.devnull, 'w')
+	try:
+		return function(*args)
+	finally:
+		sys.stderr.close()
+		sys.stderr = stderr
+
+def report(name, seconds, fileCount, baseSeconds=None):
+	line = '  %-24s %8.3f s  %8.0f files/s' % (name, seconds, \
+			fileCount / max(seconds, 1e-9))
+	if baseSeconds != None:
+		line += '  (%.2fx)' % (baseSeconds / max(seconds, 1e-9))
+	print(line)
+
+def benchParse(corpusDir, fileList, repeat):
+	"""Tokenization and Lg construction times."""
+	csvTime = timeFiles(csvRows, fileList, repeat)
+	fastTime = timeFiles(fastRows, fileList, repeat)
+	loadTime = quietly(timeFiles, Lg, fileList, repeat)
+
+	print('Parsing (' + str(len(fileList)) + ' files):')
+	report('csv.reader + strip', csvTime, len(fileList))
+	report('lgRows', fastTime, len(fileList), csvTime)
+	report('Lg()', loadTime, len(fileList))
+
+def benchCache(corpusDir, fileList, repeat):
+	"""Lg construction times without a cache, with an empty (cold) cache,
+	and with all files cached (warm)."""
+	cacheDir = os.path.join(corpusDir, 'cache')
+
+	def coldLoad(fileName):
+		# Remove the entry first, so that each repetition is cold.
+		cachePath = lgcache.cachePath(fileName)
+		if os.path.exists(cachePath):
+			os.remove(cachePath)
+		Lg(fileName)
+
+	loadTime = quietly(timeFiles, Lg, fileList, repeat)
+	os.environ['LGEVAL_CACHE'] = cacheDir
+	try:
+		coldTime = quietly(timeFiles, coldLoad, fileList, repeat)
+		warmTime = quietly(timeFiles, Lg, fileList, repeat)
+	finally:
+		del os.environ['LGEVAL_CACHE']
+
+	cacheSize = sum([ os.path.getsize(os.path.join(cacheDir, name)) \
+			for name in os.listdir(cacheDir) ])
+	lgSize = sum([ os.path.getsize(fileName) for fileName in fileList ])
+	print('Compiled graph cache (.lgc: ' + str(cacheSize) + ' bytes, .lg: ' \
+			+ str(lgSize) + ' bytes):')
+	report('Lg(), no cache', loadTime, len(fileList))
+	report('Lg(), cold cache', coldTime, len(fileList), loadTime)
+	report('Lg(), warm cache', warmTime, len(fileList), loadTime)
+
+def benchPack(corpusDir, fileList, repeat):
+	"""Listing and reading all files from the corpus directory, and from a
+	pack of the directory."""
+	packPath = corpusDir + lgpack.PACK_EXT
+	lgpack.writePack(corpusDir, packPath)
+	try:
+		def readAll(directory):
+			for fileName in lgpack.listFiles(directory):
+				lgpack.readFile(fileName)
+
+		def readPack(directory):
+			# Open the pack each time, as it would be in a new process.
+			lgpack.openPacks.clear()
+			readAll(directory)
+
+		dirTime = timeFiles(readAll, [ corpusDir ], repeat)
+		packTime = timeFiles(readPack, [ packPath ], repeat)
+		loadTime = quietly(timeFiles, Lg, lgpack.listFiles(packPath), repeat)
+	finally:
+		lgpack.openPacks.clear()
+		os.remove(packPath)
+
+	print('Packed corpus (' + str(len(fileList)) + ' files):')
+	report('list + read, directory', dirTime, len(fileList))
+	report('list + read, pack', packTime, len(fileList), dirTime)
+	report('Lg(), pack', loadTime, len(fileList))
+
+def benchSegments(corpusDir, fileList, repeat):
+	"""Comparing each file with itself (with missing edges labeled, as in
+	evaluate) and extracting tree edges, with and without memoized
+	segmentGraph() results. Graphs are read again for each repetition, so
+	that no results are memoized beforehand."""
+	def readPairs():
+		pairs = []
+		for fileName in fileList:
+			(lg1, lg2) = (Lg(fileName), Lg(fileName))
+			lg1.labelMissingEdges(True)
+			lg2.labelMissingEdges(True)
+			pairs.append((lg1, lg2))
+		return pairs
+
+	def timeCompare():
+		best = None
+		for i in range(repeat):
+			pairs = quietly(readPairs)
+			start = time.time()
+			for (lg1, lg2) in pairs:
+				lg1.compare(lg2)
+				lg2.separateTreeEdges()
+			elapsed = time.time() - start
+			if best == None or elapsed < best:
+				best = elapsed
+		return best
+
+	cmpNodes = compareTools.cmpNodes
+	cmpEdges = compareTools.cmpEdges
+	compareTools.cmpNodes = compareTools.intersectMetric
+	compareTools.cmpEdges = compareTools.intersectMetric
+	try:
+		lg.memoizeSegments = False
+		plainTime = timeCompare()
+		lg.memoizeSegments = True
+		for key in lg.segmentStats:
+			lg.segmentStats[ key ] = 0
+		memoTime = timeCompare()
+	finally:
+		lg.memoizeSegments = True
+		compareTools.cmpNodes = cmpNodes
+		compareTools.cmpEdges = cmpEdges
+
+	print('Segment graphs (' + str(len(fileList)) + ' files; memo hit rate ' \
+			+ '%.1f%%' % (100 * lg.segmentHitRate()) + ', ' \
+			+ str(lg.segmentStats[ 'hits' ]) + ' hits, ' \
+			+ str(lg.segmentStats[ 'misses' ]) + ' misses):')
+	report('compare, no memo', plainTime, len(fileList))
+	report('compare, memo', memoTime, len(fileList), plainTime)
+
+def benchScaling(corpusDir, fileList, repeat):
+	"""segmentGraph() times (without memoized results) for page graphs of
+	increasing size (see pageLg())."""
+	print('Segment graph scaling (page graphs):')
+	lg.memoizeSegments = False
+	try:
+		for size in SCALING_SIZES:
+			fileName = os.path.join(corpusDir, 'page' + str(size) + '.lg')
+			outFile = open(fileName, 'w')
+			outFile.write(pageLg(size))
+			outFile.close()
+			graph = Lg(fileName)
+			seconds = timeFiles(lambda g: g.segmentGraph(), [ graph ], repeat)
+			print('  %-24s %8.3f s  %8.1f us/primitive' % (str(size) \
+					+ ' primitives', seconds, 1e6 * seconds / size))
+	finally:
+		lg.memoizeSegments = True
+
+def benchInter(corpusDir, fileList, repeat):
+	"""Comparing page graphs (see pageLg()) with labels compared by
+	intersection, as in evaluate, with missing edges labeled '_' by adding
+	edges, or implicitly (see Lg.labelMissingEdges())."""
+	def timeCompare(fileName, implicit):
+		best = None
+		for i in range(repeat):
+			(lg1, lg2) = (Lg(fileName), Lg(fileName))
+			start = time.time()
+			lg1.labelMissingEdges(implicit)
+			lg2.labelMissingEdges(implicit)
+			lg1.compare(lg2)
+			elapsed = time.time() - start
+			if best == None or elapsed < best:
+				best = elapsed
+		return (best, len(lg1.elabels))
+
+	cmpNodes = compareTools.cmpNodes
+	cmpEdges = compareTools.cmpEdges
+	compareTools.cmpNodes = compareTools.intersectMetric
+	compareTools.cmpEdges = compareTools.intersectMetric
+	print('INTER comparison (page graphs; edges stored per graph):')
+	try:
+		for size in INTER_SIZES:
+			fileName = os.path.join(corpusDir, 'page' + str(size) + '.lg')
+			outFile = open(fileName, 'w')
+			outFile.write(pageLg(size))
+			outFile.close()
+			(addedTime, addedEdges) = timeCompare(fileName, False)
+			(implicitTime, implicitEdges) = timeCompare(fileName, True)
+			print('  %-24s %8.3f s  %8d edges' % (str(size) \
+					+ ' primitives added', addedTime, addedEdges))
+			print('  %-24s %8.3f s  %8d edges  (%.2fx)' % (str(size) \
+					+ ' primitives implicit', implicitTime, implicitEdges, \
+					addedTime / max(implicitTime, 1e-9)))
+	finally:
+		compareTools.cmpNodes = cmpNodes
+		compareTools.cmpEdges = cmpEdges
+
+def benchIso(corpusDir, fileList, repeat):
+	"""Comparing substructures (2 to 4 nodes) of the src/Tests graphs with
+	each other by trying all node mappings, and by canonical keys (see
+	SmallGraph.iso()). Canonical keys are computed again in each repetition."""
+	subStructs = []
+	for testFile in sorted(glob.glob(os.path.join(TESTDIR, '*.lg'))):
+		graph = quietly(Lg, testFile)
+		subStructs.extend(graph.subStructIterator([2, 3, 4]))
+	step = max(1, len(subStructs) // ISO_SUBSTRUCTURES)
+	subStructs = subStructs[::step][:ISO_SUBSTRUCTURES]
+	pairs = [ (sg1, sg2) for sg1 in subStructs for sg2 in subStructs \
+			if len(sg1.nodes) == len(sg2.nodes) ]
+
+	def timePairs(compare):
+		best = None
+		for i in range(repeat):
+			for sg in subStructs:
+				sg.canonical = None
+			start = time.time()
+			matches = 0
+			for (sg1, sg2) in pairs:
+				if compare(sg1, sg2):
+					matches += 1
+			elapsed = time.time() - start
+			if best == None or elapsed < best:
+				best = elapsed
+		return (best, matches)
+
+	(permutationTime, permutationMatches) = timePairs( \
+			smallGraph.SmallGraph.permutationIso)
+	(canonicalTime, canonicalMatches) = timePairs(smallGraph.SmallGraph.iso)
+	if canonicalMatches != permutationMatches:
+		sys.stderr.write('  !! Canonical keys found ' + str(canonicalMatches) \
+				+ ' isomorphic pairs, node mappings ' + str(permutationMatches) \
+				+ '\n')
+
+	print('Substructure isomorphism (' + str(len(subStructs)) \
+			+ ' substructures, ' + str(len(pairs)) + ' pairs, ' \
+			+ str(canonicalMatches) + ' isomorphic):')
+	print('  %-24s %8.3f s  %8.0f pairs/s' % ('node mappings', permutationTime, \
+			len(pairs) / max(permutationTime, 1e-9)))
+	print('  %-24s %8.3f s  %8.0f pairs/s  (%.2fx)' % ('canonical keys', \
+			canonicalTime, len(pairs) / max(canonicalTime, 1e-9), \
+			permutationTime / max(canonicalTime, 1e-9)))
+
+def benchHistogram(corpusDir, fileList, repeat):
+	"""Counting the substructures (1 to 4 nodes) of the src/Tests graphs by
+	isomorphism class in an SmGrConfMatrix.SmDict (hash-indexed), and by a
+	linear scan over the classes found so far (as SmDict did before)."""
+	subStructs = []
+	for testFile in sorted(glob.glob(os.path.join(TESTDIR, '*.lg'))):
+		graph = quietly(Lg, testFile)
+		subStructs.extend(graph.subStructIterator([1, 2, 3, 4]))
+
+	def scanCount(sgs):
+		items = []
+		for sg in sgs:
+			for item in items:
+				if sg == item[0]:
+					item[1].incr()
+					break
+			else:
+				items.append((sg, SmGrConfMatrix.Counter(1)))
+		return len(items)
+
+	def dictCount(sgs):
+		counts = SmGrConfMatrix.SmDict()
+		for sg in sgs:
+			counts.get(sg, SmGrConfMatrix.Counter).incr()
+		return len(counts.myitems)
+
+	def timeCount(count):
+		best = None
+		for i in range(repeat):
+			start = time.time()
+			classes = count(subStructs)
+			elapsed = time.time() - start
+			if best == None or elapsed < best:
+				best = elapsed
+		return (best, classes)
+
+	(scanTime, scanClasses) = timeCount(scanCount)
+	(dictTime, dictClasses) = timeCount(dictCount)
+	print('Substructure histogram (' + str(len(subStructs)) \
+			+ ' substructures, ' + str(dictClasses) + ' classes):')
+	if scanClasses != dictClasses:
+		sys.stderr.write('  !! Linear scan found ' + str(scanClasses) \
+				+ ' classes\n')
+	print('  %-24s %8.3f s' % ('linear scan', scanTime))
+	print('  %-24s %8.3f s  (%.2fx)' % ('SmDict', dictTime, \
+			scanTime / max(dictTime, 1e-9)))
+
+def benchSubstructures(corpusDir, fileList, repeat):
+	"""Enumerating substructures of 2 and 3 nodes (Lg.subStructIterator()) in
+	page graphs (see pageLg()), with edges found by scanning all edges of the
+	graph for each substructure (lg.getEdgesToNeighbours(), as before), and
+	through the graph's out-adjacency index (Lg.edgeIndex())."""
+	def scanIterator(graph):
+		# Substructures are not built as small graphs: only edge lookups.
+		subStruct = [ set([n]) for n in graph.nlabels.keys() ]
+		count = 0
+		for d in [2, 3]:
+			found = set()
+			newSubs = []
+			for sub in subStruct:
+				for (_, to) in getEdgesToNeighbours(sub, graph.elabels.keys()):
+					new = frozenset(sub.union([to]))
+					if not new in found:
+						found.add(new)
+						newSubs.append(set(new))
+						getEdgesBetweenThem(new, graph.elabels.keys())
+						count += 1
+			subStruct = newSubs
+		return count
+
+	def indexIterator(graph):
+		count = 0
+		for sg in graph.subStructIterator([2, 3]):
+			count += 1
+		return count
+
+	def timeCount(count, graph):
+		best = None
+		for i in range(repeat):
+			start = time.time()
+			subStructs = count(graph)
+			elapsed = time.time() - start
+			if best == None or elapsed < best:
+				best = elapsed
+		return (best, subStructs)
+
+	print('Substructure enumeration (page graphs, 2 and 3 nodes):')
+	for size in SUBSTRUCTURE_SIZES:
+		fileName = os.path.join(corpusDir, 'page' + str(size) + '.lg')
+		outFile = open(fileName, 'w')
+		outFile.write(pageLg(size))
+		outFile.close()
+		graph = Lg(fileName)
+		(scanTime, scanCount) = timeCount(scanIterator, graph)
+		(indexTime, indexCount) = timeCount(indexIterator, graph)
+		if scanCount != indexCount:
+			sys.stderr.write('  !! Edge scan found ' + str(scanCount) \
+					+ ' substructures, index ' + str(indexCount) + '\n')
+		print('  %-24s %8.3f s  %8d substructures' % (str(size) \
+				+ ' primitives scan', scanTime, scanCount))
+		print('  %-24s %8.3f s  %8d substructures  (%.2fx)' % (str(size) \
+				+ ' primitives index', indexTime, indexCount, \
+				scanTime / max(indexTime, 1e-9)))
+
+def heldBytes(objects):
+	"""Memory held by objects and everything they refer to (sys.getsizeof()
+	over containers, arrays and slot objects; shared objects count once)."""
+	seen = set()
+	total = 0
+	pending = list(objects)
+	while len(pending) > 0:
+		obj = pending.pop()
+		if id(obj) in seen or obj is None or isinstance(obj, type):
+			continue
+		seen.add(id(obj))
+		total += sys.getsizeof(obj)
+		if isinstance(obj, dict):
+			pending.extend(obj.keys())
+			pending.extend(obj.values())
+		elif isinstance(obj, (list, tuple, set, frozenset)):
+			pending.extend(obj)
+		elif hasattr(type(obj), '__mro__'):
+			for cls in type(obj).__mro__:
+				for name in getattr(cls, '__slots__', ()):
+					if hasattr(obj, name):
+						pending.append(getattr(obj, name))
+	return total
+
+def benchMemory(corpusDir, fileList, repeat):
+	"""Memory held by all corpus graphs, with labels in dictionaries and in
+	compact form (including the shared label table; see Lg.compact())."""
+	graphs = quietly(lambda: [ Lg(fileName) for fileName in fileList ])
+	dictBytes = heldBytes(graphs)
+	table = lgcompact.LabelTable()
+	start = time.time()
+	for graph in graphs:
+		graph.compact(table)
+	compactTime = time.time() - start
+	compactBytes = heldBytes(graphs + [ table ])
+
+	print('Graphs held in memory (' + str(len(fileList)) + ' files):')
+	print('  %-24s %10d bytes' % ('dictionaries', dictBytes))
+	print('  %-24s %10d bytes  (%.2fx less; %.3f s to compact)' % ('compact', \
+			compactBytes, float(dictBytes) / compactBytes, compactTime))
+
+def benchComparisons(corpusDir, fileList, repeat):
+	"""Comparing each file with itself, with and without memoized label
+	comparisons (see compareTools.MemoMetric). Comparisons are timed for
+	the default and intersection (as in evaluate) metrics; memos are
+	cleared before each repetition."""
+	pairs = quietly(lambda: [ (Lg(fileName), Lg(fileName)) \
+			for fileName in fileList ])
+
+	def timeCompare(metric):
+		best = None
+		for i in range(repeat):
+			# A new configuration starts with empty memos.
+			config = compareTools.EvaluationConfig(metric)
+			start = time.time()
+			for (lg1, lg2) in pairs:
+				lg1.compare(lg2, mutate=False, config=config)
+			elapsed = time.time() - start
+			if best == None or elapsed < best:
+				best = elapsed
+		return best
+
+	try:
+		for metric in [ compareTools.defaultMetric, compareTools.intersectMetric ]:
+			compareTools.memoizeComparisons = False
+			plainTime = timeCompare(metric)
+			compareTools.memoizeComparisons = True
+			for key in compareTools.comparisonStats:
+				compareTools.comparisonStats[ key ] = 0
+			memoTime = timeCompare(metric)
+			print('Label comparisons, ' + metric.__name__ + ' (' \
+					+ str(len(fileList)) + ' files; memo hit rate ' \
+					+ '%.1f%%' % (100 * compareTools.comparisonHitRate()) + ', ' \
+					+ str(compareTools.comparisonStats[ 'hits' ]) + ' hits, ' \
+					+ str(compareTools.comparisonStats[ 'misses' ]) + ' misses):')
+			report('compare, no memo', plainTime, len(fileList))
+			report('compare, memo', memoTime, len(fileList), plainTime)
+	finally:
+		compareTools.memoizeComparisons = True
+
+BENCHMARKS = [ ('parse', benchParse), ('cache', benchCache), \
+		('pack', benchPack), ('segments', benchSegments), \
+		('scaling', benchScaling), ('inter', benchInter), \
+		('memory', benchMemory), ('iso', benchIso), \
+		('histogram', benchHistogram), \
+		('substructures', benchSubstructures), \
+		('comparisons', benchComparisons) ]
+
+def main():
+	if len(sys.argv) > 1 and sys.argv[1] in ['-h', '--help']:
+		print("Usage: [[python]] benchlg.py [copies] [files] [repeat] [benchmark ...]")
+		print("")
+		print("    Times label graph operations over a corpus built from the")
+		print("    src/Tests .lg files, with each graph repeated 'copies' times")
+		print("    (default 20) and each file written 'files' times (default 10).")
+		print("    Reports the best of 'repeat' runs (default 3).")
+		print("")
+		print("    Benchmarks: " + ", ".join([ name for (name, _) in BENCHMARKS ]) \
+				+ " (default: all)")
+		sys.exit(0)
+
+	numbers = [ int(arg) for arg in sys.argv[1:] if arg.isdigit() ]
+	names = [ arg for arg in sys.argv[1:] if not arg.isdigit() ]
+	settings = numbers + [20, 10, 3][len(numbers):]
+	(copies, files, repeat) = settings[0:3]
+	# Benchmarks control caching themselves.
+	if 'LGEVAL_CACHE' in os.environ:
+		del os.environ['LGEVAL_CACHE']
+
+	corpusDir = tempfile.mkdtemp(prefix='benchlg')
+	try:
+		fileList = makeCorpus(corpusDir, copies, files)
+		print('Corpus: ' + str(len(fileList)) + ' files, graphs x' + str(copies))
+		for (name, benchmark) in BENCHMARKS:
+			if len(names) == 0 or name in names:
+				benchmark(corpusDir, fileList, repeat)
+	finally:
+		shutil.rmtree(corpusDir)
+
+if __name__ == '__main__':
+	main()
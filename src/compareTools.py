@@ -31,11 +31,16 @@ def defaultMetric(labelList1, labelList2):
 		return (cost,generateListErr(ab,ba))
 
 
+# Metrics and label keys with a config argument read their settings from
+# an EvaluationConfig if one is given, and from the module otherwise.
 synonym = {'X':'x','\\times':'x', 'P':'p', 'O':'o','C':'c', '\\prime':'COMMA'}
-def synonymMetric(labelList1, labelList2):
+def synonymMetric(labelList1, labelList2, config=None):
+	synonyms = synonym
+	if config != None:
+		synonyms = config.synonym
 	def replace(x):
-		if x in synonym.keys():
-			return synonym[x]
+		if x in synonyms:
+			return synonyms[x]
 		else:
 			return x
 	a = map(replace, labelList1)
@@ -51,12 +56,15 @@ def synonymMetric(labelList1, labelList2):
 
 ignoredLabelSet = set([])
 selectedLabelSet = set([])
-def filteredMetric(labelList1, labelList2):
-	labelS1 = set(labelList1) - ignoredLabelSet # removing the ignored labels
-	labelS2 = set(labelList2) - ignoredLabelSet # removing the ignored labels
-	if len(selectedLabelSet) > 0:
-		labelS1 &= selectedLabelSet # keep only the selected labels
-		labelS2 &= selectedLabelSet # keep only the selected labels
+def filteredMetric(labelList1, labelList2, config=None):
+	(ignored, selected) = (ignoredLabelSet, selectedLabelSet)
+	if config != None:
+		(ignored, selected) = (config.ignoredLabelSet, config.selectedLabelSet)
+	labelS1 = set(labelList1) - ignored # removing the ignored labels
+	labelS2 = set(labelList2) - ignored # removing the ignored labels
+	if len(selected) > 0:
+		labelS1 &= selected # keep only the selected labels
+		labelS2 &= selected # keep only the selected labels
 	return defaultMetric(labelS1,labelS2)
 
 # no error if at least one symbol is OK
@@ -70,6 +78,174 @@ def intersectMetric(labelList1, labelList2):
 		ba = set(labelList2)-inter
 		return (1,generateListErr(ab,ba))
 	
-	
+
+# Label keys: for a metric that tests equality of (transformed) label sets,
+# a function mapping a label list to a sortable, hashable key, such that
+# the metric has no cost exactly when two keys are equal. Used to compare
+# small graphs without searching all node mappings (see smallGraph.py).
+# intersectMetric is not an equality test, and has no label key.
+def defaultKey(labelList):
+	return tuple(sorted(set(labelList)))
+
+def synonymKey(labelList, config=None):
+	synonyms = synonym
+	if config != None:
+		synonyms = config.synonym
+	return tuple(sorted(set([ synonyms.get(x, x) for x in labelList ])))
+
+def filteredKey(labelList, config=None):
+	(ignored, selected) = (ignoredLabelSet, selectedLabelSet)
+	if config != None:
+		(ignored, selected) = (config.ignoredLabelSet, config.selectedLabelSet)
+	labelS = set(labelList) - ignored
+	if len(selected) > 0:
+		labelS &= selected
+	return tuple(sorted(labelS))
+
+labelKeys = { defaultMetric : defaultKey, synonymMetric : synonymKey, \
+		filteredMetric : filteredKey }
+
+def labelKey(metric):
+	"""Label key function for metric, or None (see labelKeys)."""
+	return labelKeys.get(metric)
+
+# Metric results are memoized for each EvaluationConfig (see MemoMetric),
+# keyed on the label lists compared. comparisonStats counts calls answered
+# from a memo ('hits'), computed ('misses'), and entries dropped to bound
+# memo sizes ('evictions').
+memoizeComparisons = True
+comparisonStats = { 'hits' : 0, 'misses' : 0, 'evictions' : 0 }
+MEMO_SIZE = 4096
+
+def comparisonHitRate():
+	"""Fraction of metric calls not computed, or None if there were no
+	calls."""
+	calls = comparisonStats['hits'] + comparisonStats['misses']
+	if calls == 0:
+		return None
+	return float(comparisonStats['hits']) / calls
+
+# Metrics taking a config argument (see synonymMetric()).
+configuredMetrics = set([ synonymMetric, filteredMetric ])
+
+class MemoMetric(object):
+	"""Metric of a configuration, with memoized results for at most MEMO_SIZE
+	label list pairs. Keys hold the labels in the order given (so that error
+	pairs are listed as by the metric itself). Entries are evicted least
+	recently used first, by generation: when MEMO_SIZE/2 entries have been
+	added, entries not used since the previous generation began are dropped.
+	Results are shared between calls, and must not be modified."""
+	__slots__ = ('metric', 'config', 'configured', 'current', 'previous')
+
+	def __init__(self, metric, config):
+		self.metric = metric
+		self.config = config
+		self.configured = metric in configuredMetrics
+		self.clear()
+
+	def clear(self):
+		self.current = {}
+		self.previous = {}
+
+	def compute(self, labelList1, labelList2):
+		if self.configured:
+			return self.metric(labelList1, labelList2, self.config)
+		return self.metric(labelList1, labelList2)
+
+	def __call__(self, labelList1, labelList2):
+		if not memoizeComparisons:
+			return self.compute(labelList1, labelList2)
+
+		key = (tuple(labelList1), tuple(labelList2))
+		try:
+			result = self.current[ key ]
+			comparisonStats['hits'] += 1
+			return result
+		except KeyError:
+			pass
+		result = self.previous.get(key)
+		if result == None:
+			comparisonStats['misses'] += 1
+			result = self.compute(labelList1, labelList2)
+		else:
+			comparisonStats['hits'] += 1
+		if len(self.current) >= MEMO_SIZE // 2:
+			comparisonStats['evictions'] += len(self.previous)
+			self.previous = self.current
+			self.current = {}
+		self.current[ key ] = result
+		return result
+
+def configKey(nodeMetric, edgeMetric, selectedLabels, ignoredLabels, synonyms):
+	"""Hashable key identifying a configuration (see EvaluationConfig)."""
+	return (nodeMetric, edgeMetric, frozenset(selectedLabels), \
+			frozenset(ignoredLabels), tuple(sorted(synonyms.items())))
+
+class EvaluationConfig(object):
+	"""Settings for comparing labels: node and edge metrics (cmpNodes and
+	cmpEdges), the selected and ignored label sets of filteredMetric, and
+	the synonyms of synonymMetric. A configuration is not modified once
+	created, so the same graphs may be compared with several configurations
+	(e.g. in turn, or in threads) without changing module settings (see
+	Lg.compare() and SmallGraph.iso()). compareNodes and compareEdges
+	compare labels with the configured metrics, memoized (see MemoMetric)."""
+	__slots__ = ('cmpNodes', 'cmpEdges', 'selectedLabelSet', \
+			'ignoredLabelSet', 'synonym', 'key', 'compareNodes', 'compareEdges')
+
+	def __init__(self, cmpNodes=defaultMetric, cmpEdges=None, \
+			selectedLabels=[], ignoredLabels=[], synonyms=None):
+		# Edges are compared as nodes, and synonyms are the module's, unless
+		# given.
+		if cmpEdges == None:
+			cmpEdges = cmpNodes
+		if synonyms == None:
+			synonyms = synonym
+		self.cmpNodes = cmpNodes
+		self.cmpEdges = cmpEdges
+		self.selectedLabelSet = frozenset(selectedLabels)
+		self.ignoredLabelSet = frozenset(ignoredLabels)
+		self.synonym = dict(synonyms)
+		self.key = configKey(cmpNodes, cmpEdges, selectedLabels, \
+				ignoredLabels, synonyms)
+		self.compareNodes = MemoMetric(cmpNodes, self)
+		self.compareEdges = self.compareNodes
+		if cmpEdges != cmpNodes:
+			self.compareEdges = MemoMetric(cmpEdges, self)
+
+	def __eq__(self, other):
+		return isinstance(other, EvaluationConfig) and self.key == other.key
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return hash(self.key)
+
+	def labelKey(self, metric):
+		"""Label key function for one of the configured metrics, or None
+		(see labelKeys)."""
+		key = labelKeys.get(metric)
+		if key != None and metric in configuredMetrics:
+			return lambda labelList: key(labelList, self)
+		return key
+
+# Configuration for the module settings (see currentConfig()).
+moduleConfig = None
+
+def currentConfig():
+	"""EvaluationConfig for the module settings (cmpNodes, cmpEdges,
+	selectedLabelSet, ignoredLabelSet and synonym). The same configuration
+	(and memo) is returned while the settings are unchanged."""
+	global moduleConfig
+	key = configKey(cmpNodes, cmpEdges, selectedLabelSet, ignoredLabelSet, \
+			synonym)
+	if moduleConfig == None or moduleConfig.key != key:
+		moduleConfig = EvaluationConfig(cmpNodes, cmpEdges, selectedLabelSet, \
+				ignoredLabelSet, synonym)
+	return moduleConfig
+
+# Module settings, used by graphs created without a configuration. Prefer
+# passing an EvaluationConfig to Lg.compare() and SmallGraph.iso() to
+# changing these.
 cmpNodes = defaultMetric
 cmpEdges = defaultMetric
@@ -13,6 +13,28 @@ from lg import *
 import os
 import time
 
+def addLabels( lg, nodeLabels, edgeLabels ):
+	"""Add all labels from the node and edge label sets of lg to the
+	nodeLabels and edgeLabels sets."""
+	for node in lg.nlabels.keys():
+		for label in lg.nlabels[ node ].keys():
+			nodeLabels.add( label )
+
+	for edge in lg.elabels.keys():
+		for label in lg.elabels[ edge ].keys():
+			edgeLabels.add( label )
+
+def labelString( nodeLabels, edgeLabels ):
+	"""Return the sorted node and edge label lists (labels*.txt format)."""
+	outString = "NODE LABELS:"
+	for label in sorted( list(nodeLabels )):
+		outString += "\n" + label
+	
+	outString += "\n\nEDGE LABELS:"
+	for label in sorted( list(edgeLabels)):
+		outString += "\n" + label
+	return outString
+
 def main( fileName ):
 	try:
 		fileReader = csv.reader(open(fileName))
@@ -32,26 +54,13 @@ def main( fileName ):
 		lg = Lg( nextFile )
 
 		# Collect all labels from node and edge label sets.
-		for node in lg.nlabels.keys():
-			for label in lg.nlabels[ node ].keys():
-				nodeLabels.add( label )
+		addLabels( lg, nodeLabels, edgeLabels )
 
-		for edge in lg.elabels.keys():
-			for label in lg.elabels[ edge ].keys():
-				edgeLabels.add( label )
-
-	outString = "NODE LABELS:"
-	for label in sorted( list(nodeLabels )):
-		outString += "\n" + label
-	
-	outString += "\n\nEDGE LABELS:"
-	for label in sorted( list(edgeLabels)):
-		outString += "\n" + label
-	
-	print( outString )
+	print( labelString( nodeLabels, edgeLabels ) )
 
-if len( sys.argv ) < 2:
-	print("Usage: [[python]] compileLabels.py lgFileList")
-	sys.exit(0)
+if __name__ == '__main__':
+	if len( sys.argv ) < 2:
+		print("Usage: [[python]] compileLabels.py lgFileList")
+		sys.exit(0)
 
-main( sys.argv[1] )
+	main( sys.argv[1] )
@@ -16,52 +16,169 @@ from lg import *
 from lgio import *
 import SmGrConfMatrix
 import compareTools
+import lgcompact
+import lgpool
 
-def main(fileList, minCount, confMat, confMatObj, subgraphSize):
-	fileReader = csv.reader(open(fileList), delimiter=' ')
-	htmlStream = None
-	
-	matrix = SmGrConfMatrix.ConfMatrix()
-	matrixObj = SmGrConfMatrix.ConfMatrixObject()
+def budgetArgs(args):
+	"""Return the arguments without 'MAXSUB=n' and 'MAXMS=n' entries, and the
+	substructure budget they give per file: (maximum substructures, maximum
+	milliseconds), with None for no limit."""
+	limits = { 'MAXSUB=' : None, 'MAXMS=' : None }
+	otherArgs = []
+	for arg in args:
+		for prefix in limits.keys():
+			if arg.startswith(prefix):
+				limits[ prefix ] = int(arg[len(prefix):])
+				break
+		else:
+			otherArgs.append(arg)
+	return (otherArgs, limits['MAXSUB='], limits['MAXMS='])
 
+def readPairs(fileList):
+	"""Return the (output, ground truth) file pairs listed in fileList."""
+	pairs = []
+	fileReader = csv.reader(open(fileList), delimiter=' ')
 	for row in fileReader:
 		# Skip comments and empty lines.
 		if not row == [] and not row[0].strip()[0] == "#":
 			#print(row)
 			lgfile1 = row[0].strip() # remove leading/trailing whitespace
 			lgfile2 = row[1].strip()
-			
-			# Here lg1 is input; lg2 is ground truth/comparison
-			lg1 = Lg(lgfile1)
-			lg2 = Lg(lgfile2)
-			out = lg1.compare(lg2)
-			
-			nodeClassErr = set()
-			edgeErr = set()
-			if confMat or confMatObj:
-				for (n,_,_) in out[1] :
-					nodeClassErr.add(n)
-				for (e,_,_) in out[2] :
-					edgeErr.add(e)
-			
-			(head, tail) = os.path.split(lgfile1)
-			(base, _) = os.path.splitext(tail)
-			fileName = base + ".lg"
-			if confMat:
-				# Subgraphs of 2 or 3 primitives.
-				for (gt,er) in lg1.compareSubStruct(lg2,[subgraphSize]):
-					er.rednodes = set(er.nodes.keys()) & nodeClassErr
-					er.rededges = set(er.edges.keys()) & edgeErr
-					matrix.incr(gt,er,fileName)
-			if confMatObj:
-				# Object subgraphs of 2 objects.
-				for (obj,gt,er) in lg1.compareSegmentsStruct(lg2,[subgraphSize]):
-					er.rednodes = set(er.nodes.keys()) & nodeClassErr
-					er.rededges = set(er.edges.keys()) & edgeErr
-					matrixObj.incr(obj,gt,er,fileName)
-                        
-        htmlStream = None
-	
+			pairs.append((lgfile1, lgfile2))
+	return pairs
+
+def comparePairs(pairs, confMat, confMatObj, subgraphSize, \
+		maxSubStructs=None, maxMs=None):
+	"""Return the primitive and object confusion matrices for a list of
+	file pairs, and an info dictionary with the settings used and the
+	substructures skipped (see budgetArgs())."""
+	matrix = SmGrConfMatrix.ConfMatrix()
+	matrixObj = SmGrConfMatrix.ConfMatrixObject()
+	useBudget = maxSubStructs != None or maxMs != None
+	info = { 'subgraphSize' : subgraphSize, 'confMat' : confMat, \
+			'confMatObj' : confMatObj, 'maxSubStructs' : maxSubStructs, \
+			'maxMs' : maxMs, 'truncatedFiles' : 0, 'stoppedFiles' : 0, \
+			'prunedFiles' : 0, 'skippedSubStructs' : 0 }
+
+	for (lgfile1, lgfile2) in pairs:
+		# Here lg1 is input; lg2 is ground truth/comparison
+		lg1 = Lg(lgfile1)
+		lg2 = Lg(lgfile2)
+		out = lg1.compare(lg2)
+		
+		nodeClassErr = set()
+		edgeErr = set()
+		if confMat or confMatObj:
+			for (n,_,_) in out[1] :
+				nodeClassErr.add(n)
+			for (e,_,_) in out[2] :
+				edgeErr.add(e)
+		
+		(head, tail) = os.path.split(lgfile1)
+		(base, _) = os.path.splitext(tail)
+		fileName = base + ".lg"
+		# One substructure budget for all comparisons of a file.
+		budget = None
+		if useBudget:
+			budget = SubStructBudget(maxSubStructs, maxMs)
+		if confMat:
+			# Subgraphs of 2 or 3 primitives.
+			for (gt,er) in lg1.compareSubStruct(lg2,[subgraphSize],budget):
+				er.rednodes = set(er.nodes.keys()) & nodeClassErr
+				er.rededges = set(er.edges.keys()) & edgeErr
+				matrix.incr(gt,er,fileName)
+		if confMatObj:
+			# Object subgraphs of 2 objects.
+			for (obj,gt,er) in lg1.compareSegmentsStruct(lg2,[subgraphSize],budget):
+				er.rednodes = set(er.nodes.keys()) & nodeClassErr
+				er.rededges = set(er.edges.keys()) & edgeErr
+				matrixObj.incr(obj,gt,er,fileName)
+		if budget != None and budget.truncated():
+			info['truncatedFiles'] += 1
+			info['skippedSubStructs'] += budget.skipped
+			if budget.stopped:
+				info['stoppedFiles'] += 1
+			if budget.pruned:
+				info['prunedFiles'] += 1
+
+	return (matrix, matrixObj, info)
+
+def compareShard(task):
+	"""Process pool worker: compare the file pairs of a shard, given with
+	the other comparePairs() arguments in task. Returns the string table,
+	the encoded primitive and object matrices (see ConfMatrix.encode()), and
+	the info dictionary."""
+	(matrix, matrixObj, info) = comparePairs(*task)
+	table = lgcompact.LabelTable()
+	matData = matrix.encode(table)
+	matObjData = matrixObj.encode(table)
+	return (table.strings, matData, matObjData, info)
+
+def compareFiles(fileList, confMat, confMatObj, subgraphSize, \
+		maxSubStructs=None, maxMs=None, workers=1):
+	"""Return the primitive and object confusion matrices for the file pairs
+	in fileList, and the info dictionary (see comparePairs()). With more
+	than one worker, consecutive shards of the list are compared by a
+	process pool, and their matrices merged in list order, giving the same
+	matrices as a serial run."""
+	pairs = readPairs(fileList)
+	if workers <= 1:
+		return comparePairs(pairs, confMat, confMatObj, subgraphSize, \
+				maxSubStructs, maxMs)
+
+	# Small shards keep workers balanced when file sizes vary.
+	shardSize = max(1, len(pairs) // (workers * 16))
+	tasks = [ (pairs[i : i + shardSize], confMat, confMatObj, subgraphSize, \
+			maxSubStructs, maxMs) for i in range(0, len(pairs), shardSize) ]
+	matrix = SmGrConfMatrix.ConfMatrix()
+	matrixObj = SmGrConfMatrix.ConfMatrixObject()
+	info = None
+	for (strings, matData, matObjData, shardInfo) in \
+			lgpool.orderedMap(compareShard, tasks, workers):
+		# Decoding adds the shard's entries (as ConfMatrix.merge()).
+		matrix.decode(matData, strings)
+		matrixObj.decode(matObjData, strings)
+		info = mergeInfo(info, shardInfo)
+	if info == None:
+		return comparePairs([], confMat, confMatObj, subgraphSize, \
+				maxSubStructs, maxMs)
+	return (matrix, matrixObj, info)
+
+def mergeInfo(info, partInfo, partName='part'):
+	"""Info dictionary combining info (None for none) and partInfo. Parts
+	must use the same settings; skipped substructure counts are added."""
+	if info == None:
+		return dict(partInfo)
+	for key in [ 'subgraphSize', 'confMat', 'confMatObj', 'maxSubStructs', \
+			'maxMs' ]:
+		if partInfo[ key ] != info[ key ]:
+			raise ValueError('different ' + key + ' for ' + partName + ': ' \
+					+ str(partInfo[ key ]) + ' (expected ' + str(info[ key ]) \
+					+ ')')
+	for key in [ 'truncatedFiles', 'stoppedFiles', 'prunedFiles', \
+			'skippedSubStructs' ]:
+		info[ key ] += partInfo[ key ]
+	return info
+
+def mergeSaved(savedFiles):
+	"""Merge the matrices saved (SAVE=file) for parts of a file list, in
+	order. Returns (matrix, matrixObj, info) as for compareFiles()."""
+	matrix = SmGrConfMatrix.ConfMatrix()
+	matrixObj = SmGrConfMatrix.ConfMatrixObject()
+	info = None
+	for savedFile in savedFiles:
+		((partMatrix, partMatrixObj), partInfo) = \
+				SmGrConfMatrix.loadMatrices(savedFile)
+		info = mergeInfo(info, partInfo, savedFile)
+		matrix.merge(partMatrix)
+		matrixObj.merge(partMatrixObj)
+	return (matrix, matrixObj, info)
+
+def writeHTML(fileList, minCount, matrix, matrixObj, info):
+	"""Write the confusion histograms to CH_<fileList>.html."""
+	confMat = info['confMat']
+	confMatObj = info['confMatObj']
+	subgraphSize = info['subgraphSize']
 	objTargets = matrixObj.size()
 	primTargets = matrix.size()
 
@@ -156,6 +273,25 @@ def main(fileList, minCount, confMat, confMatObj, subgraphSize):
 	htmlStream.write(time.strftime("%c"))
 	htmlStream.write('<p><b>'+ fileList + '</b><br>')
 	htmlStream.write('<b>Subgraphs:</b> ' + str(subgraphSize) + ' node(s)<br>')
+	if info['maxSubStructs'] != None or info['maxMs'] != None:
+		limits = []
+		if info['maxSubStructs'] != None:
+			limits.append(str(info['maxSubStructs']) + ' substructures')
+		if info['maxMs'] != None:
+			limits.append(str(info['maxMs']) + ' ms')
+		skipped = str(info['skippedSubStructs']) + ' substructures skipped'
+		partial = []
+		if info['prunedFiles'] > 0:
+			partial.append(str(info['prunedFiles']) \
+					+ ' file(s) not fully enumerated')
+		if info['stoppedFiles'] > 0:
+			partial.append(str(info['stoppedFiles']) \
+					+ ' file(s) stopped at the time limit')
+		if partial != []:
+			skipped += ' (at least; ' + ', '.join(partial) + ')'
+		htmlStream.write('<b>Substructure budget:</b> ' + ', '.join(limits) \
+				+ ' per file; ' + str(info['truncatedFiles']) \
+				+ ' file(s) truncated, ' + skipped + '<br>')
 	htmlStream.write('<br>')
 	htmlStream.write('<p><b>Note:</b> Only primitive-level graph confusions occurring at least '+str(minCount)+' times appear below.<br><Note:</b><b>Note:</b> Individual primitive errors may appear in multiple error graphs (e.g. due to segmentation errors).</p>')
 	htmlStream.write('<UL>')
@@ -188,15 +324,56 @@ def main(fileList, minCount, confMat, confMatObj, subgraphSize):
 	htmlStream.write('</html>')
 	htmlStream.close()
 		
+def main(fileList, minCount, confMat, confMatObj, subgraphSize, \
+		maxSubStructs=None, maxMs=None, saveFile=None, workers=1):
+	"""Write the confusion histograms for the file pairs in fileList, or
+	save the matrices to saveFile if given. File pairs are compared by
+	'workers' processes."""
+	(matrix, matrixObj, info) = compareFiles(fileList, confMat, confMatObj, \
+			subgraphSize, maxSubStructs, maxMs, workers)
+	if saveFile != None:
+		SmGrConfMatrix.saveMatrices(saveFile, [ matrix, matrixObj ], info)
+	else:
+		writeHTML(fileList, minCount, matrix, matrixObj, info)
+
+def mergeMain(name, minCount, savedFiles):
+	"""Write the confusion histograms merged from saved matrices to
+	CH_<name>.html."""
+	try:
+		(matrix, matrixObj, info) = mergeSaved(savedFiles)
+	except (IOError, ValueError), e:
+		sys.stderr.write('  !! Cannot merge confusion histograms: ' + str(e) \
+				+ '\n')
+		sys.exit(1)
+	writeHTML(name, minCount, matrix, matrixObj, info)
+
 # (RZ) Lazy - not checking arguments on assumption this is called from the
 # strConfHist script.
-minCount = 1
-fileList = sys.argv[1]
-subgraphSize = int(sys.argv[2])
-if len(sys.argv) > 3:
-	minCount = int(sys.argv[3])
+# MAXSUB=n and MAXMS=n arguments set a substructure budget per file (see
+# lg.SubStructBudget). SAVE=file saves the matrices rather than writing
+# HTML; 'MERGE name minCount file1 file2 ...' writes CH_<name>.html from
+# matrices saved for parts of a file list, merged in the order given.
+# WORKERS=n sets the number of worker processes (see lgpool.workerCount()).
+if __name__ == '__main__':
+	if len(sys.argv) > 1 and sys.argv[1] == 'MERGE':
+		mergeMain(sys.argv[2], int(sys.argv[3]), sys.argv[4:])
+		sys.exit(0)
+
+	workers = lgpool.workerCount(sys.argv)
+	(args, maxSubStructs, maxMs) = budgetArgs(lgpool.removeWorkerArgs(sys.argv))
+	saveFile = None
+	for arg in args:
+		if arg.startswith('SAVE='):
+			saveFile = arg[len('SAVE='):]
+	args = [ arg for arg in args if not arg.startswith('SAVE=') ]
+	minCount = 1
+	fileList = args[1]
+	subgraphSize = int(args[2])
+	if len(args) > 3:
+		minCount = int(args[3])
 
-confMatObj = True
-confMat = True if len(sys.argv) > 4 else False 
+	confMatObj = True
+	confMat = True if len(args) > 4 else False 
 
-main(fileList, minCount, confMat, confMatObj, subgraphSize)
+	main(fileList, minCount, confMat, confMatObj, subgraphSize, maxSubStructs, \
+			maxMs, saveFile, workers)
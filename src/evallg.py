@@ -13,10 +13,13 @@
 ################################################################
 import sys
 import csv
+import itertools
 from lg import *
 from lgio import *
 import SmGrConfMatrix
 import compareTools
+import batchlg
+import lgpool
 
 # for RIT web service :
 #INKMLVIEWER = "inkml_viewer/index.xhtml?path=../testdata/&files="
@@ -24,9 +27,11 @@ import compareTools
 INKMLVIEWER = "http://www.cs.rit.edu/~rlaz/inkml_viewer/index.xhtml?path=http://www.cs.rit.edu/~rlaz/testdata/&files="
 MINERRTOSHOW = 3
 
-def runBatch(fileName, defaultFileOrder, confMat, confMatObj):
+def runBatch(fileName, defaultFileOrder, confMat, confMatObj, workers=1):
 	"""Compile metrics for pairs of files provided in a CSV
-	file. Store metrics and errors in separate files."""
+	file. Store metrics and errors in separate files. File pairs are
+	compared by 'workers' processes; results are written in file order.
+	Exits with status 1 at the first pair that cannot be compared."""
 	fileReader = csv.reader(open(fileName))
 	metricStream = open(fileName + '.m','w')
 	diffStream = open(fileName + '.diff','w')
@@ -36,9 +41,11 @@ def runBatch(fileName, defaultFileOrder, confMat, confMatObj):
 	matrixObj = None
 	if confMat:
 		matrix = SmGrConfMatrix.ConfMatrix()
-		if confMatObj:
-			matrixObj = SmGrConfMatrix.ConfMatrixObject()
+	if confMatObj:
+		matrixObj = SmGrConfMatrix.ConfMatrixObject()
 
+	tasks = []
+	viewerFiles = []
 	for row in fileReader:
 		# Skip comments and empty lines.
 		if not row == [] and not row[0].strip()[0] == "#":
@@ -48,38 +55,39 @@ def runBatch(fileName, defaultFileOrder, confMat, confMatObj):
 				temp = lgfile2
 				lgfile2 = lgfile1
 				lgfile1 = temp
-			print ("Test: "+lgfile1+" vs. "+lgfile2);
 			toShow = lgfile1
 			if len(row)> 2:
 				toShow = row[2].strip()
 			# Here lg1 is the output, and lg2 the ground truth.
-			lg1 = Lg(lgfile1)
-			lg2 = Lg(lgfile2)
-			out = lg1.compare(lg2)
+			tasks.append((lgfile1, lgfile2, False, confMat, confMatObj))
+			viewerFiles.append(toShow)
 
-			metricStream.write('*M,' + lgfile1 + ',' + lgfile2 + '\n')
-			writeMetrics(out, metricStream)
-			diffStream.write('DIFF,' + lgfile1 + ',' + lgfile2 + '\n')
-			writeDiff(out[1], out[3], out[2], diffStream)
-			
-			nodeClassErr = set()
-			edgeErr = set()
-			if confMat or confMatObj:
-				for (n,_,_) in out[1] :
-					nodeClassErr.add(n)
-				for (e,_,_) in out[2] :
-					edgeErr.add(e)
-			
-			if confMat:
-				for (gt,er) in lg1.compareSubStruct(lg2,[2,3]):
-					er.rednodes = set(er.nodes.keys()) & nodeClassErr
-					er.rededges = set(er.edges.keys()) & edgeErr
-					matrix.incr(gt,er,toShow)
-			if confMatObj:
-				for (obj,gt,er) in lg1.compareSegmentsStruct(lg2,[2]):
-					er.rednodes = set(er.nodes.keys()) & nodeClassErr
-					er.rededges = set(er.edges.keys()) & edgeErr
-					matrixObj.incr(obj,gt,er,toShow)
+	results = lgpool.orderedMap(batchlg.compareTask, tasks, workers)
+	for (task, toShow, result) in itertools.izip(tasks, viewerFiles, results):
+		(lgfile1, lgfile2) = task[0:2]
+		(metricString, diffString, matEntries, matObjEntries) = result[0:4]
+		print ("Test: "+lgfile1+" vs. "+lgfile2);
+		if result[-1] != None:
+			# A failed comparison stops the batch, as when pairs were compared
+			# in turn; the .m and .diff files hold the pairs before it.
+			results.close()
+			metricStream.close()
+			diffStream.close()
+			sys.stderr.write('  !! Error comparing ' + lgfile1 + ' vs. ' \
+					+ lgfile2 + ': ' + result[-1] + '\n')
+			sys.exit(1)
+
+		metricStream.write('*M,' + lgfile1 + ',' + lgfile2 + '\n')
+		metricStream.write(metricString)
+		diffStream.write('DIFF,' + lgfile1 + ',' + lgfile2 + '\n')
+		diffStream.write(diffString)
+
+		if confMat:
+			for (gt,er) in matEntries:
+				matrix.incr(gt,er,toShow)
+		if confMatObj:
+			for (obj,gt,er) in matObjEntries:
+				matrixObj.incr(obj,gt,er,toShow)
                         
 		htmlStream = None
 	if confMat or confMatObj:
@@ -104,14 +112,15 @@ def main():
 	if len(sys.argv) < 3:
 		print("Usage: [[python]] evallg.py <file1.lg> <file2.lg> [diff/*]  [INTER]")
 		print("   OR  [[python]] evallg.py <file1.lg> <file2.lg> MATRIX fileout")
-		print("   OR  [[python]] evallg.py [batch] <filepair_list> [GT-FIRST] [MAT] [MATOBJ] [INTER]")
+		print("   OR  [[python]] evallg.py [batch] <filepair_list> [GT-FIRST] [MAT] [MATOBJ] [INTER] [WORKERS=n]")
 		print("")
 		print("    For the first usage, return error metrics and differences")
 		print("    for  label graphs in file1.lg and file2.lg.")
 		print("    A third argument will return just differences ('diff')")
 		print("    or just metrics (any other string). ")
-		print("    If MATRIX option is used, 4 evaluations are done with the ")
-		print("    different matrix label filters and output in the fileout[ABCD].m]")
+		print("    If MATRIX option is used, 5 evaluations are done with the ")
+		print("    different matrix label filters and output in the")
+		print("    fileout[Mat|Col|Row|Cell|Symb].m files; both files are read once.")
 		print("")
 		print("    For the second usage, a file is provided containing pairs of")
 		print("    label graph files, one per line (e.g. 'file1, GTruth').")
@@ -132,6 +141,11 @@ def main():
 		print("    MATOBJ will produce the subtructure at object level.")
 		print("     (in both cases, the size of substructure is 2 or 3 nodes,")
 		print("      in both cases, only errors with at least 3 occurrences appear)")
+		print("")
+		print("    WORKERS=n compares file pairs in n processes (default: the")
+		print("    LGEVAL_WORKERS environment variable, or one per core).")
+		print("    Batch mode stops with an error (exit status 1) at the first")
+		print("    pair that cannot be compared.")
 		sys.exit(0)
 
 	showErrors = True
@@ -155,7 +169,8 @@ def main():
 		if len(sys.argv) > 3 and "MATOBJ" in sys.argv:
 			print(">> Compute the confusion matrix at object level.")
 			confMatObj = True
-		runBatch(sys.argv[2], defaultFileOrder, confMat, confMatObj)
+		runBatch(sys.argv[2], defaultFileOrder, confMat, confMatObj, \
+				lgpool.workerCount(sys.argv))
 
 	else:
 		# Running for a pair of files: require default order of arguments.
@@ -164,25 +179,15 @@ def main():
 		if len(sys.argv) > 4 and  sys.argv[3] == 'MATRIX':
 			fileOut = sys.argv[4]
 			#print ("MODE MATRIX : " + fileOut)
-			todo = {'Mat':set(['*M']),'Col':set(['*C']),'Row':set(['*R']),'Cell':set(['*Cell'])}
-			compareTools.cmpNodes = compareTools.filteredMetric
-			compareTools.cmpEdges = compareTools.filteredMetric
-			for (n,s) in todo.items():
-				compareTools.selectedLabelSet = s
-				n1 = Lg(fileName1)
-				n2 = Lg(fileName2)
-				out	= n1.compare(n2)
-				outStream = open(fileOut+n+".m", 'w')
-				writeMetrics(out, outStream)
-				outStream.close()
-			compareTools.selectedLabelSet = set([])
-			compareTools.ignoredLabelSet = set(['*M','*C','*R','*Cell'])			
+			# Files are read once, and compared with each label filter.
 			n1 = Lg(fileName1)
 			n2 = Lg(fileName2)
-			out	= n1.compare(n2)
-			outStream = open(fileOut+"Symb.m", 'w')
-			writeMetrics(out, outStream)
-			
+			for (n, metricString) in batchlg.compareFiltered(n1, n2, \
+					batchlg.matrixConfigs()):
+				outStream = open(fileOut+n+".m", 'w')
+				outStream.write(metricString)
+				outStream.close()
+
 		else:
 			
 			if 'diff' in sys.argv:
@@ -193,8 +198,8 @@ def main():
 			n2 = Lg(fileName2)
 			
 			if "INTER" in sys.argv:
-				n1.labelMissingEdges()
-				n2.labelMissingEdges()
+				n1.labelMissingEdges(True)
+				n2.labelMissingEdges(True)
 			# print n1.csv()
 			# print n2.csv()
 				
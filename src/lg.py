@@ -10,7 +10,116 @@ import math
 import copy
 import smallGraph
 import compareTools
+import lgcache
+import lgcompact
+import lgpack
 import os
+import time
+import zlib
+
+def lgRows(text):
+	"""Split the text of a .lg (CSV) file into rows of comma-separated
+	fields. Fields are not stripped, and empty lines give empty rows, as
+	for csv.reader. Text containing quotes is passed to csv.reader."""
+	if '"' in text:
+		return list(csv.reader(text.splitlines(True)))
+	return [ line.split(',') if line else [] for line in text.splitlines() ]
+
+def unlabeledEdge(labels):
+	"""True for edge label dictionaries representing a missing edge (only
+	the '_' label, e.g. as added by Lg.labelMissingEdges())."""
+	return len(labels) == 1 and '_' in labels
+
+# segmentGraph() results are memoized for each graph while its labels are
+# unchanged (see Lg.changed()). segmentStats counts calls answered from a
+# graph's memo ('hits'), from another copy of the graph ('shared'; see
+# SharedSegments), and computed ('misses').
+memoizeSegments = True
+segmentStats = { 'hits' : 0, 'shared' : 0, 'misses' : 0 }
+
+def segmentHitRate():
+	"""Fraction of segmentGraph() calls not computed, or None if there
+	were no calls."""
+	calls = sum(segmentStats.values())
+	if calls == 0:
+		return None
+	return float(calls - segmentStats['misses']) / calls
+
+class SharedSegments(object):
+	"""Segmentations shared by copies of a graph read from the same file,
+	e.g. a ground truth file compared with the output of several systems.
+	Results are stored under the labels they were computed from (see
+	Lg.segmentKey()), so a copy whose labels differ from the others (e.g.
+	with 'ABSENT' nodes added) gets its own result."""
+	__slots__ = ('results',)
+
+	def __init__(self):
+		self.results = {}
+
+class SubStructBudget(object):
+	"""Limits on the substructures enumerated for one file by
+	Lg.subStructIterator() (e.g. through Lg.compareSubStruct()): at most
+	maxCount substructures are returned, and enumeration stops after maxMs
+	milliseconds (None for no limit). With a count limit, node sets are
+	extended in the order of their checksums (see sampleKey()) only until
+	enough larger sets are found for the remaining count, and when the
+	substructures found exceed it a deterministic sample is returned: those
+	with the smallest checksums, in enumeration order. Skipped substructures
+	(found but not returned) are counted; those never found because smaller
+	sets were not extended ('pruned') or because time ran out are not."""
+	__slots__ = ('maxCount', 'maxMs', 'start', 'count', 'skipped', 'stopped', \
+			'pruned')
+
+	def __init__(self, maxCount=None, maxMs=None):
+		self.maxCount = maxCount
+		self.maxMs = maxMs
+		self.start = None
+		self.count = 0
+		self.skipped = 0
+		self.stopped = False
+		self.pruned = False
+
+	def begin(self):
+		"""Start the clock (at the first enumeration using the budget)."""
+		if self.start == None:
+			self.start = time.time()
+
+	def expired(self):
+		return self.maxMs != None and self.start != None \
+				and 1000 * (time.time() - self.start) > self.maxMs
+
+	def remaining(self):
+		"""Number of substructures still allowed (None for no limit)."""
+		if self.maxCount == None:
+			return None
+		return max(0, self.maxCount - self.count)
+
+	def sample(self, nodeSets):
+		"""Node sets to use among nodeSets (a list), within the count limit."""
+		remaining = self.remaining()
+		if remaining != None and len(nodeSets) > remaining:
+			keys = [ sampleKey(nodeSet) for nodeSet in nodeSets ]
+			chosen = sorted(range(len(nodeSets)), key=keys.__getitem__)[:remaining]
+			self.skipped += len(nodeSets) - remaining
+			nodeSets = [ nodeSets[i] for i in sorted(chosen) ]
+		self.count += len(nodeSets)
+		return nodeSets
+
+	def stop(self, unused):
+		"""Record that enumeration stopped (time limit) with 'unused' node sets
+		found but not returned."""
+		self.count -= unused
+		self.skipped += unused
+		self.stopped = True
+
+	def truncated(self):
+		return self.skipped > 0 or self.stopped or self.pruned
+
+def sampleKey(nodeSet):
+	"""Sort key for sampling node sets: a checksum of the sorted node
+	identifiers (independent of enumeration order and of the process)."""
+	text = ','.join(sorted([ str(n) for n in nodeSet ]))
+	return (zlib.crc32(text) & 0xffffffff, text)
 
 class Lg(object):
 	"""Class for bipartite graphs where the two node sets are identical, and
@@ -19,7 +128,8 @@ class Lg(object):
 
 	# Define graph data elements ('data members' for an object in the class)
 	__slots__ = ('file','gweight','nlabels','elabels','error','absentNodes',\
-			'absentEdges','hiddenEdges', 'cmpNodes', 'cmpEdges')
+			'absentEdges','hiddenEdges', 'config', 'cmpNodes', 'cmpEdges', \
+			'sharedSegments', 'version', 'segmentMemo', 'missingEdgeNodes')
 
 	##################################
 	# Constructors (in __init__)
@@ -36,8 +146,16 @@ class Lg(object):
 		self.absentNodes = set([])
 		self.absentEdges = set([])
 		self.hiddenEdges = {}
-		self.cmpNodes = compareTools.cmpNodes
-		self.cmpEdges = compareTools.cmpEdges
+		# Labels are compared using the module settings at creation (see
+		# compareTools.currentConfig()), unless compare() is given another
+		# configuration.
+		self.config = compareTools.currentConfig()
+		self.cmpNodes = self.config.compareNodes
+		self.cmpEdges = self.config.compareEdges
+		self.sharedSegments = None
+		self.version = 0
+		self.segmentMemo = None
+		self.missingEdgeNodes = None
 	
 		
 		fileName = None
@@ -46,6 +164,7 @@ class Lg(object):
 		
 		validAsteriskEdges = set()
 		invalidAsteriskNodes = set()
+		caching = False
 
 		if len(args) == 1:
 			fileName = args[0]
@@ -99,16 +218,27 @@ class Lg(object):
 			MIN_EDGE_ENTRY_LENGTH = 4
 			MIN_OBJECT_ENTRY_LENGTH = 5
 			MIN_OBJECT_EDGE_ENTRY_LENGTH = 5
+			# Use the compiled graph if the file is in the cache.
+			if lgcache.load(self, fileName):
+				return
 			try:
-				fileReader = csv.reader(open(fileName))
+				# Files may be in a pack (see lgpack.py).
+				fileText = lgpack.readFile(fileName)
 			except:
 				# Create an empty graph if a file cannot be found.
 				# Set the error flag.
 				sys.stderr.write('  !! IO Error (cannot open): ' + fileName + '\n')
 				self.error = True
 				return
+			# Read the whole file, then split rows on commas.
+			fileRows = lgRows(fileText)
+			if lgcache.enabled(fileName):
+				# Record node and edge insertion order for the cache.
+				caching = True
+				self.nlabels = lgcache.KeyOrderDict()
+				self.elabels = lgcache.KeyOrderDict()
 			objectDict = dict([])
-			for row in fileReader:
+			for row in fileRows:
 				# Skip blank lines.
 				if len(row) == 0 or len(row) == 1 and row[0].strip() == '':
 					continue
@@ -121,7 +251,7 @@ class Lg(object):
 						self.error = True
 					else:
 						nid = row[1].strip() # remove leading/trailing whitespace
-						if nid in self.nlabels.keys():
+						if nid in self.nlabels:
 							nlabelDict = self.nlabels[ nid ]
 							nlabel = row[2].strip()
 							# if nlabel in nlabelDict:
@@ -157,7 +287,7 @@ class Lg(object):
 									self.file + '):\n\t' + str(row) + '\n')
 							self.error = True
 							nid = primPair[0]
-							if nid in self.nlabels.keys():
+							if nid in self.nlabels:
 								nlabelDict = self.nlabels[ nid ]
 								nlabel = row[3].strip()
 								# if nlabel in nlabelDict:
@@ -169,7 +299,7 @@ class Lg(object):
 							nlabelDict[ nlabel ] = float(row[4])
 
 						#an edge already existing, add a new label
-						elif primPair in self.elabels.keys():
+						elif primPair in self.elabels:
 							elabelDict = self.elabels[ primPair ]
 							elabel = row[3].strip()
 							# if elabel in elabelDict:
@@ -188,7 +318,7 @@ class Lg(object):
 								else:
 									sys.stderr.write(' !! * edge used with ambiguous node labels (' \
 										+ str(self.nlabels[ primPair[0]]) + ' vs. ' \
-										+ str(self.nlabels[ primtPair[1]]) + ') in ' \
+										+ str(self.nlabels[ primPair[1]]) + ') in ' \
 										+ self.file + '):\n\t' + ", ".join(row) + '\n')
 									
 									# RZ: Oct. 14 - cheap and dirty correction.
@@ -248,7 +378,7 @@ class Lg(object):
 						for n in rawnodeList:
 							nid = n.strip()
 							nodeList.append(nid)
-							if nid in self.nlabels.keys():
+							if nid in self.nlabels:
 								nlabelDict = self.nlabels[ nid ]
 								
 								# Add (or replace) entry for the label.
@@ -268,7 +398,7 @@ class Lg(object):
 								if nid1 != nid2:
 									primPair = ( nid1, nid2 )
 									elabel = nlabel 
-									if primPair in self.elabels.keys():
+									if primPair in self.elabels:
 										elabelDict = self.elabels[ primPair ]
 										
 										# Add (or replace) entry for the label.
@@ -308,7 +438,7 @@ class Lg(object):
 								for nid2 in nodeList2:
 									if nid1 != nid2:
 										primPair = ( nid1, nid2 )
-										if primPair in self.elabels.keys():
+										if primPair in self.elabels:
 											elabelDict = self.elabels[ primPair ]
 											
 											# Add (or replace) entry for the label.
@@ -339,13 +469,13 @@ class Lg(object):
 			nid1 = elabel[0]
 			nid2 = elabel[1]
 
-			if not nid1 in self.nlabels.keys():
+			if not nid1 in self.nlabels:
 				self.nlabels[ nid1 ] = { '_' : 1.0 }
-				anodeList = anodeList + [ nid1 ]
+				anodeList.append( nid1 )
 				anonNode = True
-			if not nid2 in self.nlabels.keys():
+			if not nid2 in self.nlabels:
 				self.nlabels[ nid2 ] = { '_' : 1.0 }
-				anodeList = anodeList + [ nid2 ]
+				anodeList.append( nid2 )
 				anonNode = True
 		if anonNode:
 			sys.stderr.write('  ** Anonymous labels created for:\n\t' \
@@ -379,6 +509,9 @@ class Lg(object):
 					self.nlabels[ otherId ] = { 'MergeError' : 1.0 }
 					self.elabels[ (parent, child) ] = { 'MergeError' : 1.0 }
 
+		if caching:
+			lgcache.store(self, fileName, anodeList)
+
 	##################################
 	# String, CSV output
 	##################################
@@ -482,32 +615,128 @@ class Lg(object):
 	# Construct segment-based graph
 	# for current graph state
 	##################################
+	# RETURNS None: modifies in-place.
+	def compact(self, table=None):
+		"""Store node and edge labels in compact form (see lgcompact.py), with
+		labels and identifiers coded in table (by default, a table shared by
+		all graphs). nlabels and elabels become read-only dictionary views:
+		methods adding or removing labels call expand() first (e.g. to add
+		'ABSENT' nodes), other code modifying labels must call it. Raises
+		ValueError if an edge refers to a node without labels."""
+		if self.isCompact():
+			return
+		if table == None:
+			table = lgcompact.corpusTable
+		nodes = lgcompact.NodeLabels(table, self.nlabels)
+		self.elabels = lgcompact.EdgeLabels(table, self.elabels, nodes)
+		self.nlabels = nodes
+		self.segmentMemo = None
+
+	# RETURNS None: modifies in-place.
+	def expand(self):
+		"""Store node and edge labels in dictionaries again (see compact())."""
+		if self.isCompact():
+			self.nlabels = lgcompact.expandLabels(self.nlabels)
+			self.elabels = lgcompact.expandLabels(self.elabels)
+			self.segmentMemo = None
+
+	def isCompact(self):
+		return lgcompact.isCompact(self.nlabels)
+
+	def changed(self):
+		"""Record a change to the node or edge labels. Lg methods call this
+		when they modify labels; code modifying nlabels, elabels or cmpNodes
+		directly should call it too, so that segmentGraph() results are
+		recomputed."""
+		self.version += 1
+
 	def segmentGraph(self):
 		"""Return dictionaries from segments to strokes, strokes to segments,
-		segments without parents, and edges labeled as segment (w. symbol label)."""
+		segments without parents, and edges labeled as segment (w. symbol label).
+		The result is memoized until labels change (see changed()). Results
+		are also shared with other copies of the graph with the same labels
+		if sharedSegments is set (see SharedSegments)."""
+		memo = self.segmentMemo
+		if memoizeSegments and memo != None and memo[0] == self.version:
+			segmentStats['hits'] += 1
+			return memo[1]
+		# Hiding and restoring edges may reorder them, which affects later
+		# output (both call changed()). Compact labels are not reordered.
+		if not self.isCompact():
+			self.hideUnlabeledEdges()
+			self.restoreUnlabeledEdges()
+		return self.segments()
+
+	def segments(self):
+		"""segmentGraph() results, without modifying the graph: unlabeled
+		edges are skipped rather than hidden, and edges are not reordered."""
+		memo = self.segmentMemo
+		if memoizeSegments and memo != None and memo[0] == self.version:
+			segmentStats['hits'] += 1
+			return memo[1]
+
+		shared = self.sharedSegments
+		result = None
+		if shared != None:
+			key = self.segmentKey()
+			result = shared.results.get(key)
+		if result != None:
+			segmentStats['shared'] += 1
+		else:
+			result = self.findSegments()
+			segmentStats['misses'] += 1
+			if shared != None:
+				shared.results[ key ] = result
+
+		if memoizeSegments:
+			self.segmentMemo = (self.version, result)
+		return result
+
+	def segmentKey(self):
+		"""Hashable key for the inputs of findSegments(): the node label
+		metric, and the labels of nodes and of the visible (labeled) edges,
+		in iteration order."""
+		return (self.cmpNodes, \
+				tuple([ (nid, tuple(labels.items())) \
+					for (nid, labels) in self.nlabels.iteritems() ]), \
+				tuple([ (edge, tuple(labels.items())) \
+					for (edge, labels) in self.elabels.iteritems() \
+					if not unlabeledEdge(labels) ]))
+
+	def findSegments(self):
+		"""Compute segmentGraph() results. Unlabeled edges are skipped."""
+		edges = [ (edge, labels) for (edge, labels) in self.elabels.iteritems() \
+				if len(labels) != 1 or not '_' in labels ]
+		def hasEdge(edge):
+			return edge in self.elabels and not unlabeledEdge(self.elabels[edge])
+
 		primitiveSegmentMap = {}
 		segmentPrimitiveMap = {}
 		#noparentSegments = []
 		segmentEdges = {}  # Edges between detected objects (segments)
 
-		self.hideUnlabeledEdges()
+		# Labels are 'interesting' if they differ from no label (e.g. not '_').
+		interesting = {}
+		def isInteresting(label):
+			if not label in interesting:
+				(cost,_) = self.cmpNodes([label],[])
+				interesting[ label ] = cost > 0
+			return interesting[ label ]
 
 		# Note: a segmentation edge in either direction merges a primitive pair.
 		primSets = {}
 		for node,labs in self.nlabels.items():
 			primSets[node] = {}
 			for l in labs:
-				(cost,_)=self.cmpNodes([l],[])
-				if(cost > 0):
+				if isInteresting(l):
 					primSets[node][l] = set([node])
 			#if len(primSets[node]) == 0:
 			#	primSets[node]['_'] = set([node]) #at least one empty label
-		for (n1, n2) in self.elabels.keys():
-			commonLabels = set(self.nlabels[n1].keys()).intersection(self.nlabels[n2].keys(),self.elabels[(n1,n2)].keys())
+		for ((n1, n2), elabs) in edges:
+			commonLabels = set(self.nlabels[n1].keys()).intersection(self.nlabels[n2].keys(),elabs.keys())
 			for l in commonLabels:
 				#check if this label is interesting or not => compare to 'nothing', if there is not error, it means it is not interesting
-				(cost,_)=self.cmpNodes([l],[])
-				if(cost > 0):
+				if isInteresting(l):
 					primSets[n1][l].add(n2)
 					primSets[n2][l].add(n1)
 
@@ -515,8 +744,11 @@ class Lg(object):
 		# A primitive can belong to several different
 		# segments with different sets of primitives with different labels.
 		# but there is only one segment with the same label attached to each primitive.
+		# Segments are identified by their primitive set: the segment found
+		# first for a set is used for all labels with the same set.
 		i = 0
 		segmentList = []
+		segmentIndex = {}
 		rootSegments = set([])
 		
 		# For each label associated with each primitive, there is a possible object/segment
@@ -524,30 +756,49 @@ class Lg(object):
 			if not primitive in primitiveSegmentMap:
 				primitiveSegmentMap[ primitive ] = {}
 			for lab in segments.keys():
-				alreadySegmented = False
-				for j in range(len(segmentList)):
-					if segments[lab] == segmentList[j]["prim"]:
-						if not primitive in primitiveSegmentMap:
-							primitiveSegmentMap[ primitive ] = {}
-						primitiveSegmentMap[ primitive ][lab] = 'Obj' + str(j)
-						alreadySegmented = True
-						if lab not in segmentList[j]["label"]:
-							segmentPrimitiveMap[  'Obj' + str(j) ][1].append(lab)
-							segmentList[j]["label"].add(lab)
-						break
-
-				if not alreadySegmented:
+				primKey = frozenset(segments[lab])
+				if primKey in segmentIndex:
+					j = segmentIndex[ primKey ]
+					primitiveSegmentMap[ primitive ][lab] = 'Obj' + str(j)
+					if lab not in segmentList[j]["label"]:
+						segmentPrimitiveMap[  'Obj' + str(j) ][1].append(lab)
+						segmentList[j]["label"].add(lab)
+				else:
 					# Add the new segment.
 					newSegment = 'Obj' + str(i)
-					segmentList = segmentList + [ {"label":{lab},"prim":primSets[primitive][lab]} ]
+					segmentIndex[ primKey ] = i
+					segmentList.append({"label":{lab},"prim":primSets[primitive][lab]})
 					segmentPrimitiveMap[ newSegment ] = (segments[lab],[lab])
 					primitiveSegmentMap[ primitive ][lab] = newSegment
 					rootSegments.add(newSegment)
 					i += 1
 
+		# Labels common to all primitive edges from one segment to another, or
+		# None if an edge is missing, by (segment, segment).
+		commonSegmentLabels = {}
+		def commonLabels(pset1, pset2):
+			if not (pset1, pset2) in commonSegmentLabels:
+				common = None
+				missing = False
+				for p1 in segmentPrimitiveMap[ pset1 ][0]:
+					for p2 in segmentPrimitiveMap[ pset2 ][0]:
+						if not hasEdge((p1,p2)):
+							missing = True
+							break
+						labels = set(self.elabels[(p1,p2)].keys())
+						if common == None:
+							common = labels
+						else:
+							common &= labels
+					if missing:
+						common = None
+						break
+				commonSegmentLabels[ (pset1, pset2) ] = common
+			return commonSegmentLabels[ (pset1, pset2) ]
+
 		# Identify 'root' objects/segments (i.e. with no incoming edges),
 		# and edges between objects. **We skip segmentation edges.
-		for (n1, n2), elabs in self.elabels.items():
+		for (n1, n2), elabs in edges:
 			segment1 = primitiveSegmentMap[n1]
 			segment2 = primitiveSegmentMap[n2]
 			
@@ -560,17 +811,27 @@ class Lg(object):
 						#if not in the same seg
 						if pset1 != pset2:
 							#look for the label which is common for all primitive pair in the two segments
-							theRelationLab = possibleRelationLabels
-							for p1 in primSets[n1][l1]:
-								for p2 in primSets[n2][l2]:
-									if(p1,p2) in self.elabels:
-										theRelationLab &= set(self.elabels[(p1,p2)].keys())
-									else:
-										theRelationLab = set([]) # it should be a clique !
+							# Labels common to the two segments are found once. The
+							# result is computed edge by edge if it could depend on
+							# the order of intersection (more than one label, or
+							# a missing edge).
+							common = commonLabels(pset1, pset2)
+							if common != None and \
+									len(possibleRelationLabels & common) < 2:
+								possibleRelationLabels &= common
+								theRelationLab = possibleRelationLabels
+							else:
+								theRelationLab = possibleRelationLabels
+								for p1 in primSets[n1][l1]:
+									for p2 in primSets[n2][l2]:
+										if hasEdge((p1,p2)):
+											theRelationLab &= set(self.elabels[(p1,p2)].keys())
+										else:
+											theRelationLab = set([]) # it should be a clique !
+										if len(theRelationLab) == 0:
+											break
 									if len(theRelationLab) == 0:
 										break
-								if len(theRelationLab) == 0:
-									break
 							# there is a common relation if theRelationLab is not empty
 							if len(theRelationLab) != 0:
 								#we can remove seg2 from the roots
@@ -579,8 +840,7 @@ class Lg(object):
 								#print (str((n1, n2))+ " => " + str(( pset1,  pset2)) + "  = " + str(theRelationLab))
 								for label in theRelationLab:
 									#check if this label is interesting or not => compare to 'nothing', if there is not error, it means it is not interesting
-									(cost,_)=self.cmpNodes([label],[])
-									if(cost > 0):
+									if isInteresting(label):
 										if ( pset1,  pset2) in segmentEdges:
 											if label in segmentEdges[ ( pset1,  pset2) ]:
 												# Sum weights for repeated labels
@@ -595,8 +855,6 @@ class Lg(object):
 											segmentEdges[ ( pset1, pset2) ][label] = \
 													self.elabels[(n1,n2)][label]
 
-		self.restoreUnlabeledEdges()
-
 		return (segmentPrimitiveMap, primitiveSegmentMap, list(rootSegments), \
 				segmentEdges)
 
@@ -633,8 +891,8 @@ class Lg(object):
 					# DEBUG (RZ): this is producing a primitive edge-level count:
 					# do not count segment edges that are undefined (e.g. in one direction,
 					# but not the other)
-					if p != primitive and (p,primitive) in self.elabels.keys() and \
-							lab1 in self.elabels[ (p,primitive) ].keys():
+					labels = self.getEdgeLabels((p,primitive))
+					if p != primitive and labels != None and lab1 in labels:
 						if p in edgeFromP1:
 							edgeFromP1[p].append(lab1)
 						else:  
@@ -643,8 +901,8 @@ class Lg(object):
 			for (lab2,seg2) in ps2[primitive].items():
 				for p in sp2[seg2][0]:
 					# DEBUG (RZ) - see DEBUG comment above.
-					if p != primitive and (p,primitive) in lg2.elabels.keys() and \
-							lab2 in lg2.elabels[ (p, primitive) ].keys():
+					labels = lg2.getEdgeLabels((p,primitive))
+					if p != primitive and labels != None and lab2 in labels:
 						if p in edgeFromP2:
 							edgeFromP2[p].append(lab2)
 						else:
@@ -795,11 +1053,15 @@ class Lg(object):
 				correctSegRelLocations += 1
 
 		# Compute object counts *without* inserted absent nodes.
-		lg2.removeAbsent()
-		self.removeAbsent()
+		if isinstance(self, LgOverlay):
+			(sp2orig, ps2orig, _, sre2orig) = lg2.baseSegments()
+			(sp1orig, ps1orig, _, sre1orig) = self.baseSegments()
+		else:
+			lg2.removeAbsent()
+			self.removeAbsent()
 
-		(sp2orig, ps2orig, _, sre2orig) = lg2.segmentGraph()
-		(sp1orig, ps1orig, _, sre1orig) = self.segmentGraph()
+			(sp2orig, ps2orig, _, sre2orig) = lg2.segmentGraph()
+			(sp1orig, ps1orig, _, sre1orig) = self.segmentGraph()
 		
 		nLg2Objs = len(sp2orig.keys()) 
 		nLg1Objs = len(sp1orig.keys()) 
@@ -808,8 +1070,9 @@ class Lg(object):
 		# missing/additional absent nodes and edges.
 		nLg1ObjsWithAbsent = len(sp1.keys())
 
-		lg2.addAbsent(self)
-		self.addAbsent(lg2)
+		if not isinstance(self, LgOverlay):
+			lg2.addAbsent(self)
+			self.addAbsent(lg2)
 		
 		# RZ (Oct. 2014) Adding indicator variables for different correctness scenarios.
 		hasCorrectSegments = 1 if len(correctSegments) == nLg2Objs and \
@@ -852,13 +1115,23 @@ class Lg(object):
 
 		return (segEdgeMismatch, segDiffs, correctSegments, metrics, primRelEdgeDiffs)
 
-	def compare(self, lg2):
+	def compare(self, lg2, mutate=True, config=None):
 		"""Returns: 1. a list of (metric,value) pairs,
 		2. a list of (n1,n2) node disagreements, 3. (e1,e2) pairs
 		for edge disagreements, 4. dictionary from primitives to
 		disagreeing segment graph edges for (self, lg2). Node and 
 		edge labels are compared using label sets without values, and
-		*not* labels sorted by value."""
+		*not* labels sorted by value. 'ABSENT' nodes are added to both
+		graphs for missing primitives (see matchAbsent()); if mutate is
+		False, neither graph is modified, and ABSENT nodes are added to
+		overlays of the graphs instead (see LgOverlay). Labels are compared
+		with the configuration of the graphs (see compareTools.EvaluationConfig),
+		or with config if given; graphs compared with a config are not
+		modified, as if mutate is False."""
+		if not mutate or config != None:
+			return LgOverlay(self, lg2, config).compare(LgOverlay(lg2, self, \
+					config))
+
 		metrics  = []
 		nodeconflicts = []
 		edgeconflicts = []
@@ -871,8 +1144,10 @@ class Lg(object):
 		nSegRelEdges = len(sre2)
 
 		# Handle case of empty graphs, and missing primitives.
-		# SIDE EFFECT: 'ABSENT' nodes added to each graph.
-		self.matchAbsent(lg2)
+		# SIDE EFFECT: 'ABSENT' nodes added to each graph (overlays already
+		# hold them).
+		if not isinstance(self, LgOverlay):
+			self.matchAbsent(lg2)
 
 		# METRICS
 		# Node and edge labels are considered as sets.
@@ -904,6 +1179,7 @@ class Lg(object):
 		for (graph,oGraph) in [ (self,lg2), (lg2,self) ]:
 			for npair in graph.elabels.keys():
 				if not npair in oGraph.elabels \
+						and not oGraph.hasImplicitEdge(npair) \
 						and (not graph.elabels[ npair ] == ['_']):
 					(cost,errL) = self.cmpEdges(graph.elabels[ npair ].keys(),['_'])
 					elabelMismatch = elabelMismatch + cost
@@ -922,14 +1198,33 @@ class Lg(object):
 					else:
 						for (l1,l2) in errL:
 							edgeconflicts.append((npair, [ (l2, 1.0) ], [(l1, 1.0)] ) )
+
+			# Implicit '_' edges (see labelMissingEdges()) with a node missing
+			# in the other graph. No edge matches no edge without cost (for all
+			# compareTools metrics), but the nodes are recorded.
+			if graph.missingEdgeNodes != None:
+				otherNodes = oGraph.missingEdgeNodes or set()
+				for a in graph.missingEdgeNodes - otherNodes:
+					for b in graph.missingEdgeNodes:
+						for npair in [ (a,b), (b,a) ]:
+							if graph.hasImplicitEdge(npair) \
+									and not npair in oGraph.elabels:
+								nodeEdgeError.update(npair)
 	
 		# Obtain number of primitives with an error of any sort.
 		nodeError = nodeClassError.union(nodeEdgeError)
 
 		# One-sided comparison for common edges. Compared by cmpEdges
-		for npair in self.elabels.keys():
-			if npair in lg2.elabels.keys():
-				(cost,errL) = self.cmpEdges(self.elabels[npair].keys(),lg2.elabels[npair].keys())
+		# Edges of lg2 only match implicit '_' edges of this graph (see
+		# labelMissingEdges()) if there are any.
+		commonEdges = [ (npair, self.elabels[npair]) for npair in self.elabels ]
+		if self.missingEdgeNodes != None:
+			commonEdges += [ (npair, { '_' : 1.0 }) for npair in lg2.elabels \
+					if self.hasImplicitEdge(npair) ]
+		for (npair, labels) in commonEdges:
+			labels2 = lg2.getEdgeLabels(npair)
+			if labels2 != None:
+				(cost,errL) = self.cmpEdges(labels.keys(),labels2.keys())
 				if cost > 0:
 					elabelMismatch = elabelMismatch + cost
 					(a,b) = npair
@@ -1073,6 +1368,8 @@ class Lg(object):
 		for absNode in self.absentNodes:
 			del self.nlabels[ absNode ]
 		
+		if len(self.absentNodes) > 0 or len(self.absentEdges) > 0:
+			self.changed()
 		self.absentNodes = set([])
 		self.absentEdges = set([])
 
@@ -1091,8 +1388,12 @@ class Lg(object):
 
 		# Add "absent" nodes.
 		# NOTE: all edges to/from "absent" nodes are unlabeled.
+		if len(self.absentNodes) > 0:
+			self.expand()
 		for missingNode in self.absentNodes:
 			self.nlabels[ missingNode ] = { 'ABSENT': 1.0 }
+		if len(self.absentNodes) > 0:
+			self.changed()
 
 	def matchAbsent(self, lg2):
 		"""Add all missing primitives and edges between this graph and
@@ -1109,26 +1410,58 @@ class Lg(object):
 	# edges.
 	##################################
 	# Returns NONE: modifies in-place.
-	def labelMissingEdges(self):
-		for node1 in self.nlabels.keys():
-			for node2 in self.nlabels.keys():
+	def labelMissingEdges(self, implicit=False):
+		"""Label all node pairs without an edge '_' (no edge). If implicit is
+		True, no edges are added: pairs of the current nodes without an edge
+		are treated as '_' edges by compare() (see getEdgeLabels()), so that
+		comparisons grow with the number of labeled edges only."""
+		if implicit:
+			self.missingEdgeNodes = set(self.nlabels.keys())
+			return
+
+		self.expand()
+		nodes = self.nlabels.keys()
+		edgeCount = len(self.elabels)
+		for node1 in nodes:
+			for node2 in nodes:
 				if not node1 == node2:
-					if not (node1, node2) in self.elabels.keys():
+					if not (node1, node2) in self.elabels:
 						self.elabels[(node1, node2)] = {'_' : 1.0 }
+		if len(self.elabels) > edgeCount:
+			self.changed()
+
+	def hasImplicitEdge(self, edge):
+		"""True if edge is a '_' edge left implicit by labelMissingEdges()."""
+		nodes = self.missingEdgeNodes
+		return nodes != None and edge[0] in nodes and edge[1] in nodes \
+				and edge[0] != edge[1] and not edge in self.elabels
+
+	def getEdgeLabels(self, edge):
+		"""Label dictionary for an edge, including '_' edges left implicit by
+		labelMissingEdges(), or None if there is no edge."""
+		labels = self.elabels.get(edge)
+		if labels == None and self.hasImplicitEdge(edge):
+			return { '_' : 1.0 }
+		return labels
 
 	# Returns NONE: modifies in-place.
 	def hideUnlabeledEdges(self):
 		"""Move all missing/unlabeled edges to the hiddenEdges field."""
+		self.expand()
 		# Move all edges labeled '_' to the hiddenEdges field.
-		for edge in self.elabels.keys():
-			if set( self.elabels[ edge ].keys() ) == \
-					set( [ '_' ] ):
-				self.hiddenEdges[ edge ] = self.elabels[ edge ]
+		for (edge, labels) in self.elabels.items():
+			if unlabeledEdge(labels):
+				self.hiddenEdges[ edge ] = labels
 				del self.elabels[ edge ]
+		if len(self.hiddenEdges) > 0:
+			self.changed()
 
 	def restoreUnlabeledEdges(self):
 		"""Move all edges in the hiddenEdges field back to the set of
 		edges for the graph."""
+		if len(self.hiddenEdges) > 0:
+			# Restored edges may be listed in a different order.
+			self.changed()
 		for edge in self.hiddenEdges.keys():
 			self.elabels[ edge ] = self.hiddenEdges[ edge ]
 			del self.hiddenEdges[ edge ]
@@ -1146,6 +1479,7 @@ class Lg(object):
 		# Deal with non-common primitives/nodes.
 		# DEBUG: make sure that all absent edges are treated as
 		# 'hard' decisions (i.e. label ('_',1.0))
+		self.expand()
 		self.matchAbsent(lg2)
 		#self.labelMissingEdges()
 
@@ -1154,6 +1488,7 @@ class Lg(object):
 				ncombfn)
 		mergeMaps(self.elabels, self.gweight, lg2.elabels, lg2.gweight,\
 				ecombfn)
+		self.changed()
 
 				
 	# RETURNS None: modifies in-place.
@@ -1172,6 +1507,7 @@ class Lg(object):
 		compareTools to compare the labels with ground truth."""
 		
 		allNodes = set(gt.nlabels.keys()).union(self.nlabels.keys())
+		self.expand()
 		self.matchAbsent(gt)
 
 		for nid in allNodes:
@@ -1196,12 +1532,14 @@ class Lg(object):
 						self.elabels[ npair ] = gt.elabels[npair]
 					else:
 						self.elabels[ npair ] =  {'_' : 1.0}
+		self.changed()
 
 	# RETURNS None: modifies in-place.
 	def selectMaxLabels(self):
 		"""Filter for labels with maximum confidence. NOTE: this will
 		keep all maximum value labels found in each map, e.g. if two
 		classifications have the same likelihood for a node."""
+		self.expand()
 		for object in self.nlabels.keys():
 			max = -1.0
 			maxPairs = {}
@@ -1225,12 +1563,14 @@ class Lg(object):
 					maxPairs[label] = value
 
 			self.elabels[ edge ] = maxPairs
+		self.changed()
 	
 	# RETURNS NONE: modifies in-place.
 	def invertValues(self):
 		"""Substract all node and edge label values from 1.0, to 
 		invert the values. Attempting to invert a value outside [0,1] will
 		set the error flag on the object."""
+		self.expand()
 		for node in self.nlabels.keys():
 			for label in self.nlabels[ node ]:
 				currentValue = self.nlabels[ node ][ label ] 
@@ -1252,63 +1592,122 @@ class Lg(object):
 					self.error = True
 				else:
 					self.elabels[ edge ][ label ] = 1.0 - currentValue
-
-	def subStructIterator(self, nodeNumbers):
+		self.changed()
+
+	def edgeIndex(self):
+		"""Return the out-adjacency index of the graph: a dictionary from each
+		parent node to the (position, child) pairs of its edges, where
+		positions give the order of edges in elabels. Used to enumerate
+		substructures; the index is not updated when edges change."""
+		index = {}
+		for (position, (parent, child)) in enumerate(self.elabels.iterkeys()):
+			index.setdefault(parent, []).append((position, child))
+		return index
+
+	def subStructIterator(self, nodeNumbers, budget=None):
 		""" Return an iterator which gives all substructures with n nodes
-		n belonging to the list depths"""
+		n belonging to the list depths
+		If a budget is given (see SubStructBudget), substructures with the
+		same number of nodes are returned once all have been found, and only
+		within the budget; with a count limit, only enough smaller node sets
+		are extended for the remaining count."""
 		if(isinstance(nodeNumbers, int)):
 			nodeNumbers = [nodeNumbers]
 		subStruct = []
+		index = self.edgeIndex()
+		if budget != None:
+			budget.begin()
 		
+		def budgeted(nodeSets):
+			# Small graphs for the node sets sampled within the budget.
+			kept = budget.sample(nodeSets)
+			for (i, nodeSet) in enumerate(kept):
+				if budget.expired():
+					budget.stop(len(kept) - i)
+					return
+				if len(nodeSet) == 1:
+					n = list(nodeSet)[0]
+					yield smallGraph.SmallGraph([(n, "".join(self.nlabels[n].keys()))], [])
+				else:
+					yield self.getSubSmallGraph(nodeSet, index)
+
 		# Init the substruct with isolated nodes
 		for n in self.nlabels.keys():
 			subStruct.append(set([n]))
-			if 1 in nodeNumbers:
+			if 1 in nodeNumbers and budget == None:
 				yield smallGraph.SmallGraph([(n, "".join(self.nlabels[n].keys()))], [])
+		if 1 in nodeNumbers and budget != None:
+			for sg in budgeted(subStruct):
+				yield sg
+			if budget.stopped:
+				return
 		
 		for d in range(2,max(nodeNumbers)+1):
+			# Within a count limit, extend the sets with the smallest
+			# checksums first, until more sets of d nodes are found than
+			# can be used (the extra ones are skipped by the sample).
+			limit = None
+			if budget != None:
+				limit = budget.remaining()
+				if limit != None:
+					subStruct = sorted(subStruct, key=sampleKey)
 			#add one node to each substructure
 			newSubsS = set([])
 			newSubsL = []
 			for sub in subStruct:
-				le = getEdgesToNeighbours(sub,self.elabels.keys())
+				if limit != None and len(newSubsL) > limit:
+					budget.pruned = True
+					break
+				if budget != None and budget.expired():
+					budget.stop(len(newSubsL) if d in nodeNumbers else 0)
+					return
+				le = edgesFromIndex(index, sub, False)
 				for (f,to) in le:
 					new = sub.union([to])
-					lnew = list(new)
-					lnew.sort()
-					snew = ",".join(lnew)
+					fnew = frozenset(new)
 					
-					if(not snew in newSubsS):
-						newSubsS.add(snew)
+					if(not fnew in newSubsS):
+						newSubsS.add(fnew)
 						newSubsL.append(new)
-						if d in nodeNumbers:
-							yield self.getSubSmallGraph(new)
+						if d in nodeNumbers and budget == None:
+							yield self.getSubSmallGraph(new, index)
+			if d in nodeNumbers and budget != None:
+				for sg in budgeted(newSubsL):
+					yield sg
+				if budget.stopped:
+					return
 			
 			# ??? BUG ???
 			subStruct = newSubsL
 			
-	def getSubSmallGraph(self, nodelist):
+	def getSubSmallGraph(self, nodelist, index=None):
 		"""Return the small graph with the primitives in nodelist and all edges 
-		between them. The used label is the merged list of labels from nodes/edges"""
+		between them. The used label is the merged list of labels from nodes/edges
+		Edges are found through index if given (see edgeIndex())."""
+		if index == None:
+			index = self.edgeIndex()
 		sg = smallGraph.SmallGraph()
 		for n in nodelist:
 			sg.nodes[n] = self.nlabels[n].keys()
-		for e in getEdgesBetweenThem(nodelist,self.elabels.keys()):
+		for e in edgesFromIndex(index, set(nodelist), True):
 			sg.edges[e] = self.elabels[e].keys()
 		return sg
 		
 	# Compare the substructure
-	def compareSubStruct(self, olg, depths):
+	def compareSubStruct(self, olg, depths, budget=None):
 		"""Return the list of couple of substructure which disagree
-		the substructure from self are used as references"""
+		the substructure from self are used as references
+		Substructures are enumerated within budget if given (see
+		SubStructBudget)."""
 		allerrors = []
-		for struc in olg.subStructIterator(depths):
-				sg1 = self.getSubSmallGraph(struc.nodes.keys())
+		index = self.edgeIndex()
+		for struc in olg.subStructIterator(depths, budget):
+				sg1 = self.getSubSmallGraph(struc.nodes.keys(), index)
 				if(not (struc == sg1)):
 					allerrors.append((struc,sg1))
 		return allerrors
 	
-	def compareSegmentsStruct(self, lgGT,depths):
+	def compareSegmentsStruct(self, lgGT,depths, budget=None):
 		"""Compute the number of differing segments, and record disagreements
 		in a list. 
 		The primitives in each subgraph should be of the same number and names
@@ -1317,7 +1716,8 @@ class Lg(object):
 		classification evaluation, the ground-truth should be lgGT.  The first
 		key value of the matrix is the lgGT obj structure, which gives the
 		structure of the corresponding primitives which is the key to get the
-		error structure in self.""" 
+		error structure in self. Object substructures are enumerated within
+		budget if given (see SubStructBudget).""" 
 		(sp1, ps1, _, sre1) = self.segmentGraph()
 		(spGT, psGT, _, sreGT) = lgGT.segmentGraph()
 
@@ -1395,13 +1795,15 @@ class Lg(object):
 			for parentId in thisParentIds:
 				for childId in thisChildIds:
 					# DEBUG: compare only label sets, not values.
-					if not (parentId, childId) in self.elabels.keys() or \
+					if not (parentId, childId) in self.elabels or \
 					   (0,[]) != self.cmpEdges(self.elabels[ (parentId, childId) ].keys(), lgGT.elabels[ (parentId, childId) ].keys()):
 						segEdgeErr.add(thisPair)
 						continue
 		
 		listOfAllError = []
-		for smg in lgObj.subStructIterator(depths):
+		index = self.edgeIndex()
+		indexGT = lgGT.edgeIndex()
+		for smg in lgObj.subStructIterator(depths, budget):
 			#if one segment is in the segment error set
 			showIt = False
 			if len(set(smg.nodes.keys()).intersection(allSegWithErr)) > 0:
@@ -1416,8 +1818,8 @@ class Lg(object):
 				for s in smg.nodes.keys():
 					allPrim.extend(spGT[s][0])
 				
-				smgPrim1 = self.getSubSmallGraph(allPrim)
-				smgPrimGT = lgGT.getSubSmallGraph(allPrim)
+				smgPrim1 = self.getSubSmallGraph(allPrim, index)
+				smgPrimGT = lgGT.getSubSmallGraph(allPrim, indexGT)
 				listOfAllError.append((smg,smgPrimGT,smgPrim1))
 		
 		return listOfAllError 
@@ -1425,6 +1827,87 @@ class Lg(object):
 ################################################################
 # Utility functions
 ################################################################
+class LgOverlay(Lg):
+	"""Read-only view of a graph (base) for comparison with another graph,
+	holding 'ABSENT' nodes for primitives missing from base, as added by
+	Lg.addAbsent(). Edge labels are shared with base, and node labels too
+	if no primitives are missing; neither graph is modified. Labels are
+	compared with config if given, or the configuration of base.
+	Segmentations are computed without hiding unlabeled edges (see
+	Lg.segments())."""
+	__slots__ = ('base',)
+
+	def __init__(self, base, lg2, config=None):
+		Lg.__init__(self)
+		self.base = base
+		self.file = base.file
+		self.gweight = base.gweight
+		if config == None:
+			config = base.config
+		self.config = config
+		self.cmpNodes = config.compareNodes
+		self.cmpEdges = config.compareEdges
+		self.elabels = base.elabels
+		self.missingEdgeNodes = base.missingEdgeNodes
+		self.error = base.error
+
+		# ABSENT nodes already in either graph (see matchAbsent()) are
+		# replaced.
+		nodes = set(base.nlabels.keys()) - base.absentNodes
+		self.absentNodes = set(lg2.nlabels.keys()) - lg2.absentNodes - nodes
+		if len(self.absentNodes) == 0 and len(base.absentNodes) == 0:
+			self.nlabels = base.nlabels
+			return
+
+		self.nlabels = {}
+		for nid in base.nlabels:
+			if not nid in base.absentNodes:
+				self.nlabels[ nid ] = base.nlabels[ nid ]
+		if len(self.absentNodes) > 0:
+			sys.stderr.write('  !! Inserting ABSENT nodes for:\n      ' \
+					+ str(self.file) + ' vs.\n      ' + str(lg2.file) \
+					+ '\n      ' + str(sorted(list(self.absentNodes))) + '\n')
+			self.error = True
+		for missingNode in self.absentNodes:
+			self.nlabels[ missingNode ] = { 'ABSENT': 1.0 }
+
+	def segments(self):
+		"""Segmentations are those of base unless ABSENT nodes are added, or
+		labels are compared with another configuration."""
+		if self.nlabels is self.base.nlabels \
+				and self.cmpNodes is self.base.cmpNodes:
+			return self.base.segments()
+		return Lg.segments(self)
+
+	def segmentGraph(self):
+		return self.segments()
+
+	def baseSegments(self):
+		"""Segmentations of base without ABSENT nodes (neither the overlay's
+		nor those already inserted in base, as for removeAbsent()), with
+		labels compared as in the overlay."""
+		base = self.base
+		absent = base.absentNodes
+		if self.cmpNodes is base.cmpNodes and len(absent) == 0 \
+				and len(base.absentEdges) == 0:
+			return base.segments()
+		view = Lg()
+		view.nlabels = base.nlabels
+		view.elabels = base.elabels
+		if len(absent) > 0 or len(base.absentEdges) > 0:
+			view.nlabels = {}
+			for nid in base.nlabels:
+				if not nid in absent:
+					view.nlabels[ nid ] = base.nlabels[ nid ]
+			view.elabels = {}
+			for (parent, child) in base.elabels:
+				if not (parent, child) in base.absentEdges \
+						and not parent in absent and not child in absent:
+					view.elabels[ (parent, child) ] = \
+							base.elabels[ (parent, child) ]
+		view.cmpNodes = self.cmpNodes
+		return view.segments()
+
 def mergeLabelLists(llist1, weight1, llist2, weight2, combfn):
 	"""Combine values in two label lists according to the passed combfn
 	function, and passed weights for each label list."""
@@ -1490,3 +1973,19 @@ def getEdgesBetweenThem(nodes,edges):
 		if (n1 in nodes and n2 in nodes):
 			edg.add((n1,n2))
 	return edg
+
+def edgesFromIndex(index, nodes, inside):
+	"""As getEdgesBetweenThem() (inside) or getEdgesToNeighbours(), using an
+	out-adjacency index (see Lg.edgeIndex()). Edges are added to the set in
+	the order of the graph's edges, so that the set iterates in the same
+	order as the set returned for all edges of the graph."""
+	found = []
+	for n1 in nodes:
+		for (position, n2) in index.get(n1, []):
+			if (n2 in nodes) == inside:
+				found.append((position, (n1, n2)))
+	found.sort()
+	edg = set([])
+	for (_, edge) in found:
+		edg.add(edge)
+	return edg
@@ -0,0 +1,257 @@
+################################################################
+# lgcache.py
+#
+# Compiled label graph (.lgc) cache. When the LGEVAL_CACHE
+# environment variable names a directory, label graphs read from
+# .lg files are stored there in a compact binary form (marshal),
+# and later loaded from the cache while the .lg file is unchanged
+# (same path, modification time and size). Compiled graphs may
+# also be kept in memory (see keepInMemory()), so that a file read
+# several times by one process is only parsed once.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import os
+import sys
+import array
+import marshal
+import hashlib
+import itertools
+import lgpack
+
+# Increase VERSION when the stored format or .lg reading changes. Arrays
+# are stored in native byte order.
+VERSION = 1
+FORMAT = (VERSION, sys.byteorder)
+
+# Largest label set reordered when storing a graph (see labelOrder()).
+MAX_REORDER = 6
+
+class KeyOrderDict(dict):
+	"""Dictionary recording the order in which keys are first inserted.
+	Used for node and edge label dictionaries while reading a file to be
+	cached: Python dictionaries rebuilt with the same insertion order
+	iterate in the same order, so cached graphs produce identical output."""
+	__slots__ = ('order',)
+
+	def __init__(self):
+		dict.__init__(self)
+		self.order = []
+
+	def __setitem__(self, key, value):
+		if not key in self:
+			self.order.append(key)
+		dict.__setitem__(self, key, value)
+
+# Compiled graphs kept in memory by file name (None before a graph is
+# stored), or None if disabled.
+memoryEntries = None
+
+def keepInMemory(fileNames):
+	"""Keep compiled graphs for the named files in memory, replacing any
+	files kept earlier. An empty list disables the in-memory cache."""
+	global memoryEntries
+	memoryEntries = None
+	if len(fileNames) > 0:
+		memoryEntries = dict([ (fileName, None) for fileName in fileNames ])
+
+def enabled(fileName):
+	"""True if a graph read from fileName is stored in a cache."""
+	return cacheDir() != None or \
+			(memoryEntries != None and fileName in memoryEntries)
+
+def cacheDir():
+	"""Cache directory (LGEVAL_CACHE), or None if caching is disabled."""
+	directory = os.environ.get('LGEVAL_CACHE')
+	if directory == None or directory == '':
+		return None
+	return directory
+
+def cachePath(fileName):
+	"""Cache file for an .lg file, named by its absolute path."""
+	key = hashlib.md5(os.path.abspath(fileName)).hexdigest()
+	return os.path.join(cacheDir(), key + '.lgc')
+
+def fileKey(fileName):
+	"""(absolute path, modification time, size) identifying a file version.
+	For files in a pack, the time and size of the pack are used."""
+	info = lgpack.statFile(fileName)
+	return (os.path.abspath(fileName), info.st_mtime, info.st_size)
+
+def labelOrder(labels):
+	"""Return an insertion order for the keys of a label dictionary that
+	reproduces its iteration order, or None if none is found."""
+	keys = labels.keys()
+	if len(keys) < 2:
+		return keys
+	if len(keys) > MAX_REORDER:
+		return None
+	for order in itertools.permutations(keys):
+		rebuilt = {}
+		for key in order:
+			rebuilt[key] = None
+		if rebuilt.keys() == keys:
+			return list(order)
+	return None
+
+def orderedDict(keys, source):
+	"""Plain dictionary with the entries of source, inserted in keys order."""
+	result = {}
+	for key in keys:
+		result[key] = source[key]
+	return result
+
+def packIndices(values):
+	"""Pack a list of non-negative integers as a (typecode, string) pair,
+	using the smallest array type that holds the largest value."""
+	typecode = 'B'
+	if len(values) > 0:
+		largest = max(values)
+		if largest >= 65536:
+			typecode = 'i'
+		elif largest >= 256:
+			typecode = 'H'
+	return (typecode, array.array(typecode, values).tostring())
+
+def unpackIndices(packed):
+	"""Inverse of packIndices()."""
+	values = array.array(packed[0])
+	values.fromstring(packed[1])
+	return values
+
+def readLabels(count, labelIds, weightIds, offset, labels, weights):
+	"""Label dictionary with 'count' entries from position offset of the
+	label and weight index arrays."""
+	if count == 1:
+		return { labels[ labelIds[offset] ] : weights[ weightIds[offset] ] }
+	labelDict = {}
+	for i in xrange(offset, offset + count):
+		labelDict[ labels[ labelIds[i] ] ] = weights[ weightIds[i] ]
+	return labelDict
+
+def load(lg, fileName):
+	"""Read the node and edge labels of lg from the cache (in memory, then
+	on disk). Returns False if caching is disabled, or the file has no
+	valid cache entry."""
+	if not enabled(fileName):
+		return False
+	try:
+		data = None
+		if memoryEntries != None:
+			data = memoryEntries.get(fileName)
+		if data == None:
+			if cacheDir() == None:
+				return False
+			cacheFile = open(cachePath(fileName), 'rb')
+			data = marshal.load(cacheFile)
+			cacheFile.close()
+		if data[0] != FORMAT or tuple(data[1]) != fileKey(fileName):
+			return False
+	except (IOError, OSError, EOFError, ValueError, TypeError):
+		return False
+	if memoryEntries != None and fileName in memoryEntries:
+		memoryEntries[ fileName ] = data
+
+	(_, _, ids, labels, weights, nodeData, edgeData, anonymous) = data
+	(counts, labelIds, weightIds) = [ unpackIndices(d) for d in nodeData ]
+	nlabels = {}
+	offset = 0
+	for (nid, count) in itertools.izip(ids, counts):
+		nlabels[ nid ] = readLabels(count, labelIds, weightIds, offset, \
+				labels, weights)
+		offset += count
+
+	(parents, children, counts, labelIds, weightIds) = \
+			[ unpackIndices(d) for d in edgeData ]
+	elabels = {}
+	offset = 0
+	for (parent, child, count) in itertools.izip(parents, children, counts):
+		elabels[ (ids[ parent ], ids[ child ]) ] = readLabels(count, labelIds, \
+				weightIds, offset, labels, weights)
+		offset += count
+
+	lg.nlabels = nlabels
+	lg.elabels = elabels
+	if len(anonymous) > 0:
+		sys.stderr.write('  ** Anonymous labels created for:\n\t' \
+			+ str([ ids[i] for i in anonymous ]) + '\n')
+	return True
+
+def store(lg, fileName, anonymousNodes):
+	"""Replace the KeyOrderDict label dictionaries of a graph just read
+	from fileName by plain dictionaries (in the same order), and write the
+	graph to the cache. Graphs with errors are not cached, so that errors
+	are reported each time the file is read."""
+	nodeOrder = lg.nlabels.order
+	edgeOrder = lg.elabels.order
+	lg.nlabels = orderedDict(nodeOrder, lg.nlabels)
+	lg.elabels = orderedDict(edgeOrder, lg.elabels)
+	if lg.error:
+		return
+
+	# Interned identifier, label and weight tables. Nodes and edges are
+	# stored in insertion order, as arrays of table indices; 'counts' hold
+	# the number of labels for each node or edge.
+	ids = [ intern(nid) for nid in nodeOrder ]
+	idIndex = dict([ (nid, i) for (i, nid) in enumerate(ids) ])
+	labels = []
+	labelIndex = {}
+	weights = []
+	weightIndex = {}
+
+	def addLabels(labelDict, counts, labelIds, weightIds):
+		order = labelOrder(labelDict)
+		if order == None:
+			return False
+		counts.append(len(order))
+		for label in order:
+			if not label in labelIndex:
+				labelIndex[ label ] = len(labels)
+				labels.append(intern(label))
+			# Weights are matched by representation (e.g. 0.0 and -0.0 differ).
+			weight = labelDict[ label ]
+			weightKey = repr(weight)
+			if not weightKey in weightIndex:
+				weightIndex[ weightKey ] = len(weights)
+				weights.append(weight)
+			labelIds.append(labelIndex[ label ])
+			weightIds.append(weightIndex[ weightKey ])
+		return True
+
+	nodeData = ([], [], [])
+	for nid in nodeOrder:
+		if not addLabels(lg.nlabels[ nid ], *nodeData):
+			return
+	edgeData = ([], [], [], [], [])
+	for (parent, child) in edgeOrder:
+		edgeData[0].append(idIndex[ parent ])
+		edgeData[1].append(idIndex[ child ])
+		if not addLabels(lg.elabels[ (parent, child) ], *edgeData[2:]):
+			return
+	anonymous = [ idIndex[ nid ] for nid in anonymousNodes ]
+	try:
+		data = (FORMAT, fileKey(fileName), ids, labels, weights, \
+				[ packIndices(d) for d in nodeData ], \
+				[ packIndices(d) for d in edgeData ], anonymous)
+	except (IOError, OSError):
+		return
+	if memoryEntries != None and fileName in memoryEntries:
+		memoryEntries[ fileName ] = data
+
+	# Write to a temporary file first, as other processes may be reading
+	# (or writing) the same entry.
+	directory = cacheDir()
+	if directory == None:
+		return
+	try:
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		path = cachePath(fileName)
+		tempPath = path + '.' + str(os.getpid())
+		cacheFile = open(tempPath, 'wb')
+		marshal.dump(data, cacheFile, 2)
+		cacheFile.close()
+		os.rename(tempPath, path)
+	except (IOError, OSError), e:
+		sys.stderr.write('  !! Cannot write cache entry for ' + fileName \
+				+ ': ' + str(e) + '\n')
@@ -0,0 +1,251 @@
+################################################################
+# lgcompact.py
+#
+# Compact label storage for label graphs (see Lg.compact()). Labels,
+# primitive identifiers and weights are coded as small integers in
+# a table shared by all graphs of a corpus, and the labels of each
+# graph are held in arrays of codes. Read-only dictionary views
+# (NodeLabels and EdgeLabels) take the place of Lg.nlabels and
+# Lg.elabels, so that tools reading graphs work unchanged; label
+# dictionaries are rebuilt when accessed.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import array
+import bisect
+import lgcache
+
+def indexArray(values):
+	"""Array of non-negative integers, using the smallest array type that
+	holds the largest value (as for lgcache.packIndices())."""
+	typecode = 'B'
+	if len(values) > 0:
+		largest = max(values)
+		if largest >= 2 ** 31:
+			typecode = 'l'
+		elif largest >= 65536:
+			typecode = 'i'
+		elif largest >= 256:
+			typecode = 'H'
+	return array.array(typecode, values)
+
+class LabelTable(object):
+	"""Strings (labels and primitive identifiers) and weights, coded by their
+	position in the table. One table is shared by the graphs of a corpus."""
+	__slots__ = ('strings', 'stringCodes', 'weights', 'weightCodes')
+
+	def __init__(self):
+		self.strings = []
+		self.stringCodes = {}
+		self.weights = []
+		self.weightCodes = {}
+
+	def stringCode(self, string):
+		code = self.stringCodes.get(string)
+		if code == None:
+			code = len(self.strings)
+			if isinstance(string, str):
+				string = intern(string)
+			self.strings.append(string)
+			self.stringCodes[ string ] = code
+		return code
+
+	def weightCode(self, weight):
+		# Weights are matched by representation (e.g. 0.0 and -0.0 differ).
+		key = repr(weight)
+		code = self.weightCodes.get(key)
+		if code == None:
+			code = len(self.weights)
+			self.weights.append(weight)
+			self.weightCodes[ key ] = code
+		return code
+
+# Table used when none is given to Lg.compact().
+corpusTable = LabelTable()
+
+def readOnly(*args):
+	raise TypeError('compact label graphs are read-only (see Lg.expand())')
+
+class LabelDict(dict):
+	"""Label dictionary of a node or edge in a compact graph. Labels are
+	rebuilt from the table on each access, so changes would be lost: the
+	dictionary is read-only (copies, e.g. dict(labels), may be modified)."""
+	__slots__ = ()
+
+	__setitem__ = readOnly
+	__delitem__ = readOnly
+	setdefault = readOnly
+	update = readOnly
+	pop = readOnly
+	popitem = readOnly
+	clear = readOnly
+
+class CompactLabels(object):
+	"""Read-only dictionary from keys (nodes or edges) to label dictionaries
+	(LabelDict), stored as arrays of table codes. Keys are listed in the
+	order of the dictionary that was compacted. Subclasses define the keys:
+	keyAt(position) returns the key at a position, and position(key) the
+	position of a key, or None if it is not in the dictionary."""
+	__slots__ = ('table', 'starts', 'labels', 'weights')
+
+	def __init__(self, table, labelDicts):
+		# Labels of the i-th key are at positions starts[i] to starts[i+1].
+		# Labels are stored in an insertion order reproducing the order of
+		# the original dictionary where possible (see lgcache.labelOrder()).
+		self.table = table
+		starts = [ 0 ]
+		labels = []
+		weights = []
+		for labelDict in labelDicts:
+			order = lgcache.labelOrder(labelDict)
+			if order == None:
+				order = labelDict.keys()
+			for label in order:
+				labels.append(table.stringCode(label))
+				weights.append(table.weightCode(labelDict[ label ]))
+			starts.append(len(labels))
+		self.starts = indexArray(starts)
+		self.labels = indexArray(labels)
+		self.weights = indexArray(weights)
+
+	def labelItems(self, position):
+		"""(label, weight) pairs at a position, in stored order."""
+		strings = self.table.strings
+		weights = self.table.weights
+		return [ (strings[ self.labels[i] ], weights[ self.weights[i] ]) \
+				for i in xrange(self.starts[ position ], self.starts[ position + 1 ]) ]
+
+	def labelsAt(self, position):
+		return LabelDict(self.labelItems(position))
+
+	def __len__(self):
+		return len(self.starts) - 1
+
+	def __contains__(self, key):
+		return self.position(key) != None
+
+	has_key = __contains__
+
+	def __getitem__(self, key):
+		position = self.position(key)
+		if position == None:
+			raise KeyError(key)
+		return self.labelsAt(position)
+
+	def get(self, key, default=None):
+		position = self.position(key)
+		if position == None:
+			return default
+		return self.labelsAt(position)
+
+	def iterkeys(self):
+		for position in xrange(len(self)):
+			yield self.keyAt(position)
+
+	__iter__ = iterkeys
+
+	def itervalues(self):
+		for position in xrange(len(self)):
+			yield self.labelsAt(position)
+
+	def iteritems(self):
+		for position in xrange(len(self)):
+			yield (self.keyAt(position), self.labelsAt(position))
+
+	def keys(self):
+		return list(self.iterkeys())
+
+	def values(self):
+		return list(self.itervalues())
+
+	def items(self):
+		return list(self.iteritems())
+
+	__setitem__ = readOnly
+	__delitem__ = readOnly
+	setdefault = readOnly
+	update = readOnly
+	pop = readOnly
+	clear = readOnly
+
+class NodeLabels(CompactLabels):
+	"""Compact node label dictionary (as Lg.nlabels), keyed by identifier."""
+	__slots__ = ('codes', 'sortedCodes', 'sortedPositions')
+
+	def __init__(self, table, nlabels):
+		nodes = nlabels.keys()
+		CompactLabels.__init__(self, table, [ nlabels[ nid ] for nid in nodes ])
+		codes = [ table.stringCode(nid) for nid in nodes ]
+		# Identifiers are found by binary search over their codes.
+		order = sorted(range(len(codes)), key=codes.__getitem__)
+		self.codes = indexArray(codes)
+		self.sortedCodes = indexArray([ codes[i] for i in order ])
+		self.sortedPositions = indexArray(order)
+
+	def keyAt(self, position):
+		return self.table.strings[ self.codes[ position ] ]
+
+	def position(self, key):
+		code = self.table.stringCodes.get(key)
+		if code == None:
+			return None
+		i = bisect.bisect_left(self.sortedCodes, code)
+		if i == len(self.sortedCodes) or self.sortedCodes[i] != code:
+			return None
+		return self.sortedPositions[i]
+
+class EdgeLabels(CompactLabels):
+	"""Compact edge label dictionary (as Lg.elabels), keyed by (parent, child)
+	identifier pairs. Edge nodes must be in the graph's NodeLabels."""
+	__slots__ = ('nodes', 'parents', 'children', 'sortedKeys', \
+			'sortedPositions')
+
+	def __init__(self, table, elabels, nodes):
+		edges = elabels.keys()
+		CompactLabels.__init__(self, table, [ elabels[ edge ] for edge in edges ])
+		self.nodes = nodes
+		parents = []
+		children = []
+		for (parent, child) in edges:
+			(p, c) = (nodes.position(parent), nodes.position(child))
+			if p == None or c == None:
+				raise ValueError('edge node not in graph: ' + str((parent, child)))
+			parents.append(p)
+			children.append(c)
+		# Edges are found by binary search over (parent, child) positions.
+		keys = [ p * len(nodes) + c for (p, c) in zip(parents, children) ]
+		order = sorted(range(len(keys)), key=keys.__getitem__)
+		self.parents = indexArray(parents)
+		self.children = indexArray(children)
+		self.sortedKeys = indexArray([ keys[i] for i in order ])
+		self.sortedPositions = indexArray(order)
+
+	def keyAt(self, position):
+		return (self.nodes.keyAt(self.parents[ position ]), \
+				self.nodes.keyAt(self.children[ position ]))
+
+	def position(self, key):
+		(parent, child) = key
+		p = self.nodes.position(parent)
+		if p == None:
+			return None
+		c = self.nodes.position(child)
+		if c == None:
+			return None
+		edgeKey = p * len(self.nodes) + c
+		i = bisect.bisect_left(self.sortedKeys, edgeKey)
+		if i == len(self.sortedKeys) or self.sortedKeys[i] != edgeKey:
+			return None
+		return self.sortedPositions[i]
+
+def isCompact(labels):
+	"""True for compact label dictionaries (NodeLabels or EdgeLabels)."""
+	return isinstance(labels, CompactLabels)
+
+def expandLabels(labels):
+	"""Plain dictionary with the entries of a compact label dictionary,
+	inserted in its key order."""
+	result = {}
+	for position in xrange(len(labels)):
+		result[ labels.keyAt(position) ] = dict(labels.labelItems(position))
+	return result
@@ -0,0 +1,269 @@
+################################################################
+# lgerrors.py
+#
+# Indexed database of the errors in difference (.diff) files, for
+# ldiff/cdiff-style queries without reading every .diff file. The
+# database (SQLite, Results_<dir>/Errors.db as written by evaluate)
+# holds one row per .diff line in the 'errors' table: its file, type
+# (N, E or S), primitives, and for node and edge errors the output
+# and target labels (in the 'labels' table, one row per distinct
+# label text). Label patterns are matched once per distinct label
+# text; matching files and lines are then found through indices.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import sys
+import os
+import re
+import glob
+import sqlite3
+
+DB_NAME = 'Errors.db'
+
+# Increase VERSION when the database schema changes (stored as the
+# SQLite user_version).
+VERSION = 1
+
+SCHEMA = [
+	'CREATE TABLE files (id INTEGER PRIMARY KEY, name TEXT UNIQUE, ' \
+		+ 'segErrors INTEGER)',
+	'CREATE TABLE labels (id INTEGER PRIMARY KEY, type TEXT, output TEXT, ' \
+		+ 'target TEXT, text TEXT, UNIQUE (type, text))',
+	'CREATE TABLE errors (file INTEGER, type TEXT, primitives TEXT, ' \
+		+ 'label INTEGER)' ]
+INDICES = [
+	'CREATE INDEX errorLabels ON errors (label, file)',
+	'CREATE INDEX errorFiles ON errors (file)',
+	'CREATE INDEX labelOutputs ON labels (output)',
+	'CREATE INDEX labelTargets ON labels (target)' ]
+
+# Pattern matching any label (as used by ldiff and cdiff), and the text
+# between output and target labels in a .diff line.
+ANY = 'any'
+ANYLABEL = '[^,][^,]*'
+MID = ',1.0,:vs:,'
+
+def splitLine(line):
+	"""(type, primitives, label text) for a .diff line (see
+	lgio.writeDiff()). The label text ('output labels:vs:,target labels')
+	is None for segmentation (S) lines."""
+	errorType = line[1:2]
+	if errorType == 'N':
+		(_, primitives, text) = line.split(',', 2)
+		return (errorType, primitives, text)
+	if errorType == 'E':
+		(_, parent, child, text) = line.split(',', 3)
+		return (errorType, parent + ',' + child, text)
+	return (errorType, line[3:], None)
+
+def labelNames(labels):
+	"""Comma-separated label names from a 'label,weight,...' list."""
+	return ','.join(labels.strip(',').split(',')[0::2])
+
+class ErrorWriter(object):
+	"""Writes an error database, one .diff file at a time. The database is
+	built in a temporary file, and replaces fileName when closed."""
+
+	def __init__(self, fileName):
+		self.fileName = fileName
+		self.tempPath = fileName + '.' + str(os.getpid())
+		if os.path.exists(self.tempPath):
+			os.remove(self.tempPath)
+		self.connection = sqlite3.connect(self.tempPath)
+		self.connection.text_factory = str
+		for statement in SCHEMA:
+			self.connection.execute(statement)
+		self.connection.execute('PRAGMA user_version = ' + str(VERSION))
+		self.labelIds = {}
+
+	def labelId(self, errorType, text):
+		key = (errorType, text)
+		labelId = self.labelIds.get(key)
+		if labelId == None:
+			(output, target) = (text + ':vs:,').split(':vs:,')[:2]
+			labelId = self.connection.execute('INSERT INTO labels ' \
+					+ '(type, output, target, text) VALUES (?, ?, ?, ?)', \
+					(errorType, labelNames(output), labelNames(target), \
+						text)).lastrowid
+			self.labelIds[ key ] = labelId
+		return labelId
+
+	def addFile(self, name, diffString):
+		"""Add the lines of a .diff file (name: file name, without its
+		directory)."""
+		rows = []
+		segErrors = 0
+		for line in diffString.splitlines():
+			if not line.startswith('*'):
+				continue
+			(errorType, primitives, text) = splitLine(line)
+			labelId = None
+			if text == None:
+				segErrors += 1
+			else:
+				labelId = self.labelId(errorType, text)
+			rows.append((errorType, primitives, labelId))
+		fileId = self.connection.execute('INSERT INTO files (name, segErrors) ' \
+				+ 'VALUES (?, ?)', (name, segErrors)).lastrowid
+		self.connection.executemany('INSERT INTO errors ' \
+				+ '(file, type, primitives, label) VALUES (?, ?, ?, ?)', \
+				[ (fileId,) + row for row in rows ])
+
+	def close(self):
+		for statement in INDICES:
+			self.connection.execute(statement)
+		self.connection.commit()
+		self.connection.close()
+		os.rename(self.tempPath, self.fileName)
+
+def buildDatabase(resultsDir):
+	"""Write resultsDir/Errors.db from the .diff files in resultsDir/Metrics.
+	Returns the number of files added."""
+	writer = ErrorWriter(os.path.join(resultsDir, DB_NAME))
+	diffFiles = sorted(glob.glob(os.path.join(resultsDir, 'Metrics', '*.diff')))
+	for diffName in diffFiles:
+		diffFile = open(diffName)
+		writer.addFile(os.path.basename(diffName), diffFile.read())
+		diffFile.close()
+	writer.close()
+	return len(diffFiles)
+
+def openDatabase(fileName):
+	if not os.path.exists(fileName):
+		raise IOError('no error database: ' + fileName)
+	connection = sqlite3.connect(fileName)
+	connection.text_factory = str
+	version = connection.execute('PRAGMA user_version').fetchone()[0]
+	if version != VERSION:
+		raise IOError('unsupported error database version: ' + fileName)
+	return connection
+
+class ErrorQuery(object):
+	"""A query with ldiff/cdiff flags (N: node errors, E: edge errors,
+	S: files with segmentation errors, C: files without segmentation errors,
+	^: complement) and output/target label patterns ('any', or a regular
+	expression). Patterns are matched against the label text of each error
+	(the .diff line after its primitives), as 'output,1.0,:vs:,target'."""
+
+	def __init__(self, flags, outputPattern, targetPattern):
+		self.flags = flags
+		self.complement = '^' in flags
+		self.types = [ 'N', 'E' ]
+		if 'N' in flags:
+			self.types = [ 'N' ]
+		elif 'E' in flags:
+			self.types = [ 'E' ]
+		patterns = []
+		for pattern in [ outputPattern, targetPattern ]:
+			if pattern == ANY:
+				pattern = ANYLABEL
+			patterns.append(pattern)
+		self.pattern = re.compile(patterns[0] + MID + patterns[1])
+
+	def fileIds(self, connection):
+		"""Candidate files (as for the S and C flags), in name order."""
+		condition = ''
+		if 'S' in self.flags:
+			condition = ' WHERE segErrors > 0'
+		elif 'C' in self.flags:
+			condition = ' WHERE segErrors = 0'
+		return [ row[0] for row in connection.execute('SELECT id FROM files' \
+				+ condition + ' ORDER BY name') ]
+
+	def labelIds(self, connection):
+		"""Ids of the label texts matching the patterns."""
+		return set([ labelId for (labelId, errorType, text) \
+				in connection.execute('SELECT id, type, text FROM labels') \
+				if errorType in self.types and self.pattern.search(text) ])
+
+	def matchingFiles(self, connection, labelIds):
+		"""Ids of the files with an error on one of the labels."""
+		matches = set()
+		for labelId in labelIds:
+			matches.update([ row[0] for row in connection.execute( \
+					'SELECT DISTINCT file FROM errors WHERE label = ?', (labelId,)) ])
+		return matches
+
+	def files(self, connection):
+		"""Names of the files with (or with ^, without) a matching error,
+		in name order, as listed by ldiff."""
+		names = dict(connection.execute('SELECT id, name FROM files'))
+		matches = self.matchingFiles(connection, self.labelIds(connection))
+		return [ names[ fileId ] for fileId in self.fileIds(connection) \
+				if (fileId in matches) != self.complement ]
+
+	def lines(self, connection):
+		"""(file name, .diff line) pairs for the matching (or with ^,
+		non-matching) errors, in file and line order, as listed by cdiff."""
+		labelIds = self.labelIds(connection)
+		candidates = self.fileIds(connection)
+		names = dict(connection.execute('SELECT id, name FROM files'))
+		if not self.complement:
+			matches = self.matchingFiles(connection, labelIds)
+			candidates = [ fileId for fileId in candidates if fileId in matches ]
+		labelTexts = dict(connection.execute('SELECT id, text FROM labels'))
+		result = []
+		for fileId in candidates:
+			for (errorType, primitives, labelId) in connection.execute( \
+					'SELECT type, primitives, label FROM errors WHERE file = ? ' \
+					+ 'ORDER BY rowid', (fileId,)):
+				if (labelId in labelIds) == self.complement:
+					continue
+				line = '*' + errorType + ',' + primitives
+				if labelId != None:
+					line += ',' + labelTexts[ labelId ]
+				result.append((names[ fileId ], line))
+		return result
+
+def main():
+	commands = [ 'build', 'files', 'lines' ]
+	if len(sys.argv) < 3 or not sys.argv[1] in commands:
+		print("Usage: [[python]] lgerrors.py build <resultsDir>")
+		print("   OR  [[python]] lgerrors.py files <Errors.db> [-NESC^] outputPattern targetPattern")
+		print("   OR  [[python]] lgerrors.py lines <Errors.db> [-NESC^] outputPattern targetPattern")
+		print("")
+		print("    build: write resultsDir/" + DB_NAME + " from the .diff files in")
+		print("    resultsDir/Metrics (evaluate writes it while evaluating).")
+		print("")
+		print("    files: list the .diff files with errors matching the patterns")
+		print("    (as ldiff). lines: list the matching .diff lines, each preceded")
+		print("    by its file name (as cdiff). Flags are as for ldiff and cdiff;")
+		print("    these call lgerrors.py when passed an " + DB_NAME + " file in place of")
+		print("    .diff files.")
+		print("")
+		print("    Patterns are Python regular expressions (largely compatible")
+		print("    with egrep), matched against the labels of each error; the")
+		print("    pattern 'any' matches any label.")
+		sys.exit(0)
+
+	if sys.argv[1] == 'build':
+		count = buildDatabase(sys.argv[2])
+		print(str(count) + ' .diff files added to ' \
+				+ os.path.join(sys.argv[2], DB_NAME))
+		return
+
+	args = sys.argv[3:]
+	flags = ''
+	if len(args) > 0 and args[0].startswith('-'):
+		flags = args[0]
+		args = args[1:]
+	if len(args) < 2:
+		sys.stderr.write('  !! Output and target patterns are required.\n')
+		sys.exit(1)
+	try:
+		connection = openDatabase(sys.argv[2])
+		query = ErrorQuery(flags, args[0], args[1])
+	except (IOError, re.error), e:
+		sys.stderr.write('  !! ' + str(e) + '\n')
+		sys.exit(1)
+
+	if sys.argv[1] == 'files':
+		for name in query.files(connection):
+			print(name)
+	else:
+		for (name, line) in query.lines(connection):
+			print(name + ':' + line)
+	connection.close()
+
+if __name__ == '__main__':
+	main()
@@ -39,6 +39,7 @@ def main():
 				removedNotes += '#   Removed (' + str(prim1) + ',' + str(prim2) \
 						+ ') ' + str(lg.elabels[(prim1,prim2)]) + '\n'
 				del lg.elabels[(prim1,prim2)]
+	lg.changed()
 	
 	topString = '# Created by lgfilter.py from ' + fileName + '\n' 
 	topString += removedNotes
@@ -0,0 +1,251 @@
+################################################################
+# lgmetrics.py
+#
+# Columnar store of per-file metrics (.lgm). The metrics of an
+# evaluation are held as one typed array per metric, along with a
+# file name column and a Correct/Incorrect column, and written to a
+# single file (marshal), e.g. Results_<dir>/FileMetrics.lgm as
+# written by batchlg.py. Queries over a metric (values, sorted
+# values, distributions, totals and filters such as 'D_B > 0') run
+# over whole columns, without parsing the per-file metric rows.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import sys
+import os
+import csv
+import array
+import marshal
+import operator
+import itertools
+
+STORE_EXT = '.lgm'
+
+# Increase VERSION when the stored format changes. Arrays are stored in
+# native byte order.
+VERSION = 1
+FORMAT = (VERSION, sys.byteorder)
+
+# Comparisons accepted by MetricStore.select().
+OPERATORS = { '>' : operator.gt, '>=' : operator.ge, '<' : operator.lt, \
+		'<=' : operator.le, '==' : operator.eq, '!=' : operator.ne }
+
+def columnArray(values):
+	"""Array holding a column of metric values: integers ('i') if all
+	values are integers that fit, and doubles ('d') otherwise."""
+	typecode = 'i'
+	for value in values:
+		if value != int(value) or abs(value) >= 2 ** 31:
+			typecode = 'd'
+			break
+	if typecode == 'i':
+		values = [ int(value) for value in values ]
+	return array.array(typecode, values)
+
+def metricRow(metricString):
+	"""(names, values) lists from a metric row, which alternates metric
+	names and values (see lgio.writeMetrics())."""
+	entries = [ entry.strip() for entry in metricString.strip().split(',') ]
+	return (entries[0::2], [ float(value) for value in entries[1::2] ])
+
+class MetricStore(object):
+	"""Metric values for a set of files, held by column: 'files' (names),
+	'correct' (1 for correct files, 0 otherwise) and one array per metric
+	in 'columns', for the metrics in 'names'."""
+	__slots__ = ('files', 'correct', 'names', 'columns')
+
+	def __init__(self, files=[], correct=[], names=[], rows=[]):
+		# rows holds the values of each file, in 'names' order.
+		self.files = list(files)
+		self.correct = array.array('B', correct)
+		self.names = list(names)
+		self.columns = {}
+		for (i, name) in enumerate(self.names):
+			self.columns[ name ] = columnArray([ row[i] for row in rows ])
+
+	def __len__(self):
+		return len(self.files)
+
+	def column(self, metric):
+		"""Array of values for a metric (in file order)."""
+		if not metric in self.columns:
+			raise KeyError('no metric named ' + metric)
+		return self.columns[ metric ]
+
+	def values(self, metric, sort=False):
+		"""(file, value) pairs for a metric, in file order or by increasing
+		value (files with equal values remain in file order)."""
+		pairs = zip(self.files, map(float, self.column(metric)))
+		if sort:
+			pairs.sort(key=operator.itemgetter(1))
+		return pairs
+
+	def distribution(self, metric):
+		"""(value, file count) pairs for a metric, by increasing value."""
+		return [ (float(value), len(list(group))) \
+				for (value, group) in itertools.groupby(sorted(self.column(metric))) ]
+
+	def total(self, metric):
+		return sum(self.column(metric))
+
+	def mean(self, metric):
+		if len(self.files) == 0:
+			return None
+		return float(self.total(metric)) / len(self.files)
+
+	def select(self, metric, comparison, value):
+		"""Files whose metric value satisfies a comparison with value, e.g.
+		select('D_B', '>', 0). Comparisons are listed in OPERATORS."""
+		if not comparison in OPERATORS:
+			raise ValueError('unknown comparison: ' + comparison)
+		matches = itertools.imap(OPERATORS[ comparison ], self.column(metric), \
+				itertools.repeat(value))
+		return list(itertools.compress(self.files, matches))
+
+	def incorrectFiles(self):
+		return [ fileName for (fileName, correct) \
+				in itertools.izip(self.files, self.correct) if not correct ]
+
+def fromResults(fileResults):
+	"""Store for (file, 'Correct'/'Incorrect'/'Error', metric row) triples, as
+	written to FileMetrics.csv by batchlg.writeFileMetrics()."""
+	files = []
+	correct = []
+	names = None
+	rows = []
+	for (fileName, result, metricString) in fileResults:
+		(rowNames, values) = metricRow(metricString)
+		if names == None:
+			names = rowNames
+		elif rowNames != names:
+			raise ValueError('metric names differ for ' + fileName)
+		files.append(fileName)
+		correct.append(int(result == 'Correct'))
+		rows.append(values)
+	return MetricStore(files, correct, names or [], rows)
+
+def fromMetricFile(fileName):
+	"""Store for a metric (.m) file, holding a '*M,file' line followed by
+	the metric row of each file (as read by sumMetric.py and metricDist.py).
+	Files with a non-zero D_B, D_C or D_E(%) distance are incorrect."""
+	fileResults = []
+	current = None
+	for row in csv.reader(open(fileName)):
+		# Skip blank lines.
+		if len(row) == 0:
+			continue
+		if row[0].strip() == '*M':
+			current = row[1]
+			continue
+		metricString = ','.join(row)
+		(names, values) = metricRow(metricString)
+		metrics = dict(zip(names, values))
+		result = 'Correct'
+		for metric in [ 'D_B', 'D_C', 'D_E(%)' ]:
+			if metrics.get(metric, 0) != 0:
+				result = 'Incorrect'
+		fileResults.append((current, result, metricString))
+	return fromResults(fileResults)
+
+def writeStore(fileName, store):
+	"""Write a store to fileName, through a temporary file."""
+	data = (FORMAT, store.files, store.correct.tostring(), store.names, \
+			[ (store.columns[ name ].typecode, store.columns[ name ].tostring()) \
+				for name in store.names ])
+	tempPath = fileName + '.' + str(os.getpid())
+	storeFile = open(tempPath, 'wb')
+	marshal.dump(data, storeFile, 2)
+	storeFile.close()
+	os.rename(tempPath, fileName)
+
+def readStore(fileName):
+	"""Read a store written by writeStore()."""
+	storeFile = open(fileName, 'rb')
+	try:
+		data = marshal.load(storeFile)
+	except (EOFError, ValueError, TypeError):
+		raise IOError('not a metric store: ' + fileName)
+	finally:
+		storeFile.close()
+	if data[0] != FORMAT:
+		raise IOError('unsupported metric store version: ' + fileName)
+
+	(_, files, correct, names, columns) = data
+	store = MetricStore()
+	store.files = files
+	store.correct.fromstring(correct)
+	store.names = names
+	for (name, (typecode, values)) in zip(names, columns):
+		column = array.array(typecode)
+		column.fromstring(values)
+		store.columns[ name ] = column
+	return store
+
+def isStore(fileName):
+	return fileName.endswith(STORE_EXT)
+
+def main():
+	commands = [ 'build', 'list', 'values', 'dist', 'select' ]
+	if len(sys.argv) < 3 or not sys.argv[1] in commands:
+		print("Usage: [[python]] lgmetrics.py build <file.m> <store" + STORE_EXT + ">")
+		print("   OR  [[python]] lgmetrics.py list <store" + STORE_EXT + ">")
+		print("   OR  [[python]] lgmetrics.py values <store" + STORE_EXT + "> <metric> [sort]")
+		print("   OR  [[python]] lgmetrics.py dist <store" + STORE_EXT + "> <metric>")
+		print("   OR  [[python]] lgmetrics.py select <store" + STORE_EXT + "> <metric> <op> <value>")
+		print("")
+		print("    build: write a metric store for a metric (.m) file, e.g. the")
+		print("    <dir>.csv file written by evaluate. evaluate also writes")
+		print("    Results_<dir>/FileMetrics" + STORE_EXT + " directly.")
+		print("")
+		print("    list: print the number of files and the metric names.")
+		print("    values: print (file, value) pairs for a metric, as metricDist.py.")
+		print("    dist: print (value, file count) pairs for a metric.")
+		print("    select: print the files for which 'metric op value' holds,")
+		print("    where op is one of " + ' '.join(sorted(OPERATORS.keys())) \
+				+ ", e.g. select s.lgm D_B '>' 0")
+		print("")
+		print("    !NOTE! Metric names and operators with special characters,")
+		print("    e.g. 'D_E(%)' or '>', *must* be passed in quotes.")
+		sys.exit(0)
+
+	command = sys.argv[1]
+	if command == 'build':
+		if len(sys.argv) < 4:
+			sys.stderr.write('  !! No store file given.\n')
+			sys.exit(1)
+		store = fromMetricFile(sys.argv[2])
+		writeStore(sys.argv[3], store)
+		print(str(len(store)) + ' files stored in ' + sys.argv[3])
+		return
+
+	store = readStore(sys.argv[2])
+	if command == 'list':
+		print(str(len(store)) + ' files, ' + str(len(store.incorrectFiles())) \
+				+ ' incorrect')
+		for name in store.names:
+			print(name)
+		return
+
+	if len(sys.argv) < 4:
+		sys.stderr.write('  !! No metric given.\n')
+		sys.exit(1)
+	metric = sys.argv[3]
+	try:
+		if command == 'values':
+			for (fileName, value) in store.values(metric, len(sys.argv) > 4):
+				print(fileName + ', ' + str(value))
+		elif command == 'dist':
+			for (value, count) in store.distribution(metric):
+				print(str(value) + ', ' + str(count))
+		else:
+			if len(sys.argv) < 6:
+				sys.stderr.write('  !! select needs a metric, operator and value.\n')
+				sys.exit(1)
+			for fileName in store.select(metric, sys.argv[4], float(sys.argv[5])):
+				print(fileName)
+	except (KeyError, ValueError), e:
+		sys.stderr.write('  !! ' + str(e.args[0]) + '\n')
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
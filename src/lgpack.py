@@ -0,0 +1,150 @@
+################################################################
+# lgpack.py
+#
+# Packed label graph collections (.lgpack). A pack holds all .lg
+# files from a directory in a single file: a text header indexing
+# file names by offset and length, followed by the file contents.
+# Packs are read through a memory map, so only the files used are
+# read. A file 'name.lg' in pack 'dir.lgpack' is named using the
+# path 'dir.lgpack/name.lg', wherever a .lg file name is accepted.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import sys
+import os
+import glob
+import mmap
+
+PACK_EXT = '.lgpack'
+MAGIC = 'LGPACK 1'
+
+class LgPack(object):
+	"""Read-only, memory-mapped .lgpack file."""
+	__slots__ = ('path', 'names', 'index', 'data')
+
+	def __init__(self, path):
+		self.path = path
+		packFile = open(path, 'rb')
+		try:
+			self.data = mmap.mmap(packFile.fileno(), 0, access=mmap.ACCESS_READ)
+		finally:
+			packFile.close()
+
+		# Header: magic line, file count, then 'name<TAB>offset<TAB>length'
+		# lines. Offsets are relative to the end of the header.
+		if self.data.readline().rstrip('\n') != MAGIC:
+			raise IOError('not an .lgpack file: ' + path)
+		count = int(self.data.readline())
+		entries = [ self.data.readline().rstrip('\n').split('\t') \
+				for i in range(count) ]
+		start = self.data.tell()
+		self.names = [ name for (name, _, _) in entries ]
+		self.index = dict([ (name, (start + int(offset), int(length))) \
+				for (name, offset, length) in entries ])
+
+	def read(self, name):
+		"""Return the contents of a packed file."""
+		if not name in self.index:
+			raise IOError('no file ' + name + ' in ' + self.path)
+		(offset, length) = self.index[ name ]
+		return self.data[ offset : offset + length ]
+
+# Packs opened in this process, by path.
+openPacks = {}
+
+def getPack(path):
+	"""Return the (shared) LgPack object for a pack file."""
+	if not path in openPacks:
+		openPacks[ path ] = LgPack(path)
+	return openPacks[ path ]
+
+def isPack(path):
+	return path.endswith(PACK_EXT) and os.path.isfile(path)
+
+def packMember(fileName):
+	"""Return (pack path, file name) for a path naming a file in a pack,
+	or None for other paths."""
+	position = fileName.rfind(PACK_EXT + '/')
+	if position < 0:
+		return None
+	packPath = fileName[ : position + len(PACK_EXT) ]
+	if not os.path.isfile(packPath):
+		return None
+	return (packPath, fileName[ position + len(PACK_EXT) + 1 : ])
+
+def readFile(fileName):
+	"""Return the contents of a file, which may be in a pack. Raises
+	IOError if the file cannot be read."""
+	member = packMember(fileName)
+	if member != None:
+		return getPack(member[0]).read(member[1])
+	inFile = open(fileName)
+	text = inFile.read()
+	inFile.close()
+	return text
+
+def statFile(fileName):
+	"""os.stat() for a file; files in a pack use the pack's status."""
+	member = packMember(fileName)
+	if member != None:
+		return os.stat(member[0])
+	return os.stat(fileName)
+
+def listFiles(directory):
+	"""Sorted list of .lg file paths in a directory or pack."""
+	if isPack(directory):
+		return [ directory + '/' + name \
+				for name in sorted(getPack(directory).names) ]
+	return sorted(glob.glob(os.path.join(directory, '*.lg')))
+
+def writePack(directory, packPath):
+	"""Pack all .lg files in directory into packPath. Returns the number
+	of files packed."""
+	fileNames = sorted(glob.glob(os.path.join(directory, '*.lg')))
+	header = [ MAGIC, str(len(fileNames)) ]
+	offset = 0
+	for fileName in fileNames:
+		name = os.path.basename(fileName)
+		if '\t' in name or '\n' in name:
+			raise IOError('cannot pack file name: ' + repr(name))
+		length = os.path.getsize(fileName)
+		header.append(name + '\t' + str(offset) + '\t' + str(length))
+		offset += length
+
+	packFile = open(packPath, 'wb')
+	packFile.write('\n'.join(header) + '\n')
+	for fileName in fileNames:
+		inFile = open(fileName, 'rb')
+		packFile.write(inFile.read())
+		inFile.close()
+	packFile.close()
+	return len(fileNames)
+
+def main():
+	if len(sys.argv) < 3 or not sys.argv[1] in ['pack', 'list']:
+		print("Usage: [[python]] lgpack.py pack <directory> [packFile]")
+		print("   OR  [[python]] lgpack.py list <packFile>")
+		print("")
+		print("    pack: write all .lg files in directory to a single pack file")
+		print("    (default: <directory>" + PACK_EXT + ").")
+		print("")
+		print("    list: print the path of each file in a pack. Files are named")
+		print("    <packFile>/<name>.lg; programs reading .lg files accept these")
+		print("    paths, and evaluate and confHist accept packs in place of")
+		print("    directories.")
+		sys.exit(0)
+
+	if sys.argv[1] == 'pack':
+		directory = sys.argv[2].rstrip('/')
+		packPath = directory + PACK_EXT
+		if len(sys.argv) > 3:
+			packPath = sys.argv[3]
+		count = writePack(directory, packPath)
+		print(str(count) + ' files packed in ' + packPath)
+	else:
+		# Directories are listed too (as for 'ls dir/*.lg').
+		for fileName in listFiles(sys.argv[2].rstrip('/')):
+			print(fileName)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,49 @@
+################################################################
+# lgpool.py
+#
+# Process pool helpers for evaluating many label graph files in
+# parallel. Results are always returned in input order, so that
+# output files are identical to those produced by a serial run.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import os
+import multiprocessing
+
+def workerCount(argv=[]):
+	"""Number of worker processes to use. A 'WORKERS=n' argument takes
+	precedence over the LGEVAL_WORKERS environment variable; by default
+	one worker per core is used."""
+	count = None
+	for arg in argv:
+		if arg.startswith('WORKERS='):
+			count = arg[len('WORKERS='):]
+	if count == None:
+		count = os.environ.get('LGEVAL_WORKERS')
+	if count == None:
+		return multiprocessing.cpu_count()
+	return max(1, int(count))
+
+def removeWorkerArgs(argv):
+	"""Return the argument list without 'WORKERS=n' entries."""
+	return [ arg for arg in argv if not arg.startswith('WORKERS=') ]
+
+def orderedMap(function, items, workers):
+	"""Generator applying function to each item, yielding results in the
+	order of items. With more than one worker, items are distributed over
+	a process pool; function must then be defined at module level."""
+	if workers <= 1 or len(items) < 2:
+		for item in items:
+			yield function(item)
+		return
+
+	# Small chunks keep workers balanced when file sizes vary.
+	chunkSize = max(1, len(items) // (workers * 16))
+	pool = multiprocessing.Pool(min(workers, len(items)))
+	try:
+		for result in pool.imap(function, items, chunkSize):
+			yield result
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
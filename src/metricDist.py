@@ -11,6 +11,8 @@ import sys
 import csv
 import math
 
+import lgmetrics
+
 def main():
 	if len(sys.argv) < 3:
 		print("Usage : [[python]] metricDist.py <metric_name> <file1.m> [sort]\n")
@@ -24,10 +26,25 @@ def main():
 		print("")
 		print("    Any third argument (e.g. 'sort') will result in sorting")
 		print("    the values before they are output.")
+		print("")
+		print("    file1.m may also be a metric store (e.g. FileMetrics.lgm")
+		print("    written by evaluate; see lgmetrics.py).")
 		sys.exit(0)
 
-	# Read metric data from CSV file.
+	# Metric stores hold the values by column.
 	fileName = sys.argv[2]
+	if lgmetrics.isStore(fileName):
+		try:
+			store = lgmetrics.readStore(fileName)
+			values = store.values(sys.argv[1], len(sys.argv) > 3)
+		except (IOError, KeyError), e:
+			sys.stderr.write('  !! ' + str(e.args[0]) + '\n')
+			sys.exit(0)
+		for val in values:
+			print(val[0] + ', ' + str(val[1]))
+		return
+
+	# Read metric data from CSV file.
 	fileOut = open("listStrokeN.txt","w")
 	try:
 		fileReader = csv.reader(open(fileName))
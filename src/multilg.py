@@ -0,0 +1,200 @@
+################################################################
+# multilg.py
+#
+# Multi-system evaluation: compares the output of several systems
+# against one ground truth set (e.g. for a competition). Each
+# ground truth file is read and segmented once, then compared with
+# the output of every system for that file. Results for each system
+# are written to Results_<system> as by batchlg.py, and a combined
+# leaderboard is written to Leaderboard.csv.
+#
+# Copyright (c) 2012-2016 Richard Zanibbi and Harold Mouchere
+################################################################
+import sys
+import os
+import csv
+
+from lg import *
+import batchlg
+import compareTools
+import lgcache
+import lgpack
+import lgpool
+import sumMetric
+
+def systemName(outputDir):
+	"""System name for an output directory or pack (its base name)."""
+	name = os.path.basename(outputDir.rstrip('/'))
+	if name.endswith(lgpack.PACK_EXT):
+		name = name[ : -len(lgpack.PACK_EXT) ]
+	return name
+
+def compareSystems(task):
+	"""Process pool worker: compare a ground truth file with the output
+	file of each system in task (targetFile, outputFiles, inter). Systems
+	with None in place of an output file are skipped (None is returned for
+	them). The ground truth file is parsed once, and its segmentations are
+	shared between systems. Returns a list of comparePair() results, as
+	for batchlg.compareTask()."""
+	(targetFile, outputFiles, inter) = task
+	sharedSegments = SharedSegments()
+	results = []
+	# Copies of the ground truth graph are built from memory.
+	lgcache.keepInMemory([ targetFile ])
+	try:
+		for outputFile in outputFiles:
+			if outputFile == None:
+				results.append(None)
+				continue
+			try:
+				results.append(batchlg.comparePair(outputFile, targetFile, \
+						inter, sharedSegments=sharedSegments))
+			except Exception, e:
+				results.append(batchlg.failedResult(str(e), outputFile, \
+						targetFile, inter, sharedSegments=sharedSegments))
+	finally:
+		lgcache.keepInMemory([])
+	return results
+
+def runEvaluations(targetDir, outputDirs, inter=False, workers=1):
+	"""Evaluate the output of each system (directory or pack) in outputDirs
+	against the ground truth in targetDir, writing results to the
+	Results_<system> directory for each system. Files already evaluated
+	for a system are not re-evaluated (see batchlg.runEvaluation()).
+	Returns the list of (system name, results directory) pairs."""
+	systems = []
+	systemPairs = []
+	systemPending = []
+	for outputDir in outputDirs:
+		name = systemName(outputDir)
+		resultsDir = 'Results_' + name
+		pairs = batchlg.dirPairs(outputDir, targetDir)
+		systems.append((name, resultsDir))
+		systemPairs.append(pairs)
+		systemPending.append(batchlg.pendingPairs(resultsDir, pairs))
+
+	# One task per ground truth file, holding the output files of all
+	# systems that have not evaluated it yet.
+	tasks = []
+	for (i, (_, targetFile, _)) in enumerate(systemPairs[0]):
+		outputFiles = []
+		for (pairs, pending) in zip(systemPairs, systemPending):
+			if pending[i]:
+				outputFiles.append(pairs[i][0])
+			else:
+				outputFiles.append(None)
+		if outputFiles.count(None) < len(outputFiles):
+			tasks.append((targetFile, outputFiles, inter))
+	results = list(lgpool.orderedMap(compareSystems, tasks, workers))
+
+	for (s, (name, resultsDir)) in enumerate(systems):
+		print('System ' + name + ' (' + outputDirs[s] + '):')
+		systemResults = iter([ result[s] for result in results \
+				if result[s] != None ])
+		pairs = systemPairs[s]
+		batchlg.recordResults(resultsDir, pairs, systemPending[s], \
+				systemResults, batchlg.otherOutputFiles(outputDirs[s], pairs))
+	return systems
+
+def systemScores(resultsDir):
+	"""Return (files, correct files (%), correct structure (%), and
+	f-measures (%) for objects, objects + classes, relations and
+	relations + classes) from FileMetrics.csv in resultsDir. Files whose
+	comparison failed ('Error', scored as an empty output, see
+	batchlg.failedResult()) are counted as incorrect, so that files is
+	the number of ground truth files for every system."""
+	totals = {}
+	files = 0
+	correct = 0
+	metricFile = open(os.path.join(resultsDir, 'FileMetrics.csv'))
+	rows = csv.reader(metricFile)
+	header = None
+	for row in rows:
+		if header == None:
+			header = [ field.strip() for field in row ]
+			continue
+		files += 1
+		# 'Incorrect' and 'Error' files are not correct.
+		if row[1].strip() == 'Correct':
+			correct += 1
+		for (field, value) in zip(header[2:], row[2:]):
+			totals[ field ] = totals.get(field, 0.0) + float(value)
+	metricFile.close()
+
+	def rate(count, total):
+		if total == 0:
+			return 100.0
+		return 100 * float(count) / total
+
+	def fmeasure(count, targets, detected):
+		return sumMetric.fmeasure(rate(count, targets), rate(count, detected))
+
+	if files == 0:
+		return (0, 100.0, 100.0, 100.0, 100.0, 100.0, 100.0)
+	return (files, rate(correct, files), \
+			rate(totals['hasCorrectStructure'], files), \
+			fmeasure(totals['CorrectSegments'], totals['nSeg'], \
+				totals['detectedSeg']), \
+			fmeasure(totals['CorrectSegmentsAndClass'], totals['nSeg'], \
+				totals['detectedSeg']), \
+			fmeasure(totals['CorrectSegRelLocations'], totals['nSegRelEdges'], \
+				totals['dSegRelEdges']), \
+			fmeasure(totals['CorrectSegRels'], totals['nSegRelEdges'], \
+				totals['dSegRelEdges']))
+
+LEADERBOARD_FIELDS = [ 'Rank', 'System', 'Files', 'Correct(%)', \
+		'Structure(%)', 'Objects', '+ Classes', 'Relations', '+ Classes' ]
+
+def writeLeaderboard(systems, fileName):
+	"""Rank systems by correct files, then correct structure and object
+	classification; write the ranking to fileName (CSV) and print it."""
+	scores = [ (systemScores(resultsDir), name) \
+			for (name, resultsDir) in systems ]
+	scores.sort(key=lambda (score, name): (-score[1], -score[2], -score[4], \
+			name))
+
+	boardFile = open(fileName, 'w')
+	boardFile.write(','.join(LEADERBOARD_FIELDS) + '\n')
+	print('')
+	print('Leaderboard (object and relation columns are f-measures, %):')
+	sumMetric.printTable(13, LEADERBOARD_FIELDS)
+	print('-' * 13 * len(LEADERBOARD_FIELDS))
+	for (rank, (score, name)) in enumerate(scores):
+		boardFile.write(','.join([ str(rank + 1), name ] \
+				+ [ str(value) for value in score ]) + '\n')
+		sumMetric.printTable(13, [ rank + 1, name ] + list(score))
+	boardFile.close()
+
+def main():
+	args = lgpool.removeWorkerArgs(sys.argv[1:])
+	if len(args) < 2:
+		print("Usage: [[python]] multilg.py <groundTruthDir> <outputDir1> [<outputDir2> ...] [WORKERS=n]")
+		print("")
+		print("    Evaluates the .lg files in each output directory against the")
+		print("    files with the same name in groundTruthDir. Each ground truth")
+		print("    file is read and segmented once for all systems. Results for")
+		print("    each output directory are written to Results_<outputDir> (as")
+		print("    by batchlg.py, with INTER), and a ranking of the systems to")
+		print("    Leaderboard.csv. Directories may be .lgpack files. Output files")
+		print("    that cannot be compared are scored as empty outputs ('Error').")
+		print("")
+		print("    WORKERS=n sets the number of worker processes (default: the")
+		print("    LGEVAL_WORKERS environment variable, or one per core).")
+		sys.exit(0)
+
+	workers = lgpool.workerCount(sys.argv)
+	# Label sets are compared by intersection, as in evaluate.
+	compareTools.cmpNodes = compareTools.intersectMetric
+	compareTools.cmpEdges = compareTools.intersectMetric
+
+	names = [ systemName(outputDir) for outputDir in args[1:] ]
+	if len(set(names)) < len(names):
+		sys.stderr.write('  !! Output directories must have different names: ' \
+				+ str(names) + '\n')
+		sys.exit(1)
+
+	systems = runEvaluations(args[0], args[1:], True, workers)
+	writeLeaderboard(systems, 'Leaderboard.csv')
+
+if __name__ == '__main__':
+	main()
@@ -28,7 +28,7 @@ class SmallGraph(object):
 	see igraph or graph_tool module for bigger graph"""
 
 	# Define graph data elements ('data members' for an object in the class)
-	__slots__ = ('nodes','edges', 'rednodes', 'rededges')
+	__slots__ = ('nodes','edges', 'rednodes', 'rededges', 'canonical')
 
 	##################################
 	# Constructors (in __init__)
@@ -42,6 +42,7 @@ class SmallGraph(object):
 		self.edges = {}
 		self.rednodes = set()
 		self.rededges = set()
+		self.canonical = None
 		if(len(args) == 2 and isinstance(args[0],list) and isinstance(args[1],list)):
 			for (i,l) in args[0]:
 				self.nodes[i] = l
@@ -76,8 +77,22 @@ class SmallGraph(object):
 			a = str(tab[n])
 			b = str(tab[n+1])			
 			self.edges[(a,b)] = str(tab[n+2])
-	def iso(self,osg):
-		"""true if the two graphs are isomorphisms"""
+	def iso(self,osg, config=None):
+		"""true if the two graphs are isomorphisms. Labels are compared with
+		config (a compareTools.EvaluationConfig), or the module settings if
+		None. Canonical keys are compared if the metrics allow it (see
+		canonicalKey())."""
+		key = self.canonicalKey(config)
+		if key != None:
+			otherKey = osg.canonicalKey(config)
+			if otherKey != None:
+				return key == otherKey
+		return self.permutationIso(osg, config)
+
+	def permutationIso(self,osg, config=None):
+		"""true if the two graphs are isomorphisms, trying all node mappings"""
+		if config == None:
+			config = compareTools.currentConfig()
 		if(len(self.nodes.keys()) != len(osg.nodes.keys())):# or \ # problem with '_' edges which exist but should be ignored
 			#len(self.edges.keys()) != len(osg.edges.keys())):
 				return False
@@ -89,19 +104,94 @@ class SmallGraph(object):
 		#print myLabels
 		myLabelsFlat = [item for sublist in myLabels for item in sublist]
 		hisLabelsFlat = [item for sublist in hisLabels for item in sublist]
-		if compareTools.cmpNodes(myLabelsFlat, hisLabelsFlat) != (0,[]):
+		if config.compareNodes.compute(myLabelsFlat, hisLabelsFlat) != (0,[]):
 			return False
 		#So they seems to be isomorphims (same label counts)
 		#let's try all permutation of nodes
 		for m in itertools.permutations(self.nodes.keys()):
-			if self.equal(osg,m):
+			if self.equal(osg,m,config):
 				return True
 		return False
 
-	def equal(self,osg, mapping):
+	def canonicalKey(self, config=None):
+		"""Hashable key for the graph, equal for two graphs exactly when they
+		are isomorphic with the node and edge metrics of config, or of the
+		module settings if None (see compareTools). None if a metric has no
+		label key (e.g. intersectMetric). The key is kept until the graph or
+		the settings (including synonyms) change."""
+		if config == None:
+			config = compareTools.currentConfig()
+		cached = self.canonical
+		if cached != None and cached[1] == self.nodes and cached[2] == self.edges \
+				and cached[0] == config.key:
+			return cached[3]
+		key = self.findCanonicalKey(config)
+		self.canonical = (config.key, dict(self.nodes), dict(self.edges), key)
+		return key
+
+	def findCanonicalKey(self, config):
+		"""Compute canonicalKey(): the smallest (node labels, edges) encoding
+		over the node orders that agree with a refinement of node labels."""
+		nodeKey = config.labelKey(config.cmpNodes)
+		edgeKey = config.labelKey(config.cmpEdges)
+		if nodeKey == None or edgeKey == None:
+			return None
+		nodes = self.nodes.keys()
+		index = dict([ (n, i) for (i, n) in enumerate(nodes) ])
+		nodeLabels = [ nodeKey(self.nodes[n]) for n in nodes ]
+
+		# Edges matching no edge ('_') are the same as missing edges.
+		noEdge = edgeKey({'_' : 1.0})
+		edges = []
+		for ((a, b), labels) in self.edges.iteritems():
+			if not a in index or not b in index:
+				return None
+			label = edgeKey(labels)
+			if label != noEdge:
+				edges.append((index[a], index[b], label))
+
+		def rank(values):
+			ranks = dict([ (v, r) for (r, v) in enumerate(sorted(set(values))) ])
+			return [ ranks[v] for v in values ]
+
+		# Refine node colors by the labels and colors of neighbours (through
+		# outgoing and incoming edges) until no color class is split.
+		colors = rank(nodeLabels)
+		while True:
+			outgoing = [ [] for n in nodes ]
+			incoming = [ [] for n in nodes ]
+			for (a, b, label) in edges:
+				outgoing[a].append((label, colors[b]))
+				incoming[b].append((label, colors[a]))
+			newColors = rank([ (colors[i], tuple(sorted(outgoing[i])), \
+					tuple(sorted(incoming[i]))) for i in range(len(nodes)) ])
+			if len(set(newColors)) == len(set(colors)):
+				break
+			colors = newColors
+
+		# Exact tie-breaking: try all orders of nodes with the same color.
+		groups = [ [ i for i in range(len(nodes)) if colors[i] == c ] \
+				for c in sorted(set(colors)) ]
+		best = None
+		for orders in itertools.product(*[ itertools.permutations(g) \
+				for g in groups ]):
+			order = [ i for group in orders for i in group ]
+			position = [ 0 ] * len(nodes)
+			for (p, i) in enumerate(order):
+				position[i] = p
+			encoding = (tuple([ nodeLabels[i] for i in order ]), \
+					tuple(sorted([ (position[a], position[b], label) \
+						for (a, b, label) in edges ])))
+			if best == None or encoding < best:
+				best = encoding
+		return (len(nodes), best)
+
+	def equal(self,osg, mapping, config=None):
 		"""using the mapping list, check if the nodes and edges have the same labels
 		The mapping is a list of self.nodes keys, the order give the mapping
 		the number of nodes have to be same"""
+		if config == None:
+			config = compareTools.currentConfig()
 		mynodes = self.nodes.keys()
 		nb = len(mynodes)
 		onodes = osg.nodes.keys()		
@@ -112,7 +202,7 @@ class SmallGraph(object):
 		#first check the node labels
 		for (my,his) in hisNode.iteritems():
 			#if(self.nodes[my] != osg.nodes[his]):
-			if(compareTools.cmpNodes(self.nodes[my] ,osg.nodes[his]) != (0,[])):
+			if(config.compareNodes(self.nodes[my] ,osg.nodes[his]) != (0,[])):
 				#print str((self.nodes[my] ,osg.nodes[his])) + ' are diff'
 				return False
 		#then check the edges, from self to other and reverse
@@ -125,23 +215,31 @@ class SmallGraph(object):
 			#print str((a,b)) + " <=> " + str((oa,ob))
 			#if the edge does not exist or has a different label => missmatch
 			if not (oa,ob) in osg.edges.keys():
-				if compareTools.cmpEdges(self.edges[(a,b)], {'_' : 1.0})!= (0,[]):
+				if config.compareEdges(self.edges[(a,b)], {'_' : 1.0})!= (0,[]):
 					#print str((oa,ob)) + " not in osg"
 					return False
 			else:
 				#if self.edges[(a,b)] != osg.edges[(oa,ob)]:
-				if compareTools.cmpEdges(self.edges[(a,b)], osg.edges[(oa,ob)])!= (0,[]):
+				if config.compareEdges(self.edges[(a,b)], osg.edges[(oa,ob)])!= (0,[]):
 					#print self.edges[(a,b)] + " != " + osg.edges[(oa,ob)]	
 					return False
 		#from other to self except checkedEdg, normaly, only '_' edges are remaining
 		for (oa,ob) in (set(osg.edges.iterkeys()) - checkedEdg):
-			if compareTools.cmpEdges(osg.edges[(oa,ob)], {'_' : 1.0})!= (0,[]):
+			if config.compareEdges(osg.edges[(oa,ob)], {'_' : 1.0})!= (0,[]):
 				return False
 			
 		return True
 
 	def __eq__(self,o):
 		return self.iso(o)
+	def __ne__(self,o):
+		return not self.iso(o)
+	def __hash__(self):
+		# Isomorphic graphs have the same number of nodes.
+		key = self.canonicalKey()
+		if key == None:
+			return hash(len(self.nodes))
+		return hash(key)
 	def toSVG(self, size = 200, withDef = True, nodeShape='circle'):
 		""" Generate a SVG XML string which draw the nodes (spread on a circle)
 		and edges with all label. 
@@ -170,8 +268,12 @@ class SmallGraph(object):
 		childCount = {}
 		findXY = {}
 
+		# Nodes and edges are visited in sorted order, so that drawings do not
+		# depend on dictionary order (e.g. for graphs from worker processes).
+		edgeList = sorted(self.edges.keys())
+
 		# Determine the number of times each node is a parent or child.
-		for (a,b) in self.edges.keys():
+		for (a,b) in edgeList:
 			if a in parentCount.keys():
 				parentCount[a] += 1
 			else:
@@ -184,13 +286,13 @@ class SmallGraph(object):
 
 		# Construct list of parent nodes (in order of parent role freq.),
 		# add any missing nodes.
-		childPairs = childCount.items()		
+		childPairs = sorted(childCount.items())
 		sortedPairs = sorted(childPairs, key=lambda tuple: tuple[1])
-		nodes = self.nodes.keys()
+		nodes = sorted(self.nodes.keys())
 		if len(sortedPairs) > 0:
 			[nodes, counts] = zip(*sortedPairs)
 		nodeList = list(nodes)
-		for selfNode in self.nodes.keys():
+		for selfNode in sorted(self.nodes.keys()):
 			if not selfNode in nodeList:
 				nodeList.append(selfNode)
 
@@ -217,7 +319,7 @@ class SmallGraph(object):
 		# Draw edges on a (smaller) circle
 		R = R - r 
 		xy = [  (cmath.rect(R,2 * x* cmath.pi/n).real + size/2,cmath.rect(R,2 * x* cmath.pi/n).imag + size/2) for x in range(n)]
-		for (a,b) in self.edges.keys():
+		for (a,b) in edgeList:
 			ai = findXY[a]			
 			bi = findXY[b]
 			color = 'blue'
@@ -10,50 +10,86 @@
 ################################################################
 import sys
 import csv
-import collections
 import time
 import os
 
-def addOneError(confM, id1, id2):
-	#thanks to "defaultdict" there is nothing to do !
-	confM[id1][id2] += 1
+import lgcompact
 
-def affMat(output, allID, confM):
+class SparseMatrix(object):
+	"""Confusion counts between labels, coded as integers in a shared
+	lgcompact.LabelTable. Only non-zero entries are stored: rows maps an
+	output label code to a dictionary from target label codes to counts."""
+	__slots__ = ('table', 'rows')
+
+	def __init__(self, table):
+		self.table = table
+		self.rows = {}
+
+	def add(self, output, target, count=1):
+		row = self.rows.get(output)
+		if row == None:
+			row = self.rows[ output ] = {}
+		row[ target ] = row.get(target, 0) + count
+
+	def entries(self):
+		"""(output code, target code, count) for all non-zero entries."""
+		for (output, row) in self.rows.iteritems():
+			for (target, count) in row.iteritems():
+				yield (output, target, count)
+
+def matrixLabels(allID, confM, compact):
+	"""Row and column label codes for a matrix over the labels in allID,
+	sorted by label. In compact mode, labels without a non-zero entry in
+	their row (or column) are left out of the rows (or columns)."""
+	strings = confM.table.strings
+	labels = sorted(allID, key=strings.__getitem__)
+	if not compact:
+		return (labels, labels)
+	shown = set(allID)
+	rowCodes = set()
+	colCodes = set()
+	for (output, target, count) in confM.entries():
+		if output in shown and target in shown:
+			rowCodes.add(output)
+			colCodes.add(target)
+	return ([ k for k in labels if k in rowCodes ], \
+			[ k for k in labels if k in colCodes ])
+
+def matrixRows(rowLabels, colLabels, confM):
+	"""(row label code, list of cell strings) for each row, with empty
+	strings in place of zero counts."""
+	position = dict([ (k, i) for (i, k) in enumerate(colLabels) ])
+	for k1 in rowLabels:
+		cells = [ '' ] * len(colLabels)
+		for (k2, count) in confM.rows.get(k1, {}).iteritems():
+			i = position.get(k2)
+			if i != None:
+				cells[i] = str(count)
+		yield (k1, cells)
+
+def affMat(output, allID, confM, compact=False):
+	strings = confM.table.strings
+	(rowLabels, colLabels) = matrixLabels(allID, confM, compact)
 	# Header
-        output.write("Output:")
-	for k in sorted(allID):
-		output.write(",'"+str(k)+"'")
-	output.write("\n")
+	output.write("Output:" + "".join([ ",'" + strings[k] + "'" \
+		for k in colLabels ]) + "\n")
 	
-	# Data
-	for k1 in sorted(allID):
-		output.write("'"+str(k1)+"'")
-		for k2 in sorted(allID):
-			if not confM[k1][k2] == 0:
-				output.write(","+str(confM[k1][k2]))
-			else:
-				output.write(",")
-		output.write("\n")
+	# Data: one write per row.
+	for (k1, cells) in matrixRows(rowLabels, colLabels, confM):
+		output.write("'" + strings[k1] + "'" + "".join([ "," + cell \
+			for cell in cells ]) + "\n")
 
-def affMatHTML(output, allID, confM):
-        output.write("<table>\n<tr><th><i>(Out:Rows)</i></th>")
-	for k in sorted(allID):
-		output.write("<th>"+str(k)+"</th>")
-	output.write("</tr>\n")
-	for k1 in sorted(allID):
-		output.write("<tr><th>"+str(k1)+"</th>")
-		i = 0
-		for k2 in sorted(allID):
-			val = str(confM[k1][k2])
-			if val == "0":
-				val = ""
-			output.write('<td class="col_'+str(i)+'">'+val+"</td>")
-			i = i+1
-		output.write("<th>"+str(k1)+"</th></tr>\n")
-	output.write("<tr><th></th>")
-	for k in sorted(allID):
-		output.write("<th>"+str(k)+"</th>")
-	output.write("</tr>\n")		
+def affMatHTML(output, allID, confM, compact=False):
+	strings = confM.table.strings
+	(rowLabels, colLabels) = matrixLabels(allID, confM, compact)
+	header = "".join([ "<th>" + strings[k] + "</th>" for k in colLabels ])
+	output.write("<table>\n<tr><th><i>(Out:Rows)</i></th>" + header + "</tr>\n")
+	for (k1, cells) in matrixRows(rowLabels, colLabels, confM):
+		output.write("<tr><th>" + strings[k1] + "</th>" \
+			+ "".join([ '<td class="col_' + str(i) + '">' + cell + "</td>" \
+				for (i, cell) in enumerate(cells) ]) \
+			+ "<th>" + strings[k1] + "</th></tr>\n")
+	output.write("<tr><th></th>" + header + "</tr>\n")
 	output.write("</table>\n")
 
 def writeCSS(output, allID):
@@ -75,11 +111,12 @@ def writeCSS(output, allID):
 
 def main():
 	if len(sys.argv) < 3:
-		print("Usage : [[python]] sumDiff.py <file1.diff> <labelsGT.txt> [HTML]\n")
+		print("Usage : [[python]] sumDiff.py <file1.diff> <labelsGT.txt> [HTML] [COMPACT]\n")
 		print("	Merge results for each line in file1.diff into confusion Matrices.")
 		print("	By default output is sent to stdout in CSV format.")
 		print(" requires list of GT labels from labelsGT.txt.")
 		print("	[HTML] option changes output format to HTML.")
+		print("	[COMPACT] option leaves out matrix rows and columns without errors.")
 		sys.exit(0)
 	# Read data from CSV file.
 	fileName = sys.argv[1]
@@ -115,13 +152,15 @@ def main():
 			else:
 				gtNodeLabels.add(nextEntry)
 
+	compact = "COMPACT" in sys.argv[3:]
 	withHTML = False
-	if len(sys.argv) > 3:
+	if len([ arg for arg in sys.argv[3:] if arg != "COMPACT" ]) > 0:
 		withHTML = True
-	#confusion matrix = dict->dict->int
-	labelM = collections.defaultdict(collections.defaultdict(int).copy)
-	spatRelM = collections.defaultdict(collections.defaultdict(int).copy)
-	#segRelM = collections.defaultdict(collections.defaultdict(int).copy)
+	#confusion matrix = sparse counts over label codes
+	table = lgcompact.LabelTable()
+	code = table.stringCode
+	labelM = SparseMatrix(table)
+	spatRelM = SparseMatrix(table)
 	
 	allLabel = set()
 	allSR = set()
@@ -151,12 +190,14 @@ def main():
 		#process node label errors
 		elif entryType == "*N":
 			# Capture all confused symbol (node) labels.
-			symbolLabels.add(row[2].strip())
-			symbolLabels.add(row[5].strip())
+			outputLabel = code(row[2].strip())
+			otherLabel = code(row[5].strip())
+			symbolLabels.add(outputLabel)
+			symbolLabels.add(otherLabel)
 
-			addOneError(labelM,row[2].strip(),row[5].strip())
-			allLabel.add(row[2].strip())
-			allLabel.add(row[5].strip())
+			labelM.add(outputLabel, otherLabel)
+			allLabel.add(outputLabel)
+			allLabel.add(otherLabel)
 
 			nodeErrors += 1
 
@@ -170,9 +211,9 @@ def main():
 				print("INVALID LENGTH at row: " + str(rowCount) + " for file: " + fileName)
 				print(row)
 			
-			outputLabel = row[3].strip()
-			otherLabel = row[6].strip()
-			addOneError(spatRelM, outputLabel, otherLabel)
+			outputLabel = code(row[3].strip())
+			otherLabel = code(row[6].strip())
+			spatRelM.add(outputLabel, otherLabel)
 
 			allSR.add(outputLabel)
 			allSR.add(otherLabel)
@@ -183,34 +224,33 @@ def main():
 		
 	# Obtain the list of edge labels that do not appear on nodes.
 	# DEBUG: need to consult all GT labels in general case (handling '*' input).
-	mergeEdgeLabel = '*'
-	relOnlyLabels = allSR.difference(symbolLabels).difference(gtNodeLabels)
-	relMergeLabels = relOnlyLabels.union(mergeEdgeLabel)
+	mergeEdgeLabel = code('*')
+	gtNodeCodes = set([ code(label) for label in gtNodeLabels ])
+	relOnlyLabels = allSR.difference(symbolLabels).difference(gtNodeCodes)
+	relMergeLabels = relOnlyLabels.union([ mergeEdgeLabel ])
 
 	# Create a modified confusion histogram where all symbol/segmentation
 	# edge confusions are treated as being of the same type.
-	ShortEdgeMatrix = collections.defaultdict(collections.defaultdict(int).copy)
-	for output in spatRelM.keys():
+	ShortEdgeMatrix = SparseMatrix(table)
+	for (output, target, count) in spatRelM.entries():
 		olabel = output
 		if not output in relOnlyLabels:
 			olabel = mergeEdgeLabel
+		tlabel = target
+		if not target in relOnlyLabels:
+			tlabel = mergeEdgeLabel
 
-		for target in spatRelM[output].keys():
-			tlabel = target
-			if not target in relOnlyLabels:
-				tlabel = mergeEdgeLabel
-
-			# Increment the entry for the appropriate matrix.
-			ShortEdgeMatrix[olabel][tlabel] += spatRelM[output][target]
+		# Increment the entry for the appropriate matrix.
+		ShortEdgeMatrix.add(olabel, tlabel, count)
 
-			if not olabel == output or not tlabel == target:
-				allSegErrors += spatRelM[output][target]
-				if not olabel == output and tlabel == target:
-					fposMerge += spatRelM[output][target]
-				elif not tlabel == target and olabel == output:
-					fnegMerge += spatRelM[output][target]
-			else:
-				allRelErrors += spatRelM[output][target]
+		if not olabel == output or not tlabel == target:
+			allSegErrors += count
+			if not olabel == output and tlabel == target:
+				fposMerge += count
+			elif not tlabel == target and olabel == output:
+				fnegMerge += count
+		else:
+			allRelErrors += count
 
 	if withHTML:
 		sys.stdout.write('<html>')
@@ -225,17 +265,17 @@ def main():
 		print ("<hr>")
 		print ("<h2><A NAME=\"nodes\">Node Label Confusion Matrix</A></h2>")
 		print ("<p>"+str(len(allLabel)) + " unique node labels. " + str(nodeErrors) + " errors. ABSENT: a node missing in the output or target graph</p>")
-		affMatHTML(sys.stdout, allLabel, labelM)
+		affMatHTML(sys.stdout, allLabel, labelM, compact)
 		print("<br><hr><br>")
 		print ("<h2><A NAME=\"ShortEdges\">Edge Label Confusion Matrix (Short)</A></h2>")
 		print ("<p>" + str(len(relOnlyLabels)) + " unique relationship labels + * representing grouping two nodes into an object (any type). " + str(allSegErrors + allRelErrors) + " errors <UL><LI>" + str(allSegErrors) + " Directed segmentation and node pair classification errors (entries in '*'-labeled row and column) <UL><LI><b>" + str(allSegErrors - fposMerge - fnegMerge) + " edges between correctly grouped nodes, but with conflicting classification (* vs. *)</b> <LI>" + str(fposMerge) + " false positive merge edges (* vs. other)<LI>" + str(fnegMerge) + " false negative merge edges (other vs. *) </UL>  <LI>" + str(allRelErrors) + " Directed relationship errors (remaining matrix entries) </UL></p></p>")
-		affMatHTML(sys.stdout, relMergeLabels, ShortEdgeMatrix)
+		affMatHTML(sys.stdout, relMergeLabels, ShortEdgeMatrix, compact)
 		#affMatHTML(sys.stdout, relOnlyLabels, spatRelM)
 		
 		print("<br><hr><br>")
 		print("<h2><A NAME=\"Edges\">Edge Label Confusion Matrix (All Errors)</A></h2>")
 		print("<p>"+str(len(allSR)) + " unique edge labels representing relationships and node groupings for specific symbol types. " + str(allSegErrors + allRelErrors) + " errors</p>")
-		affMatHTML(sys.stdout, allSR, spatRelM)
+		affMatHTML(sys.stdout, allSR, spatRelM, compact)
 		
 		print("</font>")
 		sys.stdout.write('</html>')
@@ -246,16 +286,16 @@ def main():
 		print("NOTE: This file contains 3 confusion matrices.")
 		print("")
 		print("I. Node Label Confusion Matrix: " + str(len(allLabel)) + " unique labels. ABSENT: a node missing in the output or target graph")
-		affMat(sys.stdout, allLabel, labelM)
+		affMat(sys.stdout, allLabel, labelM, compact)
 		
 		print("")
 		print("")
 		print("II. Edge Label Confusion Matrix (Short): " + str(len(relOnlyLabels)) + " unique relationship labels + * (merge)")
-		affMat(sys.stdout, relMergeLabels, ShortEdgeMatrix)
+		affMat(sys.stdout, relMergeLabels, ShortEdgeMatrix, compact)
 		
 		print("")
 		print("")
 		print("III. Edge Label Confusion Matrix (Full): " + str(len(allSR)) + " unique labels for relationships and node groupings for specific symbol types")
-		affMat(sys.stdout, allSR, spatRelM)
+		affMat(sys.stdout, allSR, spatRelM, compact)
 
 main()
@@ -20,46 +20,6 @@ def fmeasure(R,P):
 		value = (2 * R * P)/(R+P)
 	return value
 
-def meanStdDev( valueList, scale ):
-	"""Compute the mean and standard deviation of a *non-empty* list of numbers."""
-	numElements = len(valueList)
-	if numElements == 0:
-		return(None, 0.0)
-	
-	mean = float(sum(valueList)) / numElements
-	variance = 0
-	for value in valueList:
-		variance += math.pow( value - mean, 2 )
-	variance = variance / float(numElements)
-	return (scale * mean, scale * math.sqrt(variance))
-	
-def weightedMeanStdDev( valueList, weights, scale ):
-	"""Compute the weighted mean and standard deviation of a *non-empty* list of numbers."""
-
-	numElements = sum(weights)
-	if len(valueList) < 1 or numElements == 0:
-		return(None, 0.0)
-
-	mean = 0
-	for i in range(len(valueList)):
-		mean += float(valueList[i]*weights[i])
-	mean = mean / numElements
-	variance = 0
-	for  i in range(len(valueList)):
-		variance += math.pow( valueList[i] - mean, 2 )*weights[i]
-	variance = variance / float(numElements)
-	
-	return (scale * mean, scale * math.sqrt(variance))
-
-def reportMeanStdDev(formatWidth, label, valueList, scale ):
-	(m,s) = meanStdDev(valueList,scale)
-	printTable(formatWidth,[label,m,s])
-
-def reportWMeanStdDev(formatWidth, label, valueList, weights, scale ):
-	(m,s) =  weightedMeanStdDev(valueList,weights,scale)
-	printTable(formatWidth,[label,m,s])
-	#print(label + " (mean, stdev) = " + str(weightedMeanStdDev(valueList,weights,scale)))
-	
 def reportCoupleCSV(sep,c ):
 	(mean,stdev) = c
 	sys.stdout.write(sep + str(mean) + "," + str(stdev))
@@ -81,15 +41,113 @@ def printTable( field_width, entries):
 		else:
 			labelFormat += '{0[' + str(i) + ']:>{width}}'
 	print labelFormat.format( entries, width=field_width)
-def histogramm(values):
-        """Compute the histogramm of all values: a dictionnary dict[v]=count"""
-        hist = {}
-        for v in values:
-                if v in hist:
-                        hist[v]+=1
-                else:
-                        hist[v]=1
-        return hist
+
+# Metrics are summarized in one pass over the metric file, keeping only
+# running statistics for each metric (MetricStats), rather than lists of
+# all values. Histograms count the (integer) values below HIST_BINS.
+HIST_BINS = 64
+
+# (metric, weight) pairs for weighted statistics (see WeightedStats).
+WEIGHTED_METRICS = [ ('D_E', 'nNodes') ]
+
+class Histogram(dict):
+	"""Histogram (dictionary from value to count) holding only the integer
+	values from 0 to bins - 1 (all values if bins is None); total counts
+	all values added."""
+	__slots__ = ('bins', 'total')
+
+	def __init__(self, bins=None):
+		dict.__init__(self)
+		self.bins = bins
+		self.total = 0
+
+	def add(self, value):
+		self.total += 1
+		if self.bins == None or (value >= 0 and value < self.bins \
+				and value == int(value)):
+			self[ value ] = self.get(value, 0) + 1
+
+class MetricStats(object):
+	"""Running statistics for the values of one metric: count, sum (added in
+	input order, as sum()), zero count, histogram, and mean and variance
+	(Welford's method)."""
+	__slots__ = ('count', 'total', 'zeros', 'mean', 'm2', 'hist')
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0
+		self.zeros = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+		self.hist = Histogram(HIST_BINS)
+
+	def add(self, value):
+		self.count += 1
+		self.total += value
+		if value == 0:
+			self.zeros += 1
+		self.hist.add(value)
+		delta = value - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (value - self.mean)
+
+	def meanStdDev(self, scale):
+		"""Mean and standard deviation of the values, multiplied by scale
+		((None, 0.0) if there are none)."""
+		if self.count == 0:
+			return (None, 0.0)
+		return (scale * self.mean, scale * math.sqrt(self.m2 / self.count))
+
+class WeightedStats(object):
+	"""Running weighted mean and variance (West's method) of values added
+	with their weights; values with a zero weight are only counted."""
+	__slots__ = ('count', 'weights', 'mean', 's')
+
+	def __init__(self):
+		self.count = 0
+		self.weights = 0.0
+		self.mean = 0.0
+		self.s = 0.0
+
+	def add(self, value, weight):
+		self.count += 1
+		if weight == 0:
+			return
+		self.weights += weight
+		delta = value - self.mean
+		self.mean += delta * weight / self.weights
+		self.s += weight * delta * (value - self.mean)
+
+	def meanStdDev(self, scale):
+		if self.count < 1 or self.weights == 0:
+			return (None, 0.0)
+		return (scale * self.mean, scale * math.sqrt(self.s / self.weights))
+
+def readMetrics(fileReader):
+	"""Summarize the metric rows read by fileReader. Returns the number of
+	rows (files), a dictionary of MetricStats by metric name, and a
+	dictionary of WeightedStats by (metric, weight) pair (WEIGHTED_METRICS)."""
+	stats = {}
+	weighted = dict([ (pair, WeightedStats()) for pair in WEIGHTED_METRICS ])
+	nbEM = 0
+	for row in fileReader:
+		# Skip blank lines and file names.
+		if len(row) == 0 or row[0].strip() == "*M":
+			continue
+		values = {}
+		for i in range(0,len(row),2):
+			vName = row[i].strip()
+			value = float(row[i+1].strip())
+			metric = stats.get(vName)
+			if metric == None:
+				metric = stats[ vName ] = MetricStats()
+			metric.add(value)
+			values[ vName ] = value
+		for ((vName, wName), metric) in weighted.iteritems():
+			if vName in values and wName in values:
+				metric.add(values[ vName ], values[ wName ])
+		nbEM+=1
+	return (nbEM, stats, weighted)
 
 def printHist(hist,N,field_width):
         vals = []
@@ -103,10 +161,11 @@ def printHist(hist,N,field_width):
                 cum += vals[-1]
                 cumulVals.append(cum)
 		
-		# RZ: Inefficient but simple - sum all values, substracted accumulated ones.
-		total = 0
-		for key in hist.keys():
-			total += hist[key]
+		# Values beyond the bins of a bounded Histogram are in its total.
+		if isinstance(hist, Histogram):
+			total = hist.total
+		else:
+			total = sum(hist.values())
 
 		remaining = total - cum
 
@@ -137,46 +196,11 @@ def main():
 		sys.stderr.write('  !! IO Error (cannot open): ' + fileName)
 		sys.exit(0)
 
-	# Compile distributions for all metrics.
-	allValues = {}
-	nbEM = 0;
-	fileList = []
-	for row in fileReader:
-		# Skip blank lines.
-		if len(row) == 0:
-			continue
-
-		entryType = row[0].strip()
-		if entryType == "*M":
-			fileList = fileList + [row[1]]
-			continue
-		for i in range(0,len(row),2):
-                        vName =  row[i].strip()
-			if vName not in allValues:
-				allValues[vName] = []
-			allValues[vName] = allValues[vName] \
-					+ [float(row[i+1].strip())]
-		nbEM+=1
-	
-	# Compile and display the sum for each metric.
-	allSum = {}
-	allZeroCount = {}
-	zeroFileList = {}
-	allHist = {}
-	for v in allValues.keys():
-		allSum[v] = sum(allValues[v])
-		#print(str(v) + " = " + str(allSum[v]))
-                allHist[v] = histogramm(allValues[v])
-		allZeroCount[v] = 0
-		for s in range(len(allValues[v])):
-			if allValues[v][s] == 0:
-				allZeroCount[v] += 1
-				if v in zeroFileList.keys():
-					zeroFileList[v] += '\n' + str(s)
-				else:
-					zeroFileList[v] = str(s)
-				#print fileList[s]
-		#print ('    Correct expressions: ' + str(nbZ))
+	# Compile statistics for all metrics.
+	(nbEM, stats, weighted) = readMetrics(fileReader)
+	allSum = dict([ (v, metric.total) for (v, metric) in stats.iteritems() ])
+	allZeroCount = dict([ (v, metric.zeros) for (v, metric) in stats.iteritems() ])
+	allHist = dict([ (v, metric.hist) for (v, metric) in stats.iteritems() ])
 
 	# Report input counts.
 	correctExps = int(allZeroCount["D_B"])
@@ -200,9 +224,9 @@ def main():
 		sys.stdout.write(intMetric(allSum,"D_C") + "," +intMetric(allSum, "D_L") \
 			 + "," + str(dsTotal) + "," \
 			 + intMetric(allSum, "D_B"))
-		reportCoupleCSV(',',meanStdDev(allValues["D_B(%)"],100))
-		reportCoupleCSV(',',meanStdDev(allValues["D_E"],100))
-		reportCoupleCSV(',',weightedMeanStdDev(allValues["D_E"],allValues["nNodes"],100))
+		reportCoupleCSV(',',stats["D_B(%)"].meanStdDev(100))
+		reportCoupleCSV(',',stats["D_E"].meanStdDev(100))
+		reportCoupleCSV(',',weighted[("D_E","nNodes")].meanStdDev(100))
 		print("")
 	else:
 		fieldWidth = 10
@@ -427,4 +451,5 @@ def main():
 		print('')
 
 
-main()
+if __name__ == '__main__':
+	main()
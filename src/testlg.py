@@ -6,9 +6,21 @@
 # Authors: R. Zanibbi and H. Mouchere, June 2012
 # Copyright (c) 2012-2014, Richard Zanibbi and Harold Mouchere
 ################################################################
-from lg import Lg
+import os
+import shutil
+import StringIO
+from collections import OrderedDict
+from lg import Lg, SharedSegments, SubStructBudget
+from lgio import writeMetrics, writeDiff
+import lgerrors
+import lgmetrics
+import compareTools
+import batchlg
+import multilg
 #import smallGraph
+from smallGraph import SmallGraph
 import SmGrConfMatrix
+import confHists
 
 #from bestBG import *
 
@@ -72,6 +84,151 @@ def testLabelComparisons(compareFiles):
 	for next in compareFiles:
 		labelComparison(next[0],next[1], next[2])
 
+def testOverlayCompare(compareFiles):
+	print('\n--TESTING NON-MUTATING COMPARISON')
+	for next in compareFiles:
+		n1 = Lg(next[0])
+		n2 = Lg(next[1])
+		print('>> ' + next[0] + ' vs. ' + next[1])
+		before = (n1.csv(), n2.csv())
+		out1 = n1.compare(n2, False)
+		out2 = Lg(next[0]).compare(Lg(next[1]))
+		if before != (n1.csv(), n2.csv()):
+			print('  Graphs modified:\n' + n1.csv() + n2.csv())
+		elif out1[0] != out2[0]:
+			print('  Metrics: ' + str(out1[0]) + '\n  Expected: ' + str(out2[0]))
+		else:
+			print ("\tOK ")
+		# Graphs already compared (with ABSENT nodes inserted) give the same
+		# metrics with or without mutation, and with a configuration.
+		n1.compare(n2)
+		outs = [ n1.compare(n2, False)[0], \
+				n1.compare(n2, config=compareTools.currentConfig())[0], \
+				n1.compare(n2)[0] ]
+		if outs[0] != outs[2] or outs[1] != outs[2]:
+			print('  After a mutating comparison:\n  Metrics: ' + str(outs[0]) \
+					+ '\n  With config: ' + str(outs[1]) \
+					+ '\n  Expected: ' + str(outs[2]))
+		else:
+			print ("\tOK (after mutation)")
+
+def testEvaluationConfig(compareFiles):
+	print('\n--TESTING COMPARISON WITH EVALUATION CONFIGURATIONS')
+	settings = [ (compareTools.defaultMetric, [], []), \
+			(compareTools.synonymMetric, [], []), \
+			(compareTools.filteredMetric, [], [ '+', 'x' ]), \
+			(compareTools.filteredMetric, [ '*S', '*M' ], []) ]
+	for next in compareFiles:
+		n1 = Lg(next[0])
+		n2 = Lg(next[1])
+		print('>> ' + next[0] + ' vs. ' + next[1])
+		errors = 0
+		for (metric, selected, ignored) in settings:
+			config = compareTools.EvaluationConfig(metric, \
+					selectedLabels=selected, ignoredLabels=ignored)
+			out1 = n1.compare(n2, config=config)
+			# Expected: graphs created with the module settings.
+			compareTools.cmpNodes = compareTools.cmpEdges = metric
+			compareTools.selectedLabelSet = set(selected)
+			compareTools.ignoredLabelSet = set(ignored)
+			out2 = Lg(next[0]).compare(Lg(next[1]))
+			compareTools.cmpNodes = compareTools.cmpEdges = compareTools.defaultMetric
+			compareTools.selectedLabelSet = set([])
+			compareTools.ignoredLabelSet = set([])
+			if out1[:3] != out2[:3]:
+				print('  ' + metric.__name__ + ' ' + str(selected + ignored) \
+						+ '\n  Metrics: ' + str(out1[0]) + '\n  Expected: ' + str(out2[0]))
+				errors += 1
+		if errors == 0:
+			print ("\tOK ")
+
+def testMatrixFilters(compareFiles):
+	print('\n--TESTING MATRIX LABEL FILTERS IN ONE PASS')
+	for next in compareFiles:
+		print('>> ' + next[0] + ' vs. ' + next[1])
+		results = batchlg.compareFiltered(Lg(next[0]), Lg(next[1]), \
+				batchlg.matrixConfigs())
+		errors = 0
+		# Expected: the files read again for each filter (module settings).
+		compareTools.cmpNodes = compareTools.cmpEdges = compareTools.filteredMetric
+		for ((name, selected, ignored), (_, metricString)) in \
+				zip(batchlg.MATRIX_FILTERS, results):
+			compareTools.selectedLabelSet = set(selected)
+			compareTools.ignoredLabelSet = set(ignored)
+			expected = StringIO.StringIO()
+			writeMetrics(Lg(next[0]).compare(Lg(next[1])), expected)
+			if metricString != expected.getvalue():
+				print('  ' + name + ': ' + metricString + '  Expected: ' \
+						+ expected.getvalue())
+				errors += 1
+		compareTools.cmpNodes = compareTools.cmpEdges = compareTools.defaultMetric
+		compareTools.selectedLabelSet = set([])
+		compareTools.ignoredLabelSet = set([])
+		if errors == 0:
+			print ("\tOK ")
+
+def testCompact(compareFiles):
+	print('\n--TESTING COMPACT LABEL STORAGE')
+	for next in compareFiles:
+		n1 = Lg(next[0])
+		n2 = Lg(next[1])
+		print('>> ' + next[0] + ' vs. ' + next[1])
+		n1.compact()
+		n2.compact()
+		out1 = n1.compare(n2, False)
+		out2 = Lg(next[0]).compare(Lg(next[1]), False)
+		# Label dictionaries of compact graphs are read-only.
+		nid = n1.nlabels.keys()[0]
+		try:
+			n1.nlabels[ nid ][ 'X' ] = 1.0
+			readOnly = False
+		except TypeError:
+			readOnly = True
+		if n1.csv() != Lg(next[0]).csv():
+			print('  Graph changed:\n' + n1.csv())
+		elif out1 != out2:
+			print('  Metrics: ' + str(out1[0]) + '\n  Expected: ' + str(out2[0]))
+		elif not readOnly:
+			print('  Compact node labels modified in place')
+		else:
+			print ("\tOK ")
+
+def testCanonicalIso(files):
+	print('\n--TESTING CANONICAL KEYS FOR SUBSTRUCTURE ISOMORPHISM')
+	for next in files:
+		print('>> ' + next)
+		subs = list(Lg(next).subStructIterator([1,2,3,4]))
+		errors = 0
+		for s1 in subs:
+			for s2 in subs:
+				if len(s1.nodes) != len(s2.nodes):
+					continue
+				iso = s1.iso(s2)
+				if iso != s1.permutationIso(s2) or \
+						(iso and hash(s1) != hash(s2)):
+					print('  ' + str(s1) + ' vs. ' + str(s2) + ': ' + str(iso))
+					errors += 1
+		if errors == 0:
+			print ("\tOK ")
+
+	# Keys follow changes to the module settings, including synonyms.
+	print('>> synonym added after comparison')
+	compareTools.cmpNodes = compareTools.cmpEdges = compareTools.synonymMetric
+	(s1, s2) = (SmallGraph([('1','Y')], []), SmallGraph([('1','y')], []))
+	stat = SmGrConfMatrix.SmDict()
+	stat.get(s1, SmGrConfMatrix.Counter).incr()
+	isos = [ s1.iso(s2) ]
+	compareTools.synonym['Y'] = 'y'
+	isos += [ s1.iso(s2), s1.permutationIso(s2), hash(s1) == hash(s2) ]
+	stat.get(s2, SmGrConfMatrix.Counter).incr()
+	del compareTools.synonym['Y']
+	compareTools.cmpNodes = compareTools.cmpEdges = compareTools.defaultMetric
+	if isos != [ False, True, True, True ] or len(stat.myitems) != 1:
+		print('  iso, iso, permutationIso, equal hashes: ' + str(isos) \
+				+ '; ' + str(len(stat.myitems)) + ' histogram entries')
+	else:
+		print ("\tOK ")
+
 def testEmpty(emptyFiles):
 	print('\n--TESTING EMPTY FILES')
 	for next in emptyFiles:
@@ -99,6 +256,27 @@ def testSegments(segFiles):
 			print('  NON-PARENT SEGMENTS: ' + str(noparentSegments))
 			print('  SEGMENT EDGES:\n\t' + str(segmentEdges))
 
+def testSharedSegments(segFiles):
+	print('\n--TESTING SEGMENTATIONS SHARED BETWEEN COPIES')
+	for file in segFiles:
+		print('>> ' + file[0])
+		shared = SharedSegments()
+		copies = [ Lg(file[0]) for i in range(3) ]
+		for copy in copies:
+			copy.sharedSegments = shared
+		# The second copy is modified before segmentation: it must not be
+		# given the segmentation of the others.
+		for copy in [ copies[1], Lg(file[0]) ]:
+			copy.nlabels[ 'newNode' ] = { 'x' : 1.0 }
+			copy.changed()
+		expected = [ Lg(file[0]).segmentGraph(), copy.segmentGraph() ]
+		results = [ copies[0].segmentGraph(), copies[1].segmentGraph(), \
+				copies[2].segmentGraph() ]
+		if results != [ expected[0], expected[1], expected[0] ]:
+			print('  Segmentations: ' + str(results))
+		else:
+			print ("\tOK ")
+
 def testTreeEdges(treeFiles):
 	print('\n--TESTING TREE EDGE/LAYOUT TREE EXTRACTION')
 	for file in treeFiles:
@@ -227,6 +405,194 @@ def testSubGraphCounting(files):
 	out.write('</html>')
 	out.close()
 
+def testSubStructBudget(files):
+	print('\n--TESTING SUBSTRUCTURE BUDGETS (MAXSUB)')
+	for ( fileGT, fileOUT, _ ) in files:
+		print('>> ' + fileGT)
+		lg = Lg(fileGT)
+		nodeSets = lambda g, b: [ sorted(s.nodes.keys()) \
+				for s in g.subStructIterator([2,3], b) ]
+		full = nodeSets(lg, None)
+		errors = []
+		for maxCount in [ 0, 1, len(full) / 2, len(full) ]:
+			budget = SubStructBudget(maxCount)
+			sample = nodeSets(lg, budget)
+			# The same sample for another run and for a copy of the graph
+			# enumerated in another order.
+			copy = Lg(fileGT)
+			copy.nlabels = OrderedDict(reversed(sorted(lg.nlabels.items())))
+			copy.elabels = OrderedDict(reversed(sorted(lg.elabels.items())))
+			if nodeSets(lg, SubStructBudget(maxCount)) != sample \
+					or sorted(nodeSets(copy, SubStructBudget(maxCount))) \
+						!= sorted(sample):
+				errors.append('sample changes for MAXSUB=' + str(maxCount))
+			if len(sample) > maxCount or budget.count != len(sample) \
+					or [ n for n in sample if not n in full ] != []:
+				errors.append(str(len(sample)) + ' substructures (' \
+						+ str(budget.count) + ' counted) for MAXSUB=' \
+						+ str(maxCount))
+			if budget.truncated() != (len(sample) < len(full)):
+				errors.append('truncated: ' + str(budget.truncated()) \
+						+ ' for MAXSUB=' + str(maxCount))
+
+			# Header counts of confHist are those of the budget.
+			budget = SubStructBudget(maxCount)
+			(lgOUT, lgGT) = (Lg(fileOUT), Lg(fileGT))
+			lgOUT.compare(lgGT)
+			list(lgOUT.compareSubStruct(lgGT, [3], budget))
+			(_, _, info) = confHists.comparePairs([ (fileOUT, fileGT) ], \
+					True, False, 3, maxCount)
+			expected = (int(budget.truncated()), budget.skipped, \
+					int(budget.pruned), int(budget.stopped))
+			counts = (info['truncatedFiles'], info['skippedSubStructs'], \
+					info['prunedFiles'], info['stoppedFiles'])
+			if counts != expected:
+				errors.append('header counts ' + str(counts) + ' (expected ' \
+						+ str(expected) + ') for MAXSUB=' + str(maxCount))
+		if errors != []:
+			print('  ' + '\n  '.join(errors))
+		else:
+			print ("\tOK ")
+
+def testMergeMatrices(files):
+	print('\n--TESTING MERGED AND SAVED CONFUSION MATRICES')
+	mat = SmGrConfMatrix.ConfMatrix()
+	segMat = SmGrConfMatrix.ConfMatrixObject()
+	merged = [ SmGrConfMatrix.ConfMatrix(), SmGrConfMatrix.ConfMatrixObject() ]
+	for ( fileOUT, fileGT, _ ) in files:
+		gGT = Lg(fileGT)
+		gOUT = Lg(fileOUT)
+		gOUT.compare(gGT)
+		part = [ SmGrConfMatrix.ConfMatrix(), SmGrConfMatrix.ConfMatrixObject() ]
+		for (gt,er) in gOUT.compareSubStruct(gGT,[2,3]):
+			mat.incr(gt,er,fileOUT)
+			part[0].incr(gt,er,fileOUT)
+		for (seg,gt,er) in gOUT.compareSegmentsStruct(gGT,[2]):
+			segMat.incr(seg,gt,er,fileOUT)
+			part[1].incr(seg,gt,er,fileOUT)
+		SmGrConfMatrix.saveMatrices('Tests/part.lgcm', part, {'file' : fileOUT})
+		(loaded, info) = SmGrConfMatrix.loadMatrices('Tests/part.lgcm')
+		merged[0].merge(loaded[0])
+		merged[1].merge(loaded[1])
+	os.remove('Tests/part.lgcm')
+	for (name, m1, m2) in [ ('primitives', mat, merged[0]), \
+			('objects', segMat, merged[1]) ]:
+		(html1, html2) = (StringIO.StringIO(), StringIO.StringIO())
+		m1.toHTML(html1)
+		m2.toHTML(html2)
+		print('>> ' + name + ': ' + str(m1.errorCount()) + ' errors')
+		if html1.getvalue() != html2.getvalue():
+			print('  Merged matrix differs: ' + str(m2.errorCount()) + ' errors')
+		else:
+			print ("\tOK ")
+
+def testMetricStore(files):
+	print('\n--TESTING METRIC STORE')
+	fileResults = []
+	for ( fileOUT, fileGT, _ ) in files:
+		out = Lg(fileOUT).compare(Lg(fileGT))
+		metricStream = StringIO.StringIO()
+		writeMetrics(out, metricStream)
+		result = 'Correct'
+		if len(out[1]) + len(out[2]) + len(out[3]) > 0:
+			result = 'Incorrect'
+		fileResults.append((fileOUT, result, metricStream.getvalue()))
+	lgmetrics.writeStore('Tests/metrics.lgm', lgmetrics.fromResults(fileResults))
+	store = lgmetrics.readStore('Tests/metrics.lgm')
+	os.remove('Tests/metrics.lgm')
+	for metric in [ 'D_B', 'D_E(%)' ]:
+		values = [ (fileOUT, float(metricString.split(metric + ',')[1].split(',')[0])) \
+				for (fileOUT, _, metricString) in fileResults ]
+		print('>> ' + metric + ': ' + str(store.values(metric, True)))
+		print('   ' + metric + ' > 0: ' + str(store.select(metric, '>', 0)))
+		if store.values(metric) != values:
+			print('  Stored values differ: ' + str(store.values(metric)))
+		else:
+			print ("\tOK ")
+
+def testBatchErrors(files):
+	print('\n--TESTING BATCH EVALUATION OF PAIRS THAT CANNOT BE COMPARED')
+	resultsDir = 'Tests/batchErrors'
+	pairs = [ ('Tests/infile6', 'Tests/infile1', 'infile1') ] \
+			+ [ (fileOUT, fileGT, 'f' + str(i)) \
+				for (i, (fileGT, fileOUT, _)) in enumerate(files) ]
+	errors = []
+	# The second run reads the results of the first.
+	for run in range(2):
+		batchlg.runEvaluation(resultsDir, pairs)
+		results = [ line.strip().split(', ') for line \
+				in open(os.path.join(resultsDir, 'FileResults.csv')) ]
+		metricRows = open(os.path.join(resultsDir, 'FileMetrics.csv')).readlines()
+		store = lgmetrics.readStore(os.path.join(resultsDir, 'FileMetrics' \
+				+ lgmetrics.STORE_EXT))
+		if [ result for (_, result) in results ].count('Error') != 1 \
+				or results[0] != [ 'Tests/infile6', 'Error' ] \
+				or len(metricRows) != len(pairs) + 1 \
+				or len(store) != len(pairs) or store.correct[0] != 0 \
+				or store.values('nSeg')[0][1] != 1 \
+				or not os.path.exists(os.path.join(resultsDir, 'Metrics', \
+					'infile1.err')):
+			errors.append('run ' + str(run + 1) + ': ' + str(results))
+	shutil.rmtree(resultsDir)
+	if errors != []:
+		print('  ' + '\n  '.join(errors))
+	else:
+		print ("\tOK ")
+
+def testMultiSystemErrors():
+	print('\n--TESTING MULTI-SYSTEM SCORES WITH PAIRS THAT CANNOT BE COMPARED')
+	testDir = 'Tests/multiErrors'
+	files = { 'gt' : [ 'Tests/infile1', 'Tests/multiLab0' ], \
+			'sysA' : [ 'Tests/infile6', 'Tests/multiLab0' ], \
+			'sysB' : [ 'Tests/infile11', 'Tests/multiLab0' ] }
+	for (system, fileList) in files.items():
+		os.makedirs(os.path.join(testDir, system))
+		for (i, fileName) in enumerate(fileList):
+			shutil.copy(fileName, os.path.join(testDir, system, 'f' + str(i) \
+					+ '.lg'))
+	# Results_<system> directories are written to the current directory.
+	directory = os.getcwd()
+	os.chdir(testDir)
+	try:
+		systems = multilg.runEvaluations('gt', [ 'sysA', 'sysB' ])
+		scores = dict([ (name, multilg.systemScores(resultsDir)) \
+				for (name, resultsDir) in systems ])
+	finally:
+		os.chdir(directory)
+		shutil.rmtree(testDir)
+	# Both systems are scored over both files; sysA has an error.
+	if [ scores[name][0:2] for name in [ 'sysA', 'sysB' ] ] \
+			!= [ (2, 50.0), (2, 50.0) ] or scores['sysA'][3] >= 100.0:
+		print('  Scores: ' + str(scores))
+	else:
+		print ("\tOK ")
+
+def testErrorDatabase(files):
+	print('\n--TESTING ERROR DATABASE')
+	writer = lgerrors.ErrorWriter('Tests/errors.db')
+	diffLines = []
+	for ( i, ( fileOUT, fileGT, _ ) ) in enumerate(files):
+		out = Lg(fileOUT).compare(Lg(fileGT))
+		diffStream = StringIO.StringIO()
+		writeDiff(out[1], out[3], out[2], diffStream)
+		name = 'f' + str(i) + '.diff'
+		writer.addFile(name, diffStream.getvalue())
+		diffLines += [ (name, line) for line in diffStream.getvalue().splitlines() ]
+	writer.close()
+	connection = lgerrors.openDatabase('Tests/errors.db')
+	for flags in [ '-', '-N', '-E^' ]:
+		query = lgerrors.ErrorQuery(flags, 'any', 'any')
+		lines = [ (name, line) for (name, line) in diffLines \
+				if (line[1] in query.types and query.pattern.search(line) != None) \
+					!= query.complement ]
+		print('>> ' + flags + ' any any: ' + str(query.files(connection)))
+		if query.lines(connection) != lines:
+			print('  Lines differ: ' + str(query.lines(connection)))
+		else:
+			print ("\tOK ")
+	connection.close()
+	os.remove('Tests/errors.db')
+
 
 def main():
 	validfiles = [ \
@@ -325,11 +691,23 @@ def main():
 
 	# Segmentation tests.
 	#testSegments(segFiles)
+	testSharedSegments(segFiles)
 	testshortCuts(shortCutFiles)
 	#Comparison tests.
 	#testLabelComparisons(compareFiles)
 	testLabelComparisons(compareFilesMulti)
 	#testLabelComparisons(compareFilespaper)
+	testOverlayCompare(compareFilesMulti + compareEmpty)
+	testEvaluationConfig(compareFilesMulti)
+	testMatrixFilters(compareFilesMulti)
+	testCompact(compareFilesMulti)
+	testCanonicalIso(validfiles + [ f for (f,_,_) in compareFilesMulti ])
+	testSubStructBudget(compareFilesMulti)
+	testMergeMatrices(compareFilesMulti)
+	testMetricStore(compareFilesMulti)
+	testErrorDatabase(compareFilesMulti)
+	testBatchErrors(compareFilesMulti)
+	testMultiSystemErrors()
 	#testEmpty(compareEmpty)
 	#testStructCompare([('Tests/2p2.lg','Tests/2p2a.lg')])
 	#testSubGraphCounting(compareFiles) #[('Tests/2p2.lg','Tests/2p2a.lg')])